@@ -0,0 +1,47 @@
+# agents/async_runner.py
+# LLM_RUNTIME=async: agents run as coroutines on the AsyncLLMRuntime event loop and their
+# prompts are dispatched there, instead of through the threaded LLM worker. Each batch's
+# SQLite reads, pandas work and watermark write run in a worker thread (asyncio.to_thread),
+# so the loop keeps dispatching model calls while an agent is busy.
+import asyncio
+from async_runtime import start_runtime
+from speech_service import speech_service
+from agents.health_agent import HealthAgent
+from agents.reminder_agent import ReminderAgent
+from agents.safety_agent import SafetyAgent
+from agents.run_agent import RunAgent
+
+
+class AsyncRunAgent(RunAgent):
+    def __init__(self, runtime=None):
+        self.runtime = runtime or start_runtime()
+
+    def run_agents(self):
+        asyncio.run_coroutine_threadsafe(self.run_agents_async(), self.runtime.loop).result()
+        print(f"[AsyncRunAgent] LLM calls: {self.runtime.stats}, cache: {self.runtime.cache.stats()}")
+        print(f"[AsyncRunAgent] LLM queue wait by severity: {self.runtime.wait_stats()}")
+        print(f"[AsyncRunAgent] LLM guard: {self.runtime.guard_stats()}")
+        writer = self.runtime.writer
+        print(f"[AsyncRunAgent] Agent log writer: {writer.rows_written} rows committed, {writer.rows_dropped} dropped. "
+              f"{writer.durability()}")
+        print(f"[AsyncRunAgent] Voice alerts: {speech_service.stats}")
+
+    async def run_agents_async(self):
+        agents = [(HealthAgent("HealthAgent"), "health"), (ReminderAgent("ReminderAgent"), "reminders"),
+                  (SafetyAgent("SafetyAgent"), "safety")]
+        self.attach_correlator([agent for agent, _ in agents])
+        # Opened once here rather than by whichever agent's thread gets to snapshot_table() first
+        await asyncio.to_thread(self.snapshot_table, "health")
+        await asyncio.gather(*(self.run_agent(agent, table_name) for agent, table_name in agents))
+        self.flush_incidents()
+        print("Waiting for LLM queue to finish...")
+        await self.runtime.drain()
+        await asyncio.to_thread(self.runtime.writer.flush)
+
+    async def run_agent(self, agent, table_name):
+        # One batch per thread hop: prompts are submitted from the thread as the batch is processed,
+        # and the agents' batches overlap with each other and with the model calls
+        batches = self.process_batches(agent, table_name)
+        done = object()
+        while await asyncio.to_thread(next, batches, done) is not done:
+            pass
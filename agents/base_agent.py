@@ -1,24 +1,61 @@
 # agents/base_agent.py
 import os
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from llm_queue_worker import llm_prompt_queue
+from async_runtime import active_runtime
+
+# llm_queue_worker and speech_service start their threads (and open the job queue) on import, so
+# they are imported on first use: shard worker processes import the agents but never use either.
+
+def dispatch_prompt(sender, message, user_id="unknown", severity="normal"):
+    # Neither path blocks; model-call concurrency is governed by the adaptive limiter, not per-agent threads
+    runtime = active_runtime()
+    if runtime:
+        runtime.submit(sender, message, user_id, severity)
+    else:
+        from llm_queue_worker import llm_prompt_queue
+        llm_prompt_queue.put((sender, message, user_id), priority=severity)
+
 
 class BaseAgent:
     def __init__(self, name: str, enable_llm=True):
         self.name = name
         self.enable_llm = enable_llm
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        # Set to a list in shard worker processes: prompts and voice alerts are collected
+        # there and replayed by the parent onto its single LLM queue / speech thread
+        self.outbox = None
+        # Shared IncidentCorrelator (agents/correlator.py) when INCIDENT_WINDOW is set
+        self.correlator = None
+        # Positions in the last process() batch whose outcome depends on the time (a reminder
+        # not due yet): the runner keeps them in agent_pending and hands them back every pass
+        self.deferred = []
 
-    def log_to_llm(self, message: str, user_id: str = "unknown"):
+    def log_to_llm(self, message: str, user_id: str = "unknown", severity: str = "normal", timestamp=None):
+        # timestamp is the reading's, used to correlate alerts for the same user across agents
         if not self.enable_llm:
             print(f"[{self.name}] Skipping LLM log: {message}")
             return
+        if self.outbox is not None:
+            self.outbox.append(("llm", message, user_id, severity, timestamp))
+            return
+        if self.correlator is not None and timestamp is not None:
+            self.correlator.add(self.name, message, user_id, severity, timestamp)
+            return
+        dispatch_prompt(self.name, message, user_id, severity)
+
+    def speak(self, message: str):
+        if self.outbox is not None:
+            self.outbox.append(("voice", message))
+        else:
+            from speech_service import speech_service
+            speech_service.say(message)
+
+    def start_pass(self):
+        # Called by the runner before each pass over new rows (per-pass alert budgets reset here)
+        pass
 
-        def queue_task():
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            llm_prompt_queue.put((self.name, message, user_id))
-        self.executor.submit(queue_task)
+    def flush(self):
+        # Every prompt logged so far is already on the LLM queue
+        pass
 
     def shutdown(self):
-        self.executor.shutdown(wait=True)
+        pass
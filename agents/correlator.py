@@ -0,0 +1,119 @@
+# agents/correlator.py
+# Per-user incident correlation (set INCIDENT_WINDOW, in seconds): alert prompts from all three
+# agents are held per user_id, and prompts whose readings fall within `window` seconds of the
+# first reading of an incident go to the LLM as one consolidated prompt, e.g. abnormal vitals +
+# a fall + a missed medication reminder for D1003 within minutes -> one model call, one log row.
+#
+# Batch runs hold every prompt of the pass and flush once all agents are done; the stream
+# runner flushes a user's prompts once they have been held max_delay seconds. Prompts whose
+# reading time cannot be parsed, and incidents of a single prompt, go out unchanged.
+import bisect
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import schema
+from llm_scheduler import PRIORITY_NAMES, priority_level
+
+INCIDENT_WINDOW = float(os.environ.get("INCIDENT_WINDOW", "0"))  # 0 disables correlation
+INCIDENT_SENDER = "IncidentAgent"
+
+Signal = namedtuple("Signal", "at sender message user_id severity")
+
+
+def reading_time(timestamp):
+    # Device export timestamp ("1/22/2025 20:42") or ISO -> epoch seconds; None if unparseable
+    iso = schema.to_iso_timestamp(timestamp)
+    return datetime.fromisoformat(iso).timestamp() if iso else None
+
+
+class IncidentCorrelator:
+    """Holds alert prompts per user (each user's list kept sorted by reading time) and emits one
+    prompt per incident through ``emit(sender, message, user_id, severity)``."""
+
+    def __init__(self, window=600.0, emit=None, max_delay=5.0):
+        self.window = window
+        self.emit = emit
+        self.max_delay = max_delay
+        self._held = {}  # user_id -> [Signal] sorted by reading time
+        self._first_held = {}  # user_id -> monotonic time its oldest held prompt arrived
+        self._lock = threading.Lock()
+        self.stats = {"signals": 0, "prompts": 0, "incidents": 0, "merged_signals": 0, "multi_agent": 0}
+
+    def add(self, sender, message, user_id, severity, timestamp):
+        at = reading_time(timestamp)
+        if at is None:
+            self._send([(sender, message, user_id, severity)])
+            with self._lock:
+                self.stats["signals"] += 1
+                self.stats["prompts"] += 1
+            return
+        with self._lock:
+            self.stats["signals"] += 1
+            held = self._held.setdefault(user_id, [])
+            bisect.insort(held, Signal(at, sender, message, user_id, severity))
+            self._first_held.setdefault(user_id, time.monotonic())
+
+    def flush(self, max_age=None):
+        # max_age=None: everything held; otherwise only users whose oldest prompt waited max_age seconds
+        now = time.monotonic()
+        prompts = []
+        with self._lock:
+            users = [u for u, since in self._first_held.items() if max_age is None or now - since >= max_age]
+            for user_id in users:
+                del self._first_held[user_id]
+                for incident in self.incidents(self._held.pop(user_id)):
+                    prompts.append(self._prompt(incident))
+            self.stats["prompts"] += len(prompts)
+        self._send(prompts)
+        return len(prompts)
+
+    def pending(self):
+        with self._lock:
+            return sum(len(held) for held in self._held.values())
+
+    def calls_saved(self):
+        return self.stats["signals"] - self.stats["prompts"] - self.pending()
+
+    def incidents(self, signals):
+        # signals sorted by time; an incident spans at most `window` seconds from its first reading
+        incidents = []
+        for signal in signals:
+            if incidents and signal.at - incidents[-1][0].at <= self.window:
+                incidents[-1].append(signal)
+            else:
+                incidents.append([signal])
+        return incidents
+
+    def _prompt(self, incident):
+        if len(incident) == 1:
+            s = incident[0]
+            return s.sender, s.message, s.user_id, s.severity
+        self.stats["incidents"] += 1
+        self.stats["merged_signals"] += len(incident)
+        senders = {s.sender for s in incident}
+        if len(senders) > 1:
+            self.stats["multi_agent"] += 1
+        user_id = incident[0].user_id
+        level = min(priority_level(s.severity) for s in incident)
+        minutes = max(round((incident[-1].at - incident[0].at) / 60), 1)
+        lines = [f"Several alerts for user {user_id} within {minutes} minutes ({', '.join(sorted(senders))}):"]
+        for i, s in enumerate(incident, 1):
+            when = datetime.fromtimestamp(s.at).strftime("%Y-%m-%d %H:%M")
+            lines.append(f"{i}. [{s.sender}, {s.severity}, {when}] " + s.message.strip().replace("\n", "\n   "))
+        lines.append("Treat these as one incident and give the caregiver one combined action in 1 or 2 lines.")
+        return INCIDENT_SENDER, "\n".join(lines), user_id, PRIORITY_NAMES[level]
+
+    def _send(self, prompts):
+        for prompt in prompts:
+            self.emit(*prompt)
+
+
+def make_correlator(window=INCIDENT_WINDOW, **kwargs):
+    # None when correlation is off, so agents send their prompts straight to the LLM
+    if window <= 0:
+        return None
+    from agents.base_agent import dispatch_prompt
+    return IncidentCorrelator(window, emit=dispatch_prompt, **kwargs)
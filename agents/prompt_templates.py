@@ -0,0 +1,106 @@
+# agents/prompt_templates.py
+# Prompt/voice templates and the small parsing helpers the agents' per-row loops share.
+# Templates are bound once (str.format of a constant) instead of concatenated per row, and
+# the inputs that repeat across rows -- Yes/No flags, the few distinct scheduled times --
+# are parsed once per distinct value. Output is byte-for-byte what the agents built before,
+# so LLM cache keys and dedup/templating in the worker are unchanged.
+import string
+from datetime import datetime
+from functools import lru_cache
+
+
+class PromptTemplate:
+    """A named ``str.format`` template (plain ``{field}`` placeholders), compiled once to a
+    %-format string: ``fill(*values)`` takes the values in ``fields`` order, ``render(**fields)`` by name."""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        parts, fields = [], []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"template {name!r}: format specs/conversions are not supported")
+            parts.append(literal.replace("%", "%%"))
+            if field is not None:
+                parts.append("%s")
+                fields.append(field)
+        self.fields = tuple(fields)
+        self._compiled = "".join(parts)
+
+    def fill(self, *values):
+        return self._compiled % values
+
+    def render(self, **fields):
+        return self._compiled % tuple(fields[f] for f in self.fields)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name!r})"
+
+
+HEALTH_READINGS = PromptTemplate("health_readings", (
+    "User has the following readings:\n"
+    "- Heart Rate = {heart_rate} bpm and {heart_rate_status}.\n"
+    "- Blood Pressure = {bp} and {bp_status}.\n"
+    "- Glucose Level = {glucose} and {glucose_status}.\n"
+    "- Oxygen Saturation = {oxygen}. and {oxygen_status}.\n"
+    "Please provide the appropriate action in 1 or 2 lines"
+))
+REMINDER_DUE = PromptTemplate(
+    "reminder_due", "Generate a short and friendly reminder for an elderly person: {reminder_type} is scheduled now.")
+REMINDER_ESCALATION = PromptTemplate(
+    "reminder_escalation",
+    "Reminder for '{reminder_type}' was sent to user {user_id} but not acknowledged. Escalate gently.")
+VOICE_REMINDER_DUE = PromptTemplate("voice_reminder_due", "Reminder: {reminder_type} is scheduled now for {time}.")
+VOICE_REMINDER_ESCALATION = PromptTemplate(
+    "voice_reminder_escalation", "You still need to acknowledge your {reminder_type} reminder from {time}.")
+
+
+# === Parsing (memoized per distinct value) ===
+@lru_cache(maxsize=256)
+def flag(text):
+    # " Yes " -> "yes"; device flags have a handful of spellings
+    return text.strip().lower()
+
+
+@lru_cache(maxsize=256)
+def threshold_status(text):
+    return "which is normal" if flag(text) == "no" else "which is not normal"
+
+
+@lru_cache(maxsize=1024)
+def parse_clock(text):
+    # "13:00:00" -> time(13, 0); raises ValueError like strptime (failures are not cached)
+    return datetime.strptime(text, "%H:%M:%S").time()
+
+
+@lru_cache(maxsize=1024)
+def spoken_clock(text):
+    # "13:00:00" -> "1 PM", "09:30:00" -> "9:30 AM"; unparseable text is spoken as-is
+    try:
+        return parse_clock(text).strftime("%I:%M %p").lstrip("0").replace(":00", "")
+    except (TypeError, ValueError):
+        return text
+
+
+def health_prompt(row):
+    return HEALTH_READINGS.fill(
+        row["heart_rate"], threshold_status(row["hear_rate_threshold_flag"]),
+        row["bp"], threshold_status(row["bp_threshold_flag"]),
+        row["glucose"], threshold_status(row["glucose_Threshold_flag"]),
+        row["oxygen"], threshold_status(row["oxygen_threshold_flag"]),
+    )
+
+
+class BatchClock:
+    """``now`` captured once for a batch, with each scheduled time resolved to today's datetime once."""
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now()
+        self._today = self.now.date()
+        self._due = {}
+
+    def due_at(self, scheduled_time):
+        due = self._due.get(scheduled_time)
+        if due is None:
+            due = self._due[scheduled_time] = datetime.combine(self._today, parse_clock(scheduled_time))
+        return due
@@ -1,68 +1,64 @@
 import pandas as pd
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import timedelta
 from .base_agent import BaseAgent
-from llm_queue_worker import llm_prompt_queue
+from .prompt_templates import (REMINDER_DUE, REMINDER_ESCALATION, VOICE_REMINDER_DUE,
+                               VOICE_REMINDER_ESCALATION, BatchClock, flag, spoken_clock)
 
 class ReminderAgent(BaseAgent):
+    max_alerts = 30  # LLM alerts per runner pass (start_pass()), across all of its batches
+    grace_period = timedelta(minutes=5)
+
     def __init__(self, name="ReminderAgent", enable_llm=True):
         super().__init__(name, enable_llm)
+        self.alert_count = 0
+
+    def start_pass(self):
+        self.alert_count = 0
 
     def _send_voice_reminder(self, message):
-        try:
-            import pyttsx3
-            engine = pyttsx3.init()
-            engine.say(message)
-            engine.runAndWait()
-            print(f"[ReminderAgent] ✅ Voice reminder sent.")
-        except Exception as e:
-            pass
+        # Queued on the shared speech thread; identical reminders due together are spoken once
+        self.speak(message)
     
     def _format_time(self, time_str):
-        try:
-            t = datetime.strptime(time_str, "%H:%M:%S")
-            return t.strftime("%I:%M %p").lstrip("0").replace(":00", "")
-        except Exception:
-            return time_str 
+        return spoken_clock(time_str)
 
     def process(self, records: list):
-        grace_period = timedelta(minutes=5)
-        alert_count = 0
-        MAX_LLM_ALERTS = 30
+        # Returns how many leading rows were handled; the rest (past the pass's alert cap) wait
+        # for the next pass. Rows that are not due yet (or still in their grace period) go to
+        # self.deferred and come back on later passes until they fire or are acknowledged.
+        # One `now` per batch; scheduled times and Yes/No flags repeat across rows and are parsed once
+        clock = BatchClock()
+        now_dt = clock.now
+        self.deferred = []
 
-        for row in records:
+        for handled, row in enumerate(records):
+            if self.alert_count >= self.max_alerts:
+                return handled
             user_id, timestamp, reminder_type, scheduled_time, reminder_sent, acknowledged = row
 
             try:
-                now_dt = datetime.now()
-                today = now_dt.date()
-
-                # Parse the scheduled_time as a time, then combine with today's date
-                scheduled_time_dt = datetime.combine(today, datetime.strptime(scheduled_time, "%H:%M:%S").time())
-
-                scheduled_time_obj = datetime.strptime(scheduled_time, "%H:%M:%S").time()
-                spoken_time = scheduled_time_obj.strftime("%I").lstrip("0") + " o'clock"
-
-                reminder_sent = reminder_sent.strip().lower()
-                acknowledged = acknowledged.strip().lower()
+                # The scheduled_time as a time of day, today
+                scheduled_time_dt = clock.due_at(scheduled_time)
+                reminder_sent = flag(reminder_sent)
+                acknowledged = flag(acknowledged)
 
                 # === CASE 1: Scheduled Reminder (due now)
-                if reminder_sent == "no" and scheduled_time_dt <= now_dt and alert_count < MAX_LLM_ALERTS:
-                    prompt = f"Generate a short and friendly reminder for an elderly person: {reminder_type} is scheduled now."
-                    llm_prompt_queue.put((self.name, prompt, user_id))
-                    
-                    spoken_message = f"Reminder: {reminder_type} is scheduled now for {self._format_time(scheduled_time)}."
-                    self._send_voice_reminder(spoken_message)
-                    alert_count += 1
+                if reminder_sent == "no" and scheduled_time_dt <= now_dt:
+                    self.log_to_llm(REMINDER_DUE.fill(reminder_type), user_id, "low", timestamp)
+                    self._send_voice_reminder(VOICE_REMINDER_DUE.fill(reminder_type, self._format_time(scheduled_time)))
+                    self.alert_count += 1
 
                 # === CASE 2: Not Acknowledged (past grace period)
-                elif reminder_sent == "yes" and acknowledged == "no" and now_dt > (scheduled_time_dt + grace_period) and alert_count < MAX_LLM_ALERTS:
-                    escalation_prompt = f"Reminder for '{reminder_type}' was sent to user {user_id} but not acknowledged. Escalate gently."
-                    llm_prompt_queue.put((self.name, prompt, user_id))
-                    
-                    escalation_message = f"You still need to acknowledge your {reminder_type} reminder from {self._format_time(scheduled_time)}."
-                    self._send_voice_reminder(escalation_message)
-                    alert_count += 1
+                elif reminder_sent == "yes" and acknowledged == "no" and now_dt > scheduled_time_dt + self.grace_period:
+                    self.log_to_llm(REMINDER_ESCALATION.fill(reminder_type, user_id),
+                                    user_id, "normal", timestamp)
+                    self._send_voice_reminder(VOICE_REMINDER_ESCALATION.fill(reminder_type, self._format_time(scheduled_time)))
+                    self.alert_count += 1
+
+                elif reminder_sent == "no" or (reminder_sent == "yes" and acknowledged == "no"):
+                    self.deferred.append(handled)
 
             except Exception as e:
                 print(f"[ReminderAgent] Error processing reminder: {e}")
+        return len(records)
@@ -0,0 +1,195 @@
+# agents/rule_engine.py
+# Declarative alert rules evaluated as vectorized pandas masks (or pushed down to SQL).
+# Rules live in agents/alert_rules.json (override with ALERT_RULES_PATH) so thresholds,
+# locations and messages can change without code edits.
+import json
+import os
+import numpy as np
+import pandas as pd
+import schema
+
+RULES_PATH = os.environ.get("ALERT_RULES_PATH", os.path.join(os.path.dirname(__file__), "alert_rules.json"))
+
+TEXT_OPS = ("eq", "ne", "in")
+NUMERIC_OPS = {"gt": ">", "ge": ">=", "lt": "<", "le": "<="}
+FLAG_VALUES = {"yes": 1, "no": 0}
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+class RuleEngine:
+    def __init__(self, config: dict):
+        self.table = config["table"]
+        self.columns = schema.RAW_COLUMNS[self.table]
+        self.max_alerts = config.get("max_alerts")
+        self.computed = config.get("computed", {})
+        # Rows where any of these is missing or not a number match no rule at all (the original
+        # loops parsed them up front and skipped the row), not just the rules that test them
+        self.require_numeric = config.get("require_numeric", [])
+        self.flags = schema.FLAG_COLUMNS[self.table]
+        self.rules = config["rules"]
+        for rule in self.rules:
+            for cond in rule["when"]:
+                if cond["op"] not in TEXT_OPS and cond["op"] not in NUMERIC_OPS:
+                    raise ValueError(f"Unknown op '{cond['op']}' in rule '{rule['name']}'")
+        self.text_columns = {c["column"] for r in self.rules for c in r["when"] if c["op"] in TEXT_OPS}
+        self.numeric_columns = {c["column"] for r in self.rules for c in r["when"] if c["op"] in NUMERIC_OPS}
+        self.numeric_columns |= set(self.require_numeric)
+        # Message templates bound once per rule instead of looked up on every messages() call
+        self.templates = {r["name"]: r["message"].format_map for r in self.rules if r.get("message")}
+
+    @classmethod
+    def load(cls, section, path=RULES_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)[section])
+
+    # === pandas evaluation ===
+    def _text_condition(self, factorized, cond):
+        # Text columns are low-cardinality: normalise and compare the distinct values only,
+        # then broadcast the result back to every row through the factor codes
+        codes, uniques = factorized
+        normalized = np.array([str(u).strip().lower() for u in uniques], dtype=object)
+        op, value = cond["op"], cond["value"]
+        if op == "in":
+            hit = np.isin(normalized, value)
+        else:
+            hit = (normalized == value) if op == "eq" else (normalized != value)
+        hit = np.append(hit, op == "ne")  # code -1 (missing) lands on the last slot
+        return hit[codes]
+
+    @staticmethod
+    def _numeric_condition(values, cond):
+        with np.errstate(invalid="ignore"):
+            return {"gt": np.greater, "ge": np.greater_equal, "lt": np.less, "le": np.less_equal}[cond["op"]](values, cond["value"])
+
+    def evaluate(self, records, limit=None):
+        """Return only the matching rows, in input order, with ``rule``/``severity`` columns
+        from the first rule (in config order) each row matched."""
+        is_frame = isinstance(records, pd.DataFrame)
+        if is_frame:
+            column = records.__getitem__
+        else:
+            # Row tuples: pull out only the columns the rules look at instead of building a full frame
+            positions = {c: i for i, c in enumerate(self.columns)}
+
+            def column(c):
+                return np.array([row[positions[c]] for row in records], dtype=object)
+        factorized = {c: pd.factorize(column(c)) for c in self.text_columns}
+        numeric = {c: np.asarray(pd.to_numeric(pd.Series(column(c)), errors="coerce"), dtype=float)
+                   for c in self.numeric_columns}
+
+        eligible = np.ones(len(records), dtype=bool)
+        for c in self.require_numeric:
+            eligible &= ~np.isnan(numeric[c])
+        rule_idx = np.full(len(records), -1, dtype=np.int16)
+        for i, r in enumerate(self.rules):
+            mask = (rule_idx == -1) & eligible
+            for cond in r["when"]:
+                if cond["op"] in TEXT_OPS:
+                    mask &= self._text_condition(factorized[cond["column"]], cond)
+                else:
+                    mask &= self._numeric_condition(numeric[cond["column"]], cond)
+            rule_idx[mask] = i
+
+        hits = np.flatnonzero(rule_idx >= 0)
+        limit = self.max_alerts if limit is None else limit
+        if limit is not None:
+            hits = hits[:max(limit, 0)]
+
+        # Normalised values are what the messages quote (e.g. "kitchen", "high")
+        if is_frame:
+            matched = records.iloc[hits].copy()
+        else:
+            matched = pd.DataFrame.from_records([records[i] for i in hits], columns=self.columns)
+        for c in self.text_columns:
+            if isinstance(matched[c].dtype, pd.CategoricalDtype):
+                # Columnar snapshot frames: normalise each distinct value once, not every row
+                matched[c] = np.asarray(matched[c].map(_normalize), dtype=object)
+            else:
+                matched[c] = matched[c].astype(str).str.strip().str.lower()
+        for c in self.numeric_columns:
+            matched[c] = pd.to_numeric(matched[c], errors="coerce").astype("Int64")
+        for name, expr in self.computed.items():
+            matched[name] = matched.eval(expr) if not matched.empty else pd.Series(dtype=object)
+        matched["rule"] = [self.rules[i]["name"] for i in rule_idx[hits]]
+        matched["severity"] = [self.rules[i].get("severity", "normal") for i in rule_idx[hits]]
+        return matched
+
+    def messages(self, matched):
+        for row in matched.to_dict("records"):
+            render = self.templates.get(row["rule"])
+            yield row, (render(row) if render else None)
+
+    # === SQL pushdown ===
+    @staticmethod
+    def _is_number(column):
+        # INT-affinity columns hold every numeric reading as a number; text left over ('' etc.) would
+        # otherwise compare greater than any number, where pandas sees NaN and matches nothing
+        return f"typeof({column}) IN ('integer', 'real')"
+
+    def _sql_condition(self, cond):
+        # Against the typed columns where there is one: Yes/No flags as 1/0 (is_alert, is_fall, ...),
+        # numeric readings as stored; only free-text columns (activity, location, ...) are normalised
+        column, op, value = cond["column"], cond["op"], cond["value"]
+        if op in NUMERIC_OPS:
+            sql = f"{column} {NUMERIC_OPS[op]} ?"
+            if column not in self.require_numeric:
+                sql = f"{self._is_number(column)} AND {sql}"
+            return sql, [value]
+        values = value if op == "in" else [value]
+        if column in self.flags and all(v in FLAG_VALUES for v in values):
+            # The flag is NULL for anything but yes/no, which "ne" matches like the pandas mask does.
+            # Unary + keeps SQLite on the id range: is_alert etc. match most rows, so their indexes
+            # (there for the dashboard) would mean reading every match in the table and sorting by id
+            flag, codes = "+" + self.flags[column], [FLAG_VALUES[v] for v in values]
+            if op == "in":
+                return f"{flag} IN ({', '.join('?' * len(codes))})", codes
+            return f"{flag} {'=' if op == 'eq' else 'IS NOT'} ?", codes
+        if op == "in":
+            return f"lower(trim({column})) IN ({', '.join('?' * len(value))})", list(value)
+        return f"lower(trim({column})) {'=' if op == 'eq' else '!='} ?", [value]
+
+    def to_sql(self, limit=None, after_id=0, upto_id=None, shard=None):
+        # Conditions shared by every rule (e.g. alert_triggered == "no") are tested once, before the OR
+        common = [c for c in self.rules[0]["when"] if all(c in r["when"] for r in self.rules)]
+        wheres, rule_params = [], []
+        for r in self.rules:
+            parts = [self._sql_condition(c) for c in r["when"] if c not in common]
+            if not parts:
+                # This rule is just the shared conditions: every row passing them matches
+                wheres, rule_params = [], []
+                break
+            wheres.append("(" + " AND ".join(p[0] for p in parts) + ")")
+            rule_params += [v for p in parts for v in p[1]]
+        required = [self._is_number(c) for c in self.require_numeric]
+        shared = [self._sql_condition(c) for c in common]
+        # id comes along so a runner that stops at the alert cap knows where the matches ended
+        sql = f"SELECT id, {', '.join(self.columns)} FROM {self.table} WHERE id > ?"
+        params = [after_id]
+        if upto_id is not None:
+            sql += " AND id <= ?"
+            params.append(upto_id)
+        for condition in required:
+            sql += f" AND {condition}"
+        for condition, values in shared:
+            sql += f" AND {condition}"
+            params += values
+        if wheres:
+            sql += f" AND ({' OR '.join(wheres)})"
+            params += rule_params
+        if shard is not None:
+            # shard=(k, n), tested after the cheap rule conditions; needs schema.register_functions()
+            sql += " AND shard_of(user_id, ?) = ?"
+            params += [shard[1], shard[0]]
+        sql += " ORDER BY id"
+        limit = self.max_alerts if limit is None else limit
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params
+
+    def fetch_matches(self, conn, limit=None, after_id=0, upto_id=None, shard=None):
+        # Only matching rows leave SQLite; evaluate() then adds the normalised/computed columns
+        sql, params = self.to_sql(limit, after_id, upto_id, shard)
+        return self.evaluate(pd.read_sql_query(sql, conn, params=params), limit)
@@ -3,31 +3,183 @@ import pandas as pd
 from agents.health_agent import HealthAgent
 from agents.reminder_agent import ReminderAgent
 from agents.safety_agent import SafetyAgent
-from db import fetch_records
+from agents.correlator import make_correlator
+from columnar import open_snapshot
+from db import (fetch_matching_records, fetch_pending, iter_new_records, max_record_id, record_id_at, record_ids,
+                get_watermark, set_watermark)
+from metrics import registry as metrics
+
+ROWS_PROCESSED = metrics.counter("agent_rows_processed_total", "New reading rows handed to each agent")
 
 class RunAgent:
     def run_agents(self):
-        health_df = fetch_records("health")
         health_agent = HealthAgent("HealthAgent")
-
-        reminder_df = fetch_records("reminders")
         reminder_agent = ReminderAgent("ReminderAgent")
-
-        safety_df = fetch_records("safety")
         safety_agent = SafetyAgent("SafetyAgent")
+        self.attach_correlator([health_agent, reminder_agent, safety_agent])
 
-        if health_df:
-            health_agent.process(health_df)
-        if reminder_df:
-            reminder_agent.process(reminder_df)
-        if safety_df:
-            safety_agent.process(safety_df)
+        # Only rows added since each agent's last run are fetched
+        self.process_new_rows(health_agent, "health")
+        self.process_new_rows(reminder_agent, "reminders")
+        self.process_new_rows(safety_agent, "safety")
+        self.flush_incidents()
 
         health_agent.shutdown()
         reminder_agent.shutdown()
         safety_agent.shutdown()
+        self.wait_for_llm()
+
+    def attach_correlator(self, agents, **kwargs):
+        # One correlator shared by all agents, so alerts for a user from different agents meet
+        self.correlator = make_correlator(**kwargs)
+        for agent in agents:
+            agent.correlator = self.correlator
+        return self.correlator
 
+    def flush_incidents(self, max_age=None):
+        correlator = getattr(self, "correlator", None)
+        if correlator is None:
+            return
+        correlator.flush(max_age)
+        if max_age is None:
+            print(f"[RunAgent] Incident correlation (window {correlator.window:.0f}s): {correlator.stats}, "
+                  f"LLM calls saved: {correlator.calls_saved()}")
+
+    def snapshot_table(self, table_name):
+        # Columnar snapshot (COLUMNAR_SNAPSHOT) of table_name, opened once per runner; None reads SQLite only
+        if not hasattr(self, "snapshot"):
+            self.snapshot = open_snapshot()
+        return self.snapshot.table(table_name) if self.snapshot else None
+
+    def wait_for_llm(self):
         # If using a background worker, wait for the queue to finish processing:
-        from llm_queue_worker import llm_prompt_queue
+        from llm_queue_worker import llm_prompt_queue, llm_worker
         print("Waiting for LLM queue to finish...")
         llm_prompt_queue.join()
+        llm_worker.writer.flush()
+        print(f"[RunAgent] LLM calls: {llm_worker.stats}, cache: {llm_worker.cache.stats()}")
+        print(f"[RunAgent] LLM queue wait by severity: {llm_prompt_queue.wait_stats()}")
+        print(f"[RunAgent] LLM guard: {llm_worker.guard_stats()}")
+        writer = llm_worker.writer
+        print(f"[RunAgent] Agent log writer: {writer.rows_written} rows committed, {writer.rows_dropped} dropped. "
+              f"{writer.durability()}")
+        if hasattr(llm_prompt_queue, "stats"):
+            print(f"[RunAgent] LLM job queue: {llm_prompt_queue.stats()}")
+        from speech_service import speech_service
+        print(f"[RunAgent] Voice alerts: {speech_service.stats}")
+
+    @staticmethod
+    def matching_batches(rules, snap, after_id, snap_upto, high_id):
+        # One (last_id, matching rows) batch: matches from the snapshot, then from SQLite past it,
+        # sharing one max_alerts budget. When the budget runs out, last_id is the last match's id,
+        # so the matches after it are picked up by the next pass instead of being skipped.
+        limit = rules.max_alerts
+        parts = []
+        if snap_upto > after_id:
+            parts.append(snap.fetch_matches(rules, after_id, snap_upto))
+            limit = None if limit is None else max(limit - len(parts[0]), 0)
+            after_id = snap_upto
+        if high_id > after_id:
+            parts.append(fetch_matching_records(rules, after_id, high_id, limit=limit))
+        matches = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+        if rules.max_alerts is not None and len(matches) and len(matches) >= rules.max_alerts:
+            high_id = int(matches["id"].iloc[-1])
+        yield high_id, matches
+
+    @staticmethod
+    def record_batches(table_name, snap, after_id, snap_upto, high_id, batch_size=5000):
+        # The same batches as iter_new_records(table_name, after_id, high_id): the snapshot's rows,
+        # with the batch that straddles snap_upto topped up from SQLite, then SQLite's
+        tail_after, pending = snap_upto, None
+        for last_id, rows in snap.iter_records(after_id, snap_upto, batch_size):
+            if len(rows) == batch_size:
+                yield last_id, rows
+            else:
+                pending = (last_id, rows)
+        if pending:
+            last_id, rows = pending
+            for last_id, more in iter_new_records(table_name, snap_upto, high_id, batch_size - len(rows)):
+                rows, tail_after = rows + more, last_id
+                break
+            yield last_id, rows
+        yield from iter_new_records(table_name, tail_after, high_id, batch_size)
+
+    def process_new_rows(self, agent, table_name, on_batch=None, verbose=True):
+        processed = 0
+        for processed in self.process_batches(agent, table_name, on_batch, verbose):
+            pass
+        return processed
+
+    @staticmethod
+    def process_pending(agent, table_name, last_id, verbose=True):
+        # Re-checks the rows the agent deferred on earlier passes; False if that used up its alert cap
+        pending_ids, rows = fetch_pending(agent.name, table_name)
+        if not rows:
+            return True
+        with metrics.span("process", agent=agent.name):
+            handled = agent.process(rows)
+        handled = len(rows) if handled is None else handled
+        still = [pending_ids[i] for i in agent.deferred] + pending_ids[handled:]
+        agent.flush()
+        set_watermark(agent.name, table_name, last_id, pending=still, resolved=pending_ids)
+        if verbose and len(still) < len(rows):
+            print(f"[RunAgent] {agent.name} resolved {len(rows) - len(still)} of {len(rows)} pending {table_name} rows.")
+        return handled == len(rows)
+
+    def process_batches(self, agent, table_name, on_batch=None, verbose=True):
+        # Generator: yields the number of new rows handled so far after each batch
+        last_id = get_watermark(agent.name)
+        high_id = max_record_id(table_name)
+        agent.start_pass()
+        if not self.process_pending(agent, table_name, last_id, verbose):
+            if verbose:
+                print(f"[RunAgent] {agent.name} reached its alert cap on pending rows; new {table_name} rows "
+                      f"are left for the next pass.")
+            return
+        if high_id <= last_id:
+            if verbose:
+                print(f"[RunAgent] No new {table_name} rows for {agent.name}.")
+            return
+
+        # History up to the snapshot's max_id is read from the columnar snapshot, newer rows from SQLite
+        snap = self.snapshot_table(table_name)
+        snap_upto = min(snap.max_id, high_id) if snap is not None and snap.max_id > last_id else last_id
+        if hasattr(agent, "rules"):
+            # Alert rules are pushed down to SQL (or evaluated on the snapshot), so the new rows arrive
+            # pre-filtered in one batch (fetched lazily so the fetch_records span below times the query)
+            batches = self.matching_batches(agent.rules, snap, last_id, snap_upto, high_id)
+        else:
+            batches = iter_new_records(table_name, last_id, high_id)
+            if snap_upto > last_id:
+                batches = self.record_batches(table_name, snap, last_id, snap_upto, high_id)
+
+        batch_first_id, done_id = last_id + 1, last_id
+        for batch_last_id, records in metrics.timed_iter(batches, "fetch_records", agent.name):
+            if on_batch:
+                on_batch(agent, table_name, records, batch_first_id, batch_last_id)
+            capped, pending = False, []
+            if len(records):
+                agent.deferred = []
+                with metrics.span("process", agent=agent.name):
+                    handled = agent.process(records)
+                if agent.deferred:
+                    # Batches hold every row in (batch_first_id - 1, batch_last_id], in id order
+                    ids = record_ids(table_name, batch_first_id - 1, batch_last_id)
+                    pending = [ids[i] for i in agent.deferred]
+                if handled is not None and handled < len(records):
+                    # The agent's alert cap was reached mid-batch: stop after the last row it handled
+                    batch_last_id = record_id_at(table_name, batch_first_id - 1, handled)
+                    capped = True
+            ROWS_PROCESSED.inc(batch_last_id - batch_first_id + 1, agent=agent.name)
+            # Persist progress only once this batch's prompts are on the LLM queue
+            agent.flush()
+            set_watermark(agent.name, table_name, batch_last_id, pending=pending)
+            batch_first_id, done_id = batch_last_id + 1, batch_last_id
+            yield batch_last_id - last_id
+            if capped:
+                break
+        if verbose:
+            print(f"[RunAgent] {agent.name} processed {table_name} rows {last_id + 1}..{done_id}.")
+            if done_id < high_id:
+                print(f"[RunAgent] {agent.name} reached its alert cap; rows {done_id + 1}..{high_id} "
+                      f"are left for the next pass.")
@@ -2,93 +2,35 @@ import pandas as pd
 import sqlite3
 from datetime import datetime, timedelta
 from .base_agent import BaseAgent
-from llm_queue_worker import llm_prompt_queue
+from .rule_engine import RuleEngine
 
 class SafetyAgent(BaseAgent):
     def __init__(self, name="SafetyAgent", enable_llm=True):
         super().__init__(name, enable_llm)
+        self.rules = RuleEngine.load("safety")
         self.alert_count = 0
-        self.MAX_ALERTS = 16
+        self.MAX_ALERTS = self.rules.max_alerts
 
-    def process(self, records: list):
-        now = datetime.now()
+    def start_pass(self):
+        self.alert_count = 0
 
-        for row in records:
-            user_id, timestamp, activity, fall_detected, impact_force_level, post_fall_inactivity_duration, location, alert_triggered, caregiver_notified = row
+    def process(self, records: list):
+        # Cases (fall + impact + inactivity, lying in bathroom/kitchen, prolonged no movement,
+        # fall with no movement) are declared in alert_rules.json; the first matching case wins.
+        # The alert cap applies per pass (start_pass()), across all of its batches, like the other
+        # agents, so a long-running stream keeps alerting.
+        matched = self.rules.evaluate(records, limit=self.MAX_ALERTS - self.alert_count)
 
+        for row, message in self.rules.messages(matched):
             try:
-                fall = fall_detected.strip().lower()
-                impact = impact_force_level.strip().lower()
-                alert_triggered = alert_triggered.strip().lower()
-                movement = activity.strip().lower()
-                location = location.strip().lower()
-                caregiver_notified = caregiver_notified.strip().lower()
-
-                inactivity_seconds = int(post_fall_inactivity_duration)
-                message = None
-
-                # === CASE 1: Fall with impact and inactivity ===
-                if (
-                    fall == "yes"
-                    and impact in ("medium", "high")
-                    and inactivity_seconds > 30
-                    and alert_triggered == "no"
-                    and self.alert_count < self.MAX_ALERTS
-                ):
-                    message = (
-                        f"Fall detected for user {user_id} at {location}. Impact level: {impact}. "
-                        f"Inactivity duration: {inactivity_seconds} seconds. Immediate check required."
-                    )
-
-                # === CASE 2: Lying in bathroom or kitchen ===
-                elif (
-                    movement == "lying"
-                    and location in ("bathroom", "kitchen")
-                    and alert_triggered == "no"
-                    and self.alert_count < self.MAX_ALERTS
-                ):
-                    message = (
-                        f"User {user_id} is lying in the {location}. Check if the user needs assistance."
-                    )
-
-                # === CASE 3: No movement detected at all for extended time ===
-                elif (
-                    movement == "none"
-                    and inactivity_seconds > 1800  # 30 minutes
-                    and alert_triggered == "no"
-                    and self.alert_count < self.MAX_ALERTS
-                ):
-                    message = (
-                        f"No movement detected for user {user_id} for the last {inactivity_seconds//60} minutes. "
-                        f"Location: {location}. Consider checking in."
-                    )
-
-                # === CASE 4: Fall detected but no movement at all ===
-                elif (
-                    fall == "yes"
-                    and movement == "none"
-                    and alert_triggered == "no"
-                    and self.alert_count < self.MAX_ALERTS
-                ):
-                    message = (
-                        f"Fall detected for user {user_id} with no subsequent movement. Immediate attention required at {location}."
-                    )
-
-                if message:
-                    self.log_to_llm(message, user_id)
-                    if fall == "yes": 
-                        self._trigger_voice_alert(message)
-                    self.alert_count += 1
+                self.log_to_llm(message, row["user_id"], row["severity"], row["timestamp"])
+                if row["fall_detected"] == "yes":
+                    self._trigger_voice_alert(message)
+                self.alert_count += 1
 
             except Exception as e:
                 print(f"[SafetyAgent] Error processing safety row: {e}")
 
     def _trigger_voice_alert(self, message):
-        try:
-            import pyttsx3
-            engine = pyttsx3.init()
-            engine.say(message)
-            engine.runAndWait()
-            print("[SafetyAgent] 🔊 Voice alert triggered.")
-        except Exception as e:
-            pass  # Silently ignore voice failures
+        # Queued on the shared speech thread; never blocks the processing loop
+        self.speak(message)
@@ -0,0 +1,162 @@
+# agents/sharded_runner.py
+# Sharded batch mode: new rows are partitioned by crc32(user_id) % shards and each shard
+# runs rule evaluation and prompt building in its own process, reading only its slice.
+# Prompts and voice alerts come back to this process and go onto the one LLM queue /
+# DB writer. A user's rows all land on one shard, in id order, so per-user ordering holds.
+#
+# Alert caps (max_alerts etc.) apply to the pass as a whole, as in RunAgent: every shard stops at the
+# full cap, the parent merges the shards' alerts in row id order and sends them up to the cap, and the
+# watermark moves to the row of the last alert sent, so later matches are picked up by the next pass.
+#
+# Workers come from a forkserver (spawn where there is none), never a fork of this process: by the
+# time the pool starts, the LLM worker, DB writer and speech threads may be running here, and a
+# forked child would inherit their locks in whatever state they were in. Nothing this module imports
+# starts a thread or opens the job queue, so the workers get neither.
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+from async_runtime import active_runtime, start_runtime
+from agents.health_agent import HealthAgent
+from agents.reminder_agent import ReminderAgent
+from agents.safety_agent import SafetyAgent
+from agents.run_agent import RunAgent
+from db import (fetch_matching_records, fetch_pending, iter_new_records, max_record_id, record_ids, get_watermark,
+                set_watermark)
+
+
+def _run_shard(agent_cls, agent_name, table_name, after_id, upto_id, shard, shards):
+    # Runs in a worker process. Returns the shard's prompts/voice alerts as (row id, entry) in id order,
+    # the row ids the agent deferred (agent_pending), and the pending ids it re-checked.
+    # Rows go to process() one at a time so each alert is tagged with its row.
+    agent = agent_cls(agent_name)
+    agent.outbox = []
+    alerts, pending, resolved = [], [], []
+    if hasattr(agent, "rules"):
+        matches = fetch_matching_records(agent.rules, after_id, upto_id, shard=(shard, shards))
+        batches = [(matches["id"].tolist(), matches)] if len(matches) else []
+    else:
+        resolved, rows = fetch_pending(agent_name, table_name, shard=(shard, shards))
+        batches = [(resolved, rows)] if rows else []
+        batches = itertools.chain(batches, _with_ids(table_name, after_id, upto_id, (shard, shards)))
+    for ids, records in batches:
+        for i, row_id in enumerate(ids):
+            agent.deferred = []
+            start = len(agent.outbox)
+            if agent.process(records.iloc[i:i + 1] if hasattr(records, "iloc") else records[i:i + 1]) == 0:
+                return alerts, pending, resolved  # the shard's cap; the parent stops at or before this row
+            alerts += [(row_id, entry) for entry in agent.outbox[start:]]
+            if agent.deferred:
+                pending.append(row_id)
+    return alerts, pending, resolved
+
+
+def _with_ids(table_name, after_id, upto_id, shard):
+    # iter_new_records batches as (ids, rows)
+    for last_id, rows in iter_new_records(table_name, after_id, upto_id, shard=shard):
+        yield record_ids(table_name, after_id, last_id, shard), rows
+        after_id = last_id
+
+
+def _alert_cap(agent):
+    # The per-pass alert cap the agent applies in RunAgent (None: uncapped)
+    return agent.rules.max_alerts if hasattr(agent, "rules") else getattr(agent, "max_alerts", None)
+
+
+def _init_worker(db_path):
+    # Workers do not inherit this process's module state: point db.* at the same database
+    db.DB_PATH = db_path
+
+
+def shard_pool(shards):
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if context.get_start_method() == "forkserver":
+        # Imported once in the server, so each worker forks with the agents already loaded
+        context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=shards, mp_context=context, initializer=_init_worker,
+                               initargs=(db.DB_PATH,))
+
+
+class ShardedRunAgent(RunAgent):
+    def __init__(self, shards=None):
+        self.shards = shards or os.cpu_count() or 1
+
+    def run_agents(self):
+        agents = [
+            (HealthAgent("HealthAgent"), "health"),
+            (ReminderAgent("ReminderAgent"), "reminders"),
+            (SafetyAgent("SafetyAgent"), "safety"),
+        ]
+        # Shard workers return prompts with reading times; they are correlated here, across shards and agents
+        self.attach_correlator([agent for agent, _ in agents])
+        from llm_queue_worker import LLM_RUNTIME
+        if LLM_RUNTIME == "async":
+            start_runtime()
+        with shard_pool(self.shards) as pool:
+            self.process_sharded(pool, agents)
+        self.flush_incidents()
+        runtime = active_runtime()
+        if runtime:
+            runtime.join()
+        self.wait_for_llm()
+
+    @staticmethod
+    def cap_alerts(alerts, cap):
+        # Row id of the cap-th LLM alert in the id-sorted alerts, or None if there are fewer
+        prompts = 0
+        for row_id, (kind, *_) in alerts:
+            if kind == "llm":
+                prompts += 1
+                if cap is not None and prompts >= cap:
+                    return row_id
+        return None
+
+    def process_sharded(self, pool, agents):
+        # Every (agent, shard) task is submitted up front so all cores stay busy across agents
+        plans = []
+        for agent, table_name in agents:
+            last_id = get_watermark(agent.name)
+            high_id = max_record_id(table_name)
+            if high_id <= last_id and not fetch_pending(agent.name, table_name)[0]:
+                print(f"[ShardedRunAgent] No new {table_name} rows for {agent.name}.")
+                continue
+            futures = [pool.submit(_run_shard, type(agent), agent.name, table_name, last_id, high_id, k, self.shards)
+                       for k in range(self.shards)]
+            plans.append((agent, table_name, last_id, high_id, futures))
+
+        for agent, table_name, last_id, high_id, futures in plans:
+            alerts, pending, resolved = [], [], []
+            for future in as_completed(futures):
+                shard_alerts, deferred, rechecked = future.result()
+                alerts += shard_alerts
+                pending += deferred
+                resolved += rechecked
+            alerts.sort(key=lambda alert: alert[0])  # stable: a row's prompt stays ahead of its voice alert
+            upto_id = self.cap_alerts(alerts, _alert_cap(agent))
+            if upto_id is not None:
+                # Capped: rows after the last alert sent (new or pending) are handled by the next pass
+                alerts = [alert for alert in alerts if alert[0] <= upto_id]
+                pending = [row_id for row_id in pending if row_id <= upto_id]
+                resolved = [row_id for row_id in resolved if row_id <= upto_id]
+            prompts = 0
+            for _, (kind, *entry) in alerts:
+                if kind == "llm":
+                    agent.log_to_llm(*entry)
+                    prompts += 1
+                else:
+                    agent.speak(*entry)
+            agent.flush()
+            done_id = max(high_id if upto_id is None else upto_id, last_id)
+            set_watermark(agent.name, table_name, done_id, pending=pending, resolved=resolved)
+            if done_id > last_id:
+                print(f"[ShardedRunAgent] {agent.name} processed {table_name} rows {last_id + 1}..{done_id} "
+                      f"on {self.shards} shards ({prompts} prompts).")
+            if done_id < high_id:
+                print(f"[ShardedRunAgent] {agent.name} reached its alert cap; rows {done_id + 1}.."
+                      f"{high_id} are left for the next pass.")
+            if resolved:
+                print(f"[ShardedRunAgent] {agent.name} resolved {len(set(resolved) - set(pending))} of "
+                      f"{len(resolved)} pending {table_name} rows.")
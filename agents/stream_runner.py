@@ -0,0 +1,287 @@
+# agents/stream_runner.py
+# Long-running daemon: tails new rows (and accepts pushed readings over a local HTTP
+# ingest API) and streams them to the agents, instead of one batch pass over the DB.
+#
+#   POST /ingest/<health|safety|reminders>  {"rows": [[...], ...]} or [{"user_id": ..., ...}]
+#   GET  /metrics                            queue depths + ingest -> agent_communications latency
+#
+# The stream starts at the tail: rows already in the DB that an agent has not processed are skipped
+# (their range is printed), so pushed readings are dispatched on the next poll rather than after
+# every alert-capped pass over the backlog. catch_up=True (main.py --stream --catch-up) dispatches
+# the backlog first instead.
+import json
+import queue
+import signal
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db_pool
+import schema
+from db import DB_PATH, get_watermark, insert_data, max_record_id, set_watermark
+from metrics import LatencyStats
+from llm_queue_worker import llm_prompt_queue, llm_worker
+from speech_service import speech_service
+from agents.health_agent import HealthAgent
+from agents.reminder_agent import ReminderAgent
+from agents.safety_agent import SafetyAgent
+from agents.run_agent import RunAgent
+
+INGEST_TABLES = ("health", "safety", "reminders")
+PENDING_TTL = 300  # seconds a reading waits for an agent response before it stops counting
+
+
+class StreamRunner(RunAgent):
+    def __init__(self, host="127.0.0.1", port=8765, poll_interval=0.25, max_pending_prompts=500,
+                 ingest_queue_size=10000, ingest_batch_size=500, writer_flush_interval=0.1,
+                 incident_max_delay=5.0, catch_up=False):
+        self.host = host
+        self.port = port
+        self.catch_up = catch_up
+        self.poll_interval = poll_interval
+        self.max_pending_prompts = max_pending_prompts  # backpressure threshold on the LLM queue
+        self.ingest_batch_size = ingest_batch_size
+        self.agents = [
+            (HealthAgent("HealthAgent"), "health"),
+            (ReminderAgent("ReminderAgent"), "reminders"),
+            (SafetyAgent("SafetyAgent"), "safety"),
+        ]
+        # With INCIDENT_WINDOW set, a user's alerts are held up to incident_max_delay seconds to be merged
+        self.attach_correlator([agent for agent, _ in self.agents], max_delay=incident_max_delay)
+
+        self.ingest_queue = queue.Queue(maxsize=ingest_queue_size)
+        self.stop_event = threading.Event()
+        self.wake = threading.Event()
+        self.server = None
+        self.threads = []
+
+        # Latency from reading ingest to its agent_communications row being committed
+        self.latency = LatencyStats()
+        self._lock = threading.Lock()
+        self._arrivals = {table: deque() for table in INGEST_TABLES}  # (first id, last id, received_at)
+        self._pending = defaultdict(deque)  # (sender, user_id) -> ingest times awaiting a response
+        self.backpressure_waits = 0
+
+        llm_worker.writer.flush_interval = writer_flush_interval
+        llm_worker.writer.commit_listeners.append(self._on_commit)
+
+    # === Lifecycle ===
+    def run(self):
+        self.start()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda *_: self.stop_event.set())
+            signal.signal(signal.SIGTERM, lambda *_: self.stop_event.set())
+        print(f"[StreamRunner] Streaming. Ingest API on http://{self.host}:{self.port} (Ctrl+C to stop)")
+        last_report = time.monotonic()
+        while not self.stop_event.wait(1):
+            if time.monotonic() - last_report >= 10:
+                print(f"[StreamRunner] {json.dumps(self.metrics())}")
+                last_report = time.monotonic()
+        self.shutdown()
+
+    def start(self):
+        if not self.catch_up:
+            self._skip_backlog()
+        self.server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.threads = [
+            threading.Thread(target=self.server.serve_forever, name="IngestAPI", daemon=True),
+            threading.Thread(target=self._ingest_loop, name="IngestWriter", daemon=True),
+            threading.Thread(target=self._tail_loop, name="Tailer", daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+
+    def shutdown(self):
+        print("[StreamRunner] Shutting down: draining ingest queue and pending prompts...")
+        self.stop_event.set()
+        self.wake.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for t in self.threads[1:]:
+            t.join()
+        self._poll_once()  # rows that landed while stopping
+        self.flush_incidents()
+        for agent, _ in self.agents:
+            agent.shutdown()
+        llm_prompt_queue.join()
+        llm_worker.writer.flush()
+        print(f"[StreamRunner] Stopped. {json.dumps(self.metrics())}")
+
+    def _skip_backlog(self):
+        for agent, table_name in self.agents:
+            last_id, high_id = get_watermark(agent.name), max_record_id(table_name)
+            if high_id > last_id:
+                set_watermark(agent.name, table_name, high_id)
+                print(f"[StreamRunner] {agent.name} skips unprocessed {table_name} rows {last_id + 1}..{high_id} "
+                      f"(--catch-up dispatches them first).")
+
+    # === Ingest ===
+    def submit(self, table_name, rows):
+        # Returns how many rows were accepted before the ingest queue filled up
+        received_at = time.monotonic()
+        accepted = 0
+        for row in rows:
+            try:
+                self.ingest_queue.put_nowait((table_name, row, received_at))
+            except queue.Full:
+                break
+            accepted += 1
+        return accepted
+
+    def _ingest_loop(self):
+        while not (self.stop_event.is_set() and self.ingest_queue.empty()):
+            try:
+                batch = [self.ingest_queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.ingest_batch_size:
+                try:
+                    batch.append(self.ingest_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            by_table = defaultdict(list)
+            for table_name, row, received_at in batch:
+                by_table[table_name].append((row, received_at))
+            for table_name, items in by_table.items():
+                try:
+                    # On the shared writer, so first_id..last_id are exactly this batch's rows
+                    with db_pool.pool(DB_PATH).writer() as conn:
+                        max_id = f"SELECT COALESCE(MAX(id), 0) FROM {table_name}"
+                        first_id = conn.execute(max_id).fetchone()[0] + 1
+                        insert_data(table_name, [row for row, _ in items], conn=conn)
+                        last_id = conn.execute(max_id).fetchone()[0]
+                    with self._lock:
+                        self._arrivals[table_name].append((first_id, last_id, min(t for _, t in items)))
+                except Exception as e:
+                    print(f"[StreamRunner] Failed to ingest {len(items)} {table_name} rows: {e}")
+            self.wake.set()
+
+    # === Dispatch ===
+    def _tail_loop(self):
+        last_prune = time.monotonic()
+        while not self.stop_event.is_set():
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            if llm_prompt_queue.qsize() >= self.max_pending_prompts:
+                # Backpressure: leave new rows in the DB (watermarks untouched) until the LLM catches up
+                self.backpressure_waits += 1
+                continue
+            try:
+                self._poll_once()
+                if self.correlator:
+                    self.flush_incidents(self.correlator.max_delay)
+            except Exception as e:
+                print(f"[StreamRunner] Dispatch error: {e}")
+            if time.monotonic() - last_prune > 30:
+                self._prune_pending()
+                last_prune = time.monotonic()
+
+    def _poll_once(self):
+        for agent, table_name in self.agents:
+            self.process_new_rows(agent, table_name, on_batch=self._on_batch, verbose=False)
+
+    def _on_batch(self, agent, table_name, records, first_id, last_id):
+        now = time.monotonic()
+        with self._lock:
+            arrivals = self._arrivals[table_name]
+            times = []
+            while arrivals and arrivals[0][1] <= last_id:
+                times.append(arrivals.popleft()[2])
+            if arrivals and arrivals[0][0] <= last_id:
+                times.append(arrivals[0][2])  # batch covers the start of a larger pushed insert
+            ingest_time = min(times) if times else now  # rows written by someone else: seen now
+
+            user_ids = records["user_id"] if hasattr(records, "columns") else [row[0] for row in records]
+            for user_id in user_ids:
+                self._pending[(agent.name, user_id)].append(ingest_time)
+
+    def _on_commit(self, rows):
+        now = time.monotonic()
+        with self._lock:
+            for sender, user_id, *_ in rows:
+                waiting = self._pending.get((sender, user_id))
+                if waiting:
+                    self.latency.observe(now - waiting.popleft())
+                    if not waiting:
+                        del self._pending[(sender, user_id)]
+
+    def _prune_pending(self):
+        # Readings that never produced an alert would otherwise accumulate forever
+        cutoff = time.monotonic() - PENDING_TTL
+        with self._lock:
+            for key in list(self._pending):
+                waiting = self._pending[key]
+                while waiting and waiting[0] < cutoff:
+                    waiting.popleft()
+                if not waiting:
+                    del self._pending[key]
+
+    def metrics(self):
+        return {
+            "ingest_to_log_latency": self.latency.summary(),
+            "ingest_queue_depth": self.ingest_queue.qsize(),
+            "llm_queue_depth": llm_prompt_queue.qsize(),
+            "llm_queue_lanes": llm_prompt_queue.lane_depths(),
+            "llm_queue_wait": llm_prompt_queue.wait_stats(),
+            "llm_guard": llm_worker.guard_stats(),
+            "writer_queue_depth": llm_worker.writer.queue_depth(),
+            "backpressure_waits": self.backpressure_waits,
+            "incidents": dict(self.correlator.stats, held=self.correlator.pending()) if self.correlator else None,
+            "llm": dict(llm_worker.stats),
+            "voice": dict(speech_service.stats),
+        }
+
+
+def _make_handler(runner):
+    class IngestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send(200, runner.metrics())
+            else:
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 2 or parts[0] != "ingest" or parts[1] not in INGEST_TABLES:
+                self._send(404, {"error": f"unknown path {self.path}"})
+                return
+            if runner.stop_event.is_set():
+                self._send(503, {"error": "shutting down"})
+                return
+            table_name = parts[1]
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                rows = body["rows"] if isinstance(body, dict) else body
+                columns = schema.RAW_COLUMNS[table_name]
+                rows = [tuple(r.get(c) for c in columns) if isinstance(r, dict) else tuple(r) for r in rows]
+                if any(len(r) != len(columns) for r in rows):
+                    raise ValueError(f"{table_name} rows need {len(columns)} columns: {columns}")
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+
+            accepted = runner.submit(table_name, rows)
+            if accepted < len(rows):
+                # Backpressure: the client should retry the rejected tail later
+                self._send(429, {"accepted": accepted, "rejected": len(rows) - accepted})
+            else:
+                self._send(202, {"accepted": accepted})
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return IngestHandler
@@ -1,32 +1,48 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import os
+import time
 import plotly.express as px
 from datetime import datetime
 
 # === SQLite Setup ===
-DB_PATH = "elderly_care.db"
+# Counts, pages and chart aggregates are pushed down to SQL (see dashboard_queries.py)
+import dashboard_queries as dq
+import metrics
+DB_PATH = dq.DB_PATH
 
-@st.cache_data
-def load_table(table_name):
-    if not os.path.exists(DB_PATH):
-        return pd.DataFrame()
+# Counts, aggregates and the latest logs live in one process-wide object that each rerun tops up
+# with only the rows added since the last one; page caches below are keyed on the table version
+# (max rowid), so they are reused until that table actually grows.
+@st.cache_resource
+def live_data():
+    return dq.LiveDashboardData(DB_PATH)
+
+live = live_data()
+live.refresh()
+
+def version(table_name):
+    return live.versions.get(table_name.lower(), 0)
+
+# Columnar snapshot of the reading tables (COLUMNAR_SNAPSHOT, see columnar.py), reopened when re-exported
+@st.cache_resource
+def column_snapshot(snapshot_version):
+    return dq.open_snapshot(DB_PATH)
+
+@st.cache_data(max_entries=64)
+def load_page(table_name, columns, page_num, page_size, table_version):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-        conn.close()
-        return df
+        return dq.fetch_page(table_name, list(columns), page_num, page_size,
+                             snapshot=column_snapshot(dq.snapshot_version()))
     except Exception as e:
         st.error(f"Error loading {table_name}: {e}")
         return pd.DataFrame()
 
-@st.cache_data
-def get_llm_logs():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM agent_communications ORDER BY timestamp DESC", conn)
-    conn.close()
-    return df
+def count_rows(table_name):
+    return live.counts.get(table_name.lower(), 0)
+
+def get_recent_logs(limit=5):
+    return live.recent_logs(limit)
 
 # === UI Layout ===
 st.set_page_config(page_title="Elderly Care AI Dashboard", layout="wide")
@@ -34,7 +50,10 @@ st.title("👵 Elderly Care Multi-Agent Dashboard")
 
 # === Sidebar Navigation ===
 st.sidebar.header("🔍 Navigation")
-page = st.sidebar.radio("Go to", ["Overview", "Data Viewer", "Agent Activity", "Visual Insights"])
+page = st.sidebar.radio("Go to", ["Overview", "Data Viewer", "Agent Activity", "Visual Insights", "Trends",
+                                 "Pipeline Metrics"])
+auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh", value=False)
+refresh_interval = st.sidebar.slider("Check every (s)", 2, 60, 5, disabled=not auto_refresh)
 
 # === Overview Page ===
 if page == "Overview":
@@ -52,9 +71,8 @@ if page == "Overview":
     - 💬 **LLM Assistance:** Agents use LLMs to generate contextual responses and assist in decision-making.
     """)
 
-    logs = get_llm_logs()
-    total_logs = len(logs)
-    recent_logs = logs.head(5)
+    total_logs = count_rows("agent_communications")
+    recent_logs = get_recent_logs(5)
 
     st.metric("Total Agent Logs", total_logs)
     st.subheader("Recent 5 Agent Activities")
@@ -63,8 +81,7 @@ if page == "Overview":
     # Total entries by table
     table_stats = {}
     for table in ["Health", "Safety", "Reminders"]:
-        df = load_table(table)
-        table_stats[table] = len(df)
+        table_stats[table] = count_rows(table)
 
     st.subheader("📋 Data Records Summary")
     stats_df = pd.DataFrame.from_dict(table_stats, orient="index", columns=["Records"])
@@ -74,19 +91,19 @@ if page == "Overview":
 elif page == "Data Viewer":
     st.subheader("📋 View Table Data")
     table_choice = st.selectbox("*Select a table*", ["Health", "Safety", "Reminders"])
-    df = load_table(table_choice)
-    if not df.empty:
+    total_rows = count_rows(table_choice)
+    if total_rows:
         st.markdown("*Select columns to display:*")
-        selected_columns = st.multiselect("", options=df.columns.tolist())
-        df = df[selected_columns] if selected_columns else df
+        selected_columns = st.multiselect("", options=dq.table_columns(table_choice))
 
         page_size = 20  # rows per page
-        total_pages = (len(df) - 1) // page_size + 1
+        total_pages = (total_rows - 1) // page_size + 1
         page_num = st.number_input("*Page*", min_value=1, max_value=total_pages, value=1, step=1)
         start_idx = (page_num - 1) * page_size
         end_idx = start_idx + page_size
-        st.dataframe(df.iloc[start_idx:end_idx], use_container_width=True)
-        st.caption(f"Showing {start_idx + 1} to {min(end_idx, len(df))} of {len(df)} rows")
+        df = load_page(table_choice, tuple(selected_columns), int(page_num), page_size, version(table_choice))
+        st.dataframe(df, use_container_width=True)
+        st.caption(f"Showing {start_idx + 1} to {min(end_idx, total_rows)} of {total_rows} rows")
     else:
         st.warning("No data found.")
 
@@ -94,62 +111,38 @@ elif page == "Data Viewer":
 elif page == "Agent Activity":
     st.subheader("🧠 Agent Communication Logs")
 
-    @st.cache_data
-    def load_logs_by_agent(agent_type):
-        agent_map = {
-            "health": "HealthAgent",
-            "safety": "SafetyAgent",
-            "reminders": "ReminderAgent"
-        }
-        agent_name = agent_map.get(agent_type.lower(), "")
+    @st.cache_data(max_entries=64)
+    def load_logs_by_agent(agent_type, user_filter, page_num, page_size, logs_version):
         if not os.path.exists(DB_PATH):
-            return pd.DataFrame()
+            return pd.DataFrame(), 0
         try:
-            conn = sqlite3.connect(DB_PATH)
-            query = f"""
-                SELECT user_id, message, response, timestamp, sender
-                FROM agent_communications 
-                WHERE sender = '{agent_name}'
-                ORDER BY timestamp DESC
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-            return df
+            return (dq.agent_logs(agent_type, user_filter, page_num, page_size),
+                    dq.count_agent_logs(agent_type, user_filter))
         except Exception as e:
             st.error(f"Error loading logs: {e}")
-            return pd.DataFrame()
+            return pd.DataFrame(), 0
+
+    @st.cache_data(max_entries=16)
+    def load_severity_logs(limit, severities, logs_version):
+        return dq.severity_logs(limit, list(severities))
 
-    table_choice = st.selectbox("Select agent type", ["Health", "Safety", "Reminders"])
-    logs_df = load_logs_by_agent(table_choice)
+    table_choice = st.selectbox("Select agent type", ["Health", "Safety", "Reminders", "Incidents"])
     st.caption(f"Showing logs for: **{table_choice.capitalize()} Agent**")
 
     user_filter = st.text_input("🔍 Filter by User ID:")
+    page_size = 50
+    page_num = st.number_input("*Page*", min_value=1, value=1, step=1)
+    filtered_df, total_logs = load_logs_by_agent(table_choice, user_filter, int(page_num), page_size,
+                                                 version("agent_communications"))
 
-    if not logs_df.empty:
-        if user_filter:
-            filtered_df = logs_df[logs_df['user_id'].astype(str).str.contains(user_filter, case=False, na=False)]
-        else:
-            filtered_df = logs_df
-
+    if total_logs:
         st.dataframe(filtered_df, use_container_width=True)
+        st.caption(f"Page {page_num} of {(total_logs - 1) // page_size + 1} ({total_logs} logs)")
 
         st.markdown("<h2 style='font-size:16px;'>🚨 Alerts by Severity (from LLM)</h2>", unsafe_allow_html=True)
-        df = get_llm_logs()
-
-        def severity_level(resp):
-            if not resp: return "Unknown"
-            resp_lower = resp.lower()
-            if any(w in resp_lower for w in ["immediate", "emergency", "critical"]):
-                return "High"
-            elif any(w in resp_lower for w in ["should", "check", "notify"]):
-                return "Medium"
-            else:
-                return "Low"
-
-        df['Severity'] = df['response'].apply(severity_level)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-        st.dataframe(df[[ 'user_id', 'message', 'Severity']])
+        # Severity is stored with each log when it is written; the filter is an index lookup
+        severity_filter = st.multiselect("Severity", dq.SEVERITY_LEVELS)
+        st.dataframe(load_severity_logs(200, tuple(severity_filter), version("agent_communications")))
     else:
         st.info("No agent communications yet for this category.")
 
@@ -157,23 +150,131 @@ elif page == "Agent Activity":
 elif page == "Visual Insights":
     st.subheader("📈 Visual Insights")
 
-    llm_df = get_llm_logs()
-    if not llm_df.empty:
-        llm_df['timestamp'] = pd.to_datetime(llm_df['timestamp'])
-        llm_df['hour'] = llm_df['timestamp'].dt.hour
-        hourly_counts = llm_df.groupby('hour').size().reset_index(name='log_count')
-
+    hourly_counts = live.hourly
+    if hourly_counts is not None and not hourly_counts.empty:
         fig = px.line(hourly_counts, x='hour', y='log_count', title='LLM Agent Logs by Hour')
         st.plotly_chart(fig, use_container_width=True)
 
-        agent_counts = llm_df['sender'].value_counts().reset_index()
-        agent_counts.columns = ['Agent', 'Log Count']
+        agent_counts = live.agents
 
         fig2 = px.pie(agent_counts, names='Agent', values='Log Count', title='Logs per Agent')
         st.plotly_chart(fig2, use_container_width=True)
 
-        llm_df['msg_len'] = llm_df['message'].apply(lambda x: len(x.split()) if x else 0)
-        fig3 = px.histogram(llm_df, x='msg_len', nbins=30, title='Distribution of Message Lengths')
+        msg_lengths = live.lengths
+        fig3 = px.histogram(msg_lengths, x='msg_len', y='count', histfunc='sum', nbins=30,
+                            title='Distribution of Message Lengths')
         st.plotly_chart(fig3, use_container_width=True)
+
+        severities = live.severities
+        if severities is not None and not severities.empty:
+            fig4 = px.bar(severities, x='Severity', y='count', title='Responses by Severity')
+            st.plotly_chart(fig4, use_container_width=True)
+    else:
+        st.info("No LLM logs found for visualizations.")
+
+# === Trends Page ===
+# Reads the rollup tables only, so charts stay fast however many raw readings there are
+elif page == "Trends":
+    st.subheader("📉 Vitals & Safety Trends")
+
+    @st.cache_data(max_entries=64)
+    def load_user_trend(user_id, metric, granularity, health_version):
+        return dq.user_trend(user_id, metric, granularity)
+
+    @st.cache_data(max_entries=16)
+    def load_vitals_trend(metric, health_version):
+        return dq.vitals_trend(metric)
+
+    @st.cache_data(max_entries=4)
+    def load_falls(safety_version):
+        return dq.falls_by_location(), dq.falls_by_day()
+
+    if not dq.rollups_ready():
+        st.info("Trend tables are not built yet; run main.py once to migrate the database.")
+    else:
+        metric = st.selectbox("Vital", dq.TREND_METRICS, format_func=lambda m: m.replace("_", " ").title())
+        user_id = st.text_input("👤 User ID (leave empty for all users)").strip()
+        if user_id:
+            granularity = st.radio("Bucket", list(dq.TREND_GRANULARITY), horizontal=True)
+            trend = load_user_trend(user_id, metric, granularity, version("health"))
+            title = f"{metric} for {user_id} ({granularity.lower()})"
+        else:
+            trend = load_vitals_trend(metric, version("health"))
+            title = f"{metric} across all users (hourly)"
+        if trend.empty:
+            st.info("No readings for this selection.")
+        else:
+            fig = px.line(trend, x='bucket', y=['min', 'mean', 'max'], title=title)
+            st.plotly_chart(fig, use_container_width=True)
+            fig2 = px.bar(trend, x='bucket', y=['alerts', 'abnormal_readings'], barmode='group',
+                          title='Alerts and abnormal readings')
+            st.plotly_chart(fig2, use_container_width=True)
+
+        by_location, by_day = load_falls(version("safety"))
+        if not by_location.empty:
+            fig3 = px.bar(by_location, x='location', y='falls', title='Falls per Location')
+            st.plotly_chart(fig3, use_container_width=True)
+            fig4 = px.line(by_day, x='day', y='falls', color='location', title='Falls per Day by Location')
+            st.plotly_chart(fig4, use_container_width=True)
+
+# === Pipeline Metrics Page ===
+# Reads the snapshot the agent pipeline exports when run with METRICS=1 (see metrics.py)
+elif page == "Pipeline Metrics":
+    st.subheader("⏱️ Pipeline Metrics")
+    snapshot = metrics.read_snapshot()
+    if not snapshot:
+        st.info(f"No metrics yet. Run the pipeline with METRICS=1 (snapshots are written to {metrics.METRICS_FILE}).")
     else:
-        st.info("No LLM logs found for visualizations.")
\ No newline at end of file
+        def total(section, name, **match):
+            return sum(v["value"] for v in snapshot[section].get(name, [])
+                       if all(v.get(k) == m for k, m in match.items()))
+
+        age = time.time() - snapshot["time"]
+        st.caption(f"Snapshot from {datetime.fromtimestamp(snapshot['time']):%H:%M:%S} "
+                   f"({age:.0f}s ago, pipeline up {snapshot['uptime_s']:.0f}s)")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("LLM queue depth", int(total("gauges", "llm_queue_depth")))
+        col2.metric("DB writer queue", int(total("gauges", "db_writer_queue_depth")))
+        col3.metric("LLM prompts/s", snapshot["rates"].get("llm_prompts_total", 0.0))
+        col4.metric("Model calls", int(total("counters", "llm_responses_total", source="model")))
+
+        lanes = pd.DataFrame(snapshot["gauges"].get("llm_queue_lane_depth", []))
+        if not lanes.empty:
+            st.plotly_chart(px.bar(lanes, x="severity", y="value", title="Queue depth by severity"),
+                            use_container_width=True)
+
+        stages = pd.DataFrame(snapshot["stages"])
+        if not stages.empty:
+            stages["agent"] = stages.get("agent", pd.Series(dtype=object)).fillna("-")
+            stages = stages.dropna(subset=["p50_ms"])
+            st.subheader("Stage latency")
+            st.dataframe(stages[["stage", "agent", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_s"]],
+                         use_container_width=True)
+            by_stage = stages.melt(id_vars=["stage", "agent"], value_vars=["p50_ms", "p99_ms"],
+                                   var_name="percentile", value_name="ms")
+            fig = px.bar(by_stage, x="stage", y="ms", color="percentile", barmode="group", facet_col="agent",
+                         log_y=True, title="p50 / p99 per stage")
+            st.plotly_chart(fig, use_container_width=True)
+
+        responses = pd.DataFrame(snapshot["counters"].get("llm_responses_total", []))
+        if not responses.empty:
+            st.plotly_chart(px.pie(responses, names="source", values="value", title="LLM answers by source"),
+                            use_container_width=True)
+
+        traces = pd.DataFrame(snapshot["traces"])
+        if not traces.empty:
+            traces["time"] = pd.to_datetime(traces["time"], unit="s")
+            st.subheader("Recent spans")
+            st.dataframe(traces.iloc[::-1].head(50), use_container_width=True)
+
+# === Auto-refresh ===
+# Polls only the table versions (one MAX(rowid) per table) and reruns the script when one moves;
+# the rerun then reads just the new rows. The status line is a Streamlit call on every poll,
+# which lets a widget interaction interrupt the wait.
+if auto_refresh:
+    seen = dict(live.versions)
+    status = st.sidebar.empty()
+    while dq.table_versions(DB_PATH) == seen:
+        status.caption(f"No new data as of {datetime.now():%H:%M:%S}")
+        time.sleep(refresh_interval)
+    st.rerun()
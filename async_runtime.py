@@ -0,0 +1,329 @@
+# async_runtime.py
+# asyncio alternative to LLMBackgroundWorker (LLM_RUNTIME=async): one event-loop thread
+# dispatches every prompt, model calls use non-blocking HTTP on asyncio streams (or, with
+# LLM_BACKEND=auto and no server, `ollama run` as an asyncio subprocess), and responses go
+# to the shared AgentLogWriter, so prompts in flight cost no threads.
+# BaseAgent.log_to_llm keeps its sync API and is routed here once the runtime is started.
+import asyncio
+import itertools
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from llm_backends import (LLM_BACKEND, OLLAMA_HOST, LLM_TIMEOUT, TIMEOUT_RESPONSE, UNAVAILABLE_RESPONSE, LLMBackendError,
+                          is_error_response)
+from llm_batching import template_key, fan_out
+from llm_guard import AdaptiveLimiter, CircuitBreaker
+from llm_scheduler import PRIORITY_NAMES, priority_level
+from metrics import LatencyStats, registry as metrics
+
+# Same series as the threaded worker's (llm_queue_worker.py)
+PROMPTS = metrics.counter("llm_prompts_total", "Prompts answered, including ones served by a shared model call")
+RESPONSES = metrics.counter("llm_responses_total", "LLM answers by source (model, cache, error)")
+
+
+# === Ollama REST API on asyncio streams (keep-alive HTTP/1.1, no thread per call) ===
+class AsyncOllamaBackend:
+    name = "async-http"
+
+    def __init__(self, host=OLLAMA_HOST, timeout=LLM_TIMEOUT, keep_alive="30m"):
+        parts = urlsplit(host)
+        self.host = parts.hostname
+        self.ssl = parts.scheme == "https"
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._idle = []  # open (reader, writer) pairs ready for reuse
+
+    async def generate(self, model_name, prompt):
+        payload = {"model": model_name, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive}
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            status, data = await asyncio.wait_for(self._post("/api/generate", body), self.timeout)
+        except asyncio.TimeoutError:
+            return TIMEOUT_RESPONSE
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise LLMBackendError(f"Ollama server unreachable at {self.host}:{self.port}: {e}")
+        if status != 200:
+            return f"LLM failed with code {status}: {data.decode('utf-8', 'replace').strip()}"
+        return json.loads(data).get("response", "").strip()
+
+    async def _post(self, path, body):
+        # A pooled connection may have been closed by the server while idle: retry once on a fresh one
+        while self._idle:
+            reader, writer = self._idle.pop()
+            try:
+                return await self._request(reader, writer, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        return await self._request(reader, writer, path, body)
+
+    async def _request(self, reader, writer, path, body):
+        try:
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("connection closed by server")
+            status = int(status_line.split()[1])
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                chunks = []
+                while (size := int((await reader.readline()).split(b";")[0], 16)):
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readline()
+                await reader.readline()
+                data = b"".join(chunks)
+            else:
+                data = await reader.readexactly(int(headers.get("content-length", 0)))
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, data
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+# === Ollama CLI on asyncio subprocesses (same behaviour as llm_backends.SubprocessBackend) ===
+class AsyncSubprocessBackend:
+    name = "async-subprocess"
+
+    def __init__(self, command=("ollama", "run"), timeout=LLM_TIMEOUT):
+        self.command = list(command)
+        self.timeout = timeout
+
+    async def generate(self, model_name, prompt):
+        try:
+            proc = await asyncio.create_subprocess_exec(*self.command, model_name, prompt,
+                                                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError as e:
+            raise LLMBackendError(f"{self.command[0]} not found: {e}")
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return TIMEOUT_RESPONSE
+        if proc.returncode == 0:
+            return stdout.decode("utf-8", "replace").strip()
+        return f"LLM failed with code {proc.returncode}: {stderr.decode('utf-8', 'replace').strip()}"
+
+    async def close(self):
+        pass
+
+
+# === Try the HTTP client first, drop to the CLI if the server is not reachable (as FallbackBackend) ===
+class AsyncFallbackBackend:
+    name = "async-auto"
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    async def generate(self, model_name, prompt):
+        try:
+            return await self.primary.generate(model_name, prompt)
+        except LLMBackendError as e:
+            print(f"[LLMBackend] {self.primary.name} unavailable, falling back to {self.fallback.name}: {e}")
+            return await self.fallback.generate(model_name, prompt)
+
+    async def close(self):
+        await self.primary.close()
+        await self.fallback.close()
+
+
+def get_async_backend(kind=LLM_BACKEND):
+    # LLM_BACKEND picks the same transports as llm_backends.get_backend does for the threaded worker
+    if kind == "http":
+        return AsyncOllamaBackend()
+    if kind == "subprocess":
+        return AsyncSubprocessBackend()
+    if kind == "auto":
+        return AsyncFallbackBackend(AsyncOllamaBackend(), AsyncSubprocessBackend())
+    raise ValueError(f"Unknown LLM backend: {kind}")
+
+
+class AsyncLLMRuntime:
+    def __init__(self, model_name="tinyllama", backend=None, cache=None, writer=None,
+                 max_concurrency=64, limiter=None, breaker=None, aging_interval=15.0):
+        self.model_name = model_name
+        self.backend = backend or get_async_backend()
+        self.cache = cache
+        self.writer = writer
+        self.limiter = limiter or AdaptiveLimiter(max_limit=max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        # Same ordering as PriorityPromptQueue's aging: a prompt ranks as if it had been
+        # enqueued priority * aging_interval seconds later, which a plain heap can express
+        self.aging_interval = aging_interval
+        self.stats = {"prompts": 0, "model_calls": 0}
+        self.wait_times = {level: LatencyStats() for level in PRIORITY_NAMES}
+        self.loop = None
+        self.thread = None
+        self._seq = itertools.count()
+        self._unfinished = 0
+        self._done = threading.Condition()
+        self._in_flight = {}  # template key -> future of the model call serving it
+
+    # === Lifecycle ===
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self._queue = asyncio.PriorityQueue()
+            self._slot_freed = asyncio.Event()
+            self._dispatcher = self.loop.create_task(self._dispatch())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="AsyncLLMRuntime", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        self.join()
+        asyncio.run_coroutine_threadsafe(self.backend.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    # === Sync API (safe from any thread) ===
+    def submit(self, sender, message, user_id="unknown", severity="normal"):
+        item = ((sender, message, user_id), priority_level(severity), time.monotonic())
+        with self._done:
+            self._unfinished += 1
+        if threading.current_thread() is self.thread:
+            self._enqueue(*item)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, *item)
+
+    def join(self, timeout=None):
+        with self._done:
+            return self._done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    async def drain(self):
+        while self._unfinished:
+            await asyncio.sleep(0.01)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    # === Event loop side ===
+    def _enqueue(self, item, level, enqueued_at):
+        self._queue.put_nowait((enqueued_at + level * self.aging_interval, next(self._seq), item, level, enqueued_at))
+
+    async def _dispatch(self):
+        while True:
+            _, _, item, level, enqueued_at = await self._queue.get()
+            sender, message, user_id = item
+            key = template_key(sender, message, user_id)
+            if key in self._in_flight:
+                # Same prompt (modulo user id) already at the model: share its answer, no extra call
+                self.loop.create_task(self._follow(item, self._in_flight[key]))
+                self._observe_wait(item, level, enqueued_at)
+                continue
+            prompt = f"[{sender}] {message}\nRespond with action."
+            cached = self.cache.get(self.model_name, prompt) if self.cache else None
+            if cached is not None or not self.breaker.allow():
+                self._observe_wait(item, level, enqueued_at)
+                RESPONSES.inc(source="error" if cached is None else "cache")
+                self._finish(item, UNAVAILABLE_RESPONSE if cached is None else cached)
+                continue
+            while not self.limiter.try_acquire():
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+            self._observe_wait(item, level, enqueued_at)
+            future = self._in_flight[key] = self.loop.create_future()
+            self.loop.create_task(self._lead(item, key, prompt, future))
+
+    def _observe_wait(self, item, level, enqueued_at):
+        waited = time.monotonic() - enqueued_at
+        self.wait_times[level].observe(waited)
+        metrics.record_span("queue_wait", waited, agent=item[0], user=item[2])
+
+    async def _lead(self, item, key, prompt, future):
+        try:
+            with metrics.span("ask_llm", agent=item[0], user=item[2]):
+                response = await self._ask_llm(prompt)
+        finally:
+            self._slot_freed.set()
+            del self._in_flight[key]
+        future.set_result((response, item[2]))
+        self.stats["model_calls"] += 1
+        self._finish(item, response)
+
+    async def _follow(self, item, future):
+        response, leader_user_id = await asyncio.shield(future)
+        self._finish(item, fan_out(response, leader_user_id, item[2]))
+
+    async def _ask_llm(self, prompt):
+        # Caller holds a limiter slot and has passed the circuit breaker
+        start = time.monotonic()
+        ok = False
+        try:
+            response = await self.backend.generate(self.model_name, prompt)
+            ok = not is_error_response(response)
+        except Exception as e:
+            response = f"LLM Error: {e}"
+        finally:
+            self.limiter.release(time.monotonic() - start, ok)
+            self.breaker.record(ok)
+        RESPONSES.inc(source="model" if ok else "error")
+        if ok and self.cache:
+            self.cache.put(self.model_name, prompt, response)
+        return response
+
+    def _finish(self, item, response):
+        sender, message, user_id = item
+        if self.writer:
+            with metrics.span("log_to_db", agent=sender, user=user_id):
+                self.writer.write((sender, user_id, message, response, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.stats["prompts"] += 1
+        PROMPTS.inc(agent=sender)
+        with self._done:
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._done.notify_all()
+
+    def wait_stats(self):
+        return {PRIORITY_NAMES[level]: stats.summary() for level, stats in self.wait_times.items()}
+
+    def guard_stats(self):
+        return {"breaker": self.breaker.stats(), "limiter": self.limiter.stats()}
+
+
+_runtime = None
+
+
+def start_runtime(**kwargs):
+    # Shares the threaded worker's response cache and DB writer (the worker itself is not started)
+    global _runtime
+    if _runtime is None:
+        from llm_queue_worker import llm_worker
+        kwargs.setdefault("model_name", llm_worker.model_name)
+        kwargs.setdefault("cache", llm_worker.cache)
+        kwargs.setdefault("writer", llm_worker.writer)
+        _runtime = AsyncLLMRuntime(**kwargs).start()
+        metrics.gauge("llm_queue_depth", fn=_runtime.qsize)
+        metrics.gauge("llm_concurrency_limit", fn=_runtime.limiter.concurrency)
+    return _runtime
+
+
+def active_runtime():
+    return _runtime
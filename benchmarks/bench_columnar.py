@@ -0,0 +1,173 @@
+# benchmarks/bench_columnar.py
+# Cold-start cost of reading the reading tables from SQLite vs the columnar snapshot (columnar.py).
+# Generates seeded exports (datagen.py), ingests them into a scratch database, exports a snapshot,
+# then runs each read path in a fresh process and reports wall time and resident memory:
+#   load        the whole table as rows (fetch_records) vs opening the snapshot (manifest + mmaps)
+#   dataframe   pd.read_sql_query("SELECT *") as the dashboard used to vs the snapshot frame
+#   replay      every row through iter_new_records batches vs SnapshotTable.iter_records
+#   matches     uncapped rule matches (SQL pushdown) vs rules evaluated on the snapshot
+#   last_page   the dashboard's last Data Viewer page (OFFSET) vs a snapshot slice
+# Outputs of both paths are checked to be identical. The OS page cache is warm for both.
+# At 10M rows the SQLite side of load/dataframe needs several GB of memory.
+#
+#   python -m benchmarks.bench_columnar --rows 2000000
+#   python -m benchmarks.bench_columnar --rows 10000000 --scenarios replay matches last_page
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("load", "dataframe", "replay", "matches", "last_page")
+RULE_SECTIONS = {"health": "health", "safety": "safety"}
+
+
+def proc_mb(field):
+    # VmRSS (current) / VmHWM (peak) of this process; unlike ru_maxrss, VmHWM is not inherited from the parent
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def du_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2 ** 20
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files) / 2 ** 20
+
+
+# === One read path, in its own process ===
+def worker(scenario, source, table, db_path, snap_dir):
+    import pandas as pd
+    with contextlib.redirect_stdout(sys.stderr):
+        import db
+    import columnar
+    db.DB_PATH = db_path
+    import dashboard_queries as dq
+    base = proc_mb("VmRSS")
+    if scenario == "last_page":
+        # The dashboard opens the snapshot once per process (st.cache_resource); time the page alone
+        snapshot = columnar.open_snapshot(snap_dir, db_path) if source == "snapshot" else None
+    start = time.perf_counter()
+    snap = None
+    if source == "snapshot" and scenario != "last_page":
+        snap = columnar.open_snapshot(snap_dir, db_path).table(table)
+
+    if scenario == "load":
+        result = db.fetch_records(table) if snap is None else None
+        digest = snap.rows if snap is not None else len(result)
+    elif scenario == "dataframe":
+        if snap is not None:
+            result = snap.frame()
+        else:
+            conn = sqlite3.connect(db_path)
+            result = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            conn.close()
+        digest = len(result)
+    elif scenario == "replay":
+        batches = snap.iter_records() if snap is not None else db.iter_new_records(table)
+        digest, checksum = 0, 0
+        for last_id, rows in batches:
+            digest += len(rows)
+            checksum = zlib.crc32(repr((last_id, rows[0], rows[-1])).encode(), checksum)
+        digest = [digest, checksum]
+    elif scenario == "matches":
+        from agents.rule_engine import RuleEngine
+        rules = RuleEngine.load(RULE_SECTIONS[table])
+        rules.max_alerts = None
+        result = snap.fetch_matches(rules) if snap is not None else db.fetch_matching_records(rules)
+        digest = [len(result), zlib.crc32(repr([m for _, m in rules.messages(result)]).encode())]
+    else:
+        rows = dq.count_rows(table, db_path)
+        page = dq.fetch_page(table, None, rows // 20, 20, db_path, snapshot=snapshot)  # last full page
+        digest = [int(v) for v in page["id"]]
+    elapsed = time.perf_counter() - start
+    # Peak resident memory over the read, above what the imports already took
+    print(json.dumps({"seconds": elapsed, "rss_mb": max(proc_mb("VmHWM") - base, 0), "digest": digest}))
+
+
+def measure(scenario, source, table, db_path, snap_dir):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_columnar", "--worker", scenario, source,
+                          "--table", table, "--db", db_path, "--snapshot", snap_dir],
+                         cwd=ROOT, capture_output=True, text=True, env={**os.environ, "LLM_RUNTIME": "async"})
+    if out.returncode:
+        raise RuntimeError(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def build(workdir, rows, users, seed, table):
+    from benchmarks.datagen import generate
+    with contextlib.redirect_stdout(sys.stderr):
+        import db
+    import columnar
+    data_dir = os.path.join(workdir, "data")
+    generate(data_dir, rows, users, seed, tables=(table,))
+    for name in ("health", "safety", "reminders"):
+        # init_db() expects all three exports; the other two are header-only
+        path = os.path.join(data_dir, {"health": "health_monitoring.csv", "safety": "safety_monitoring.csv",
+                                       "reminders": "daily_reminder.csv"}[name])
+        if not os.path.exists(path):
+            generate(data_dir, 0, users, seed, tables=(name,))
+    db.DATA_DIR, db.DB_PATH = data_dir, os.path.join(workdir, "bench.db")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        db.init_db()
+    ingest_s = time.perf_counter() - start
+    snap_dir = os.path.join(workdir, "snapshot")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        columnar.export_snapshot(snap_dir, db.DB_PATH, tables=(table,))
+    return db.DB_PATH, snap_dir, ingest_s, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--table", default="safety", choices=("health", "safety", "reminders"))
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--worker", nargs=2, metavar=("SCENARIO", "SOURCE"), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(*args.worker, args.table, args.db, args.snapshot)
+
+    workdir = tempfile.mkdtemp(prefix="bench_columnar_")
+    try:
+        db_path, snap_dir, ingest_s, export_s = build(workdir, args.rows, args.users, args.seed, args.table)
+        print(f"{args.table}: {args.rows:,} rows, {args.users:,} users; ingest {ingest_s:.1f}s, "
+              f"snapshot export {export_s:.1f}s")
+        print(f"on disk: SQLite {du_mb(db_path):,.0f} MB (all tables, indexes, rollups), "
+              f"snapshot {du_mb(snap_dir):,.0f} MB")
+        print(f"\n{'scenario':<11}{'SQLite s':>10}{'snapshot s':>12}{'speedup':>9}"
+              f"{'SQLite peak MB':>16}{'snapshot peak MB':>18}{'identical':>11}")
+        for scenario in args.scenarios:
+            if scenario == "matches" and args.table not in RULE_SECTIONS:
+                continue
+            old = measure(scenario, "sqlite", args.table, db_path, snap_dir)
+            new = measure(scenario, "snapshot", args.table, db_path, snap_dir)
+            print(f"{scenario:<11}{old['seconds']:>10.2f}{new['seconds']:>12.3f}"
+                  f"{old['seconds'] / max(new['seconds'], 1e-9):>8.0f}x"
+                  f"{old['rss_mb']:>16,.0f}{new['rss_mb']:>18,.1f}{str(old['digest'] == new['digest']):>11}")
+    finally:
+        if args.keep:
+            print(f"scratch directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_correlation.py
+# LLM calls saved by per-user incident correlation (agents/correlator.py) on the bundled data/
+# exports: the agents' alert prompts (with the alert caps of a normal run, and with every alert)
+# are merged per user for several window sizes, and the prompts that would reach the model counted.
+# The bundled exports hold one reading per user and table, spread over a month, so incidents
+# are rare there; --data runs the same report on denser generated exports (benchmarks/datagen.py).
+# Reminder alerts depend on the time of day the benchmark runs (due / past grace period).
+# Also checks that calls_saved() matches the prompts emitted when a reading time cannot be parsed.
+#
+#   python -m benchmarks.bench_correlation --windows 300 900 3600 21600 86400
+#   python -m benchmarks.datagen --rows 20000 --users 200 --out /tmp/dense
+#   python -m benchmarks.bench_correlation --data /tmp/dense
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_correlation_")
+db.DB_PATH = os.path.join(WORKDIR, "bundled.db")  # before anything imports db_writer
+os.environ["LLM_RUNTIME"] = "async"  # build the singleton worker without starting it
+os.environ.setdefault("VOICE_SINK", "none")
+
+from agents.correlator import IncidentCorrelator
+from agents.health_agent import HealthAgent
+from agents.reminder_agent import ReminderAgent
+from agents.safety_agent import SafetyAgent
+
+
+def collect_signals(capped):
+    # Alert prompts as the agents log them: (sender, message, user_id, severity, reading timestamp)
+    signals = []
+    for agent, table in ((HealthAgent(), "health"), (ReminderAgent(), "reminders"), (SafetyAgent(), "safety")):
+        agent.outbox = []
+        if hasattr(agent, "rules"):
+            if not capped:
+                agent.rules.max_alerts = None
+                agent.MAX_ALERTS = 10 ** 9
+            agent.process(db.fetch_matching_records(agent.rules))
+        else:
+            if not capped:
+                agent.max_alerts = 10 ** 9
+            for _, rows in db.iter_new_records(table):
+                agent.process(rows)
+        signals += [(agent.name, message, user_id, severity, timestamp)
+                    for kind, message, user_id, severity, timestamp in
+                    (item for item in agent.outbox if item[0] == "llm")]
+    return signals
+
+
+def correlate(signals, window):
+    prompts = []
+    correlator = IncidentCorrelator(window, emit=lambda *prompt: prompts.append(prompt))
+    for sender, message, user_id, severity, timestamp in signals:
+        correlator.add(sender, message, user_id, severity, timestamp)
+    correlator.flush()
+    return correlator, prompts
+
+
+def check_unparseable_timestamps():
+    # A prompt with an unparseable reading time goes out unchanged: it saves no call
+    signals = [("HealthAgent", "hr", "U1", "high", "2025-01-01 10:00:00"),
+               ("SafetyAgent", "fall", "U1", "high", "2025-01-01 10:02:00"),
+               ("ReminderAgent", "meds", "U1", "low", "bad"),
+               ("HealthAgent", "bp", "U2", "normal", "2025-01-01 10:00:00")]
+    correlator, prompts = correlate(signals, 600)
+    exact = correlator.calls_saved() == len(signals) - len(prompts) == 1
+    print(f"calls saved with an unparseable timestamp: {correlator.calls_saved()} of {len(signals)}, exact: {exact}")
+    assert exact, (correlator.stats, prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--windows", type=float, nargs="+", default=[300, 900, 3600, 6 * 3600, 24 * 3600],
+                        help="correlation windows in seconds")
+    parser.add_argument("--data", default=db.DATA_DIR, help="directory with the three CSV exports")
+    args = parser.parse_args()
+    check_unparseable_timestamps()
+
+    db.DATA_DIR = os.path.abspath(args.data)
+    with contextlib.redirect_stdout(sys.stderr):
+        db.init_db()  # the CSVs into a scratch database
+
+    for label, capped in (("alert caps as in a normal run", True), ("every alert", False)):
+        signals = collect_signals(capped)
+        users = len({s[2] for s in signals})
+        by_agent = {}
+        for s in signals:
+            by_agent[s[0]] = by_agent.get(s[0], 0) + 1
+        print(f"\n{os.path.basename(args.data)}, {label}: {len(signals)} alert prompts for {users} users {by_agent}")
+        print(f"{'window':>8}{'LLM calls':>11}{'saved':>8}{'saved %':>9}{'incidents':>11}{'multi-agent':>13}")
+        for window in args.windows:
+            correlator, prompts = correlate(signals, window)
+            saved = correlator.calls_saved()
+            print(f"{window / 60:>7.0f}m{len(prompts):>11}{saved:>8}{saved / max(len(signals), 1):>9.1%}"
+                  f"{correlator.stats['incidents']:>11}{correlator.stats['multi_agent']:>13}")
+
+
+if __name__ == "__main__":
+    main()
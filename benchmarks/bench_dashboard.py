@@ -0,0 +1,158 @@
+# benchmarks/bench_dashboard.py
+# Dashboard data loading: the original load-everything-into-pandas approach vs the SQL
+# query layer (dashboard_queries.py), on the shipped database scaled up N times, plus a
+# page reload after new logs arrive: full SQL requery vs LiveDashboardData.refresh().
+# Also checks the stored severity against the dashboard's old substring matching.
+#
+#   python -m benchmarks.bench_dashboard --scale 100
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard_queries as dq
+import schema
+from severity import SeverityClassifier
+from benchmarks.bench_schema import build_v0
+
+
+def pandas_pages(path):
+    # What app.py did: SELECT * per page view, then len()/iloc/groupby in pandas
+    conn = sqlite3.connect(path)
+    results = {}
+    results["overview"] = [len(pd.read_sql_query(f"SELECT * FROM {t}", conn)) for t in dq.READING_TABLES]
+    df = pd.read_sql_query("SELECT * FROM health", conn)
+    results["data_viewer"] = df[["user_id", "bp"]].iloc[40:60]
+    logs = pd.read_sql_query("SELECT * FROM agent_communications ORDER BY timestamp DESC", conn)
+    logs["timestamp"] = pd.to_datetime(logs["timestamp"])
+    results["hourly"] = logs.groupby(logs["timestamp"].dt.hour).size()
+    results["agents"] = logs["sender"].value_counts()
+    results["lengths"] = logs["message"].apply(lambda x: len(x.split()) if x else 0).value_counts()
+    conn.close()
+    return results
+
+
+def sql_pages(path):
+    return {
+        "overview": dq.table_counts(path),
+        "data_viewer": dq.fetch_page("health", ["user_id", "bp"], 3, 20, path),
+        "hourly": dq.hourly_log_counts(path),
+        "agents": dq.agent_log_counts(path),
+        "lengths": dq.message_length_counts(path),
+    }
+
+
+def append_logs(path, n=100):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO agent_communications (sender, user_id, message, response, timestamp) "
+                     "VALUES ('SafetyAgent', ?, 'Fall detected in kitchen', 'Check on the user immediately.', "
+                     "'2025-01-01 12:00:00')", [(f"U{i}",) for i in range(n)])
+    conn.commit()
+    conn.close()
+
+
+def reload_pages(path):
+    # A reload that recomputes everything vs one that tops up a warm LiveDashboardData
+    live = dq.LiveDashboardData(path)
+    live.refresh()
+    append_logs(path)
+    full = time.perf_counter()
+    sql_pages(path)
+    dq.recent_logs(5, path)
+    full = time.perf_counter() - full
+    append_logs(path)
+    incremental = time.perf_counter()
+    live.refresh()
+    incremental = time.perf_counter() - incremental
+    idle = time.perf_counter()
+    live.refresh()
+    return full, incremental, time.perf_counter() - idle
+
+
+def append_readings(path, n=5):
+    columns = ", ".join(schema.RAW_COLUMNS["health"])
+    conn = sqlite3.connect(path)
+    conn.execute(f"INSERT INTO health ({columns}) SELECT {columns} FROM health LIMIT ?", (n,))
+    conn.commit()
+    conn.close()
+
+
+def check_live_counts(path):
+    # Rows committed between the version poll and the delta queries must be counted exactly once:
+    # append rows right after every poll, then compare the topped-up totals with a full requery
+    live = dq.LiveDashboardData(path)
+    poll = dq.table_versions
+
+    def racing_versions(db_path=dq.DB_PATH):
+        versions = poll(db_path)
+        append_logs(db_path, 7)
+        append_readings(db_path)
+        return versions
+
+    dq.table_versions = racing_versions
+    try:
+        for _ in range(3):
+            live.refresh()
+    finally:
+        dq.table_versions = poll
+    live.refresh()
+    expected = {t: dq.count_rows(t, path) for t in dq.READING_TABLES + ("agent_communications",)}
+    agents = dq.agent_log_counts(path).set_index("Agent")["Log Count"].to_dict()
+    exact = live.counts == expected and live.agents.set_index("Agent")["Log Count"].to_dict() == agents
+    print(f"{'':>6}{'live counts':>12}{'exact':>10}{str(exact):>10}")
+    assert exact, (live.counts, expected)
+
+
+def check_severity_tiers():
+    # The dashboard's matching: the first tier with any keyword as a case-insensitive substring,
+    # including keywords overlapping one from another tier ("sale" / "alert" in "salert")
+    tiers = [("High", ["alert", "immediate"]), ("Medium", ["sale", "check"])]
+    classify = SeverityClassifier(tiers)
+    texts = ["salert", "SALE", "checkalert", "recheck immediately", "no keywords", "alertsale"]
+    expected = [next((name for name, words in tiers if any(w in t.lower() for w in words)), "Low") for t in texts]
+    exact = [classify(t) for t in texts] == expected
+    print(f"{'':>6}{'severity':>12}{'exact':>10}{str(exact):>10}")
+    assert exact, ([classify(t) for t in texts], expected)
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    print(f"{'scale':>6}{'rows':>12}{'approach':>10}{'seconds':>10}{'peak MB':>10}")
+    check_severity_tiers()
+    for scale in args.scale:
+        path = os.path.join(tempfile.mkdtemp(), "bench_dashboard.db")
+        build_v0(path, scale)
+        rows = sum(dq.table_counts(path).values()) + dq.count_rows("agent_communications", path)
+        for name, fn in (("pandas", pandas_pages), ("sql", sql_pages)):
+            elapsed, peak = measure(fn, path)
+            print(f"{scale:>6}{rows:>12,}{name:>10}{elapsed:>10.2f}{peak:>10.1f}")
+        full, incremental, idle = reload_pages(path)
+        print(f"{'':>6}{'reload':>12}{'full':>10}{full:>10.3f}")
+        print(f"{'':>6}{'(+100 logs)':>12}{'live':>10}{incremental:>10.3f}")
+        print(f"{'':>6}{'no change':>12}{'poll':>10}{idle:>10.4f}")
+        check_live_counts(path)
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
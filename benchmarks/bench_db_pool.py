@@ -0,0 +1,246 @@
+# benchmarks/bench_db_pool.py
+# Dashboard reads while the agents write, on a scratch database built from seeded exports
+# (datagen.py). Two processes run side by side for --seconds:
+#   agents      readings ingested with db.insert_data (plus rollups) and agent logs through
+#               AgentLogWriter, at --write-rate rows/s, with a watermark update per batch
+#   dashboard   --sessions threads, each repeatedly loading a page: table counts, a Data
+#               Viewer page, recent logs, severity counts and the live-refresh versions
+# once with the original access pattern (a new connection per call, rollback journal) and
+# once through db_pool.py (WAL, pooled readers, one writer). Reports page loads/s, write
+# throughput, p50/p99 latency and failed calls ("database is locked").
+#
+#   python -m benchmarks.bench_db_pool --rows 200000 --seconds 20 --sessions 4
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ("per_call", "pool")
+BATCH = 100  # readings per ingest batch
+LOGS_PER_BATCH = 10
+
+
+class PerCallConnections:
+    """What db.py and dashboard_queries.py did before db_pool.py: a new connection for every
+    call, default (rollback) journal. Same reader()/writer() interface as ConnectionPool."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        import schema
+        return schema.register_functions(sqlite3.connect(self.db_path))
+
+    @contextmanager
+    def reader(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def writer(self, synchronous=None):
+        conn = self._connect()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def setup(mode, db_path):
+    with contextlib.redirect_stdout(sys.stderr):
+        import db
+    import db_pool
+    db.DB_PATH = db_path
+    if mode == "per_call":
+        db_pool.pool = lambda path=None: PerCallConnections(path or db.DB_PATH)
+    return db
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"p50_ms": None, "p99_ms": None}
+    pick = lambda p: round(samples[min(int(len(samples) * p / 100), len(samples) - 1)] * 1000, 2)  # noqa: E731
+    return {"p50_ms": pick(50), "p99_ms": pick(99)}
+
+
+def wait_until(start_at):
+    time.sleep(max(start_at - time.time(), 0))
+
+
+# === Agents: the writing process ===
+def agents(mode, db_path, stream_csv, start_at, seconds, write_rate):
+    db = setup(mode, db_path)
+    from db_writer import AgentLogWriter
+    with open(stream_csv, encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        records = [tuple(row) for row in reader]
+    writer = AgentLogWriter(db_path, flush_interval=0.1)
+    latencies, errors, written, logs_sent = [], 0, 0, 0
+    interval = BATCH / write_rate
+    wait_until(start_at)
+    start = time.perf_counter()
+    deadline = start + seconds
+    at = 0
+    while time.perf_counter() < deadline and at < len(records):
+        batch = records[at:at + BATCH]
+        at += BATCH
+        t0 = time.perf_counter()
+        try:
+            written += db.insert_data("health", batch)
+            db.set_watermark("HealthAgent", "health", at)
+        except sqlite3.Error as e:
+            errors += 1
+            print(f"[Bench] write failed: {e}", file=sys.stderr)
+        latencies.append(time.perf_counter() - t0)
+        for row in batch[:LOGS_PER_BATCH]:
+            writer.write(("HealthAgent", row[0], "Heart rate above threshold", "Check on the user.", row[1]))
+        logs_sent += LOGS_PER_BATCH
+        # Paced like a stream: the next batch is due `interval` after this one started
+        time.sleep(max(t0 + interval - time.perf_counter(), 0))
+    elapsed = time.perf_counter() - start
+    with contextlib.redirect_stdout(sys.stderr):
+        writer.flush(timeout=30)
+    print(json.dumps({"rows": written, "rows_per_s": written / elapsed, "errors": errors,
+                      "logs_sent": logs_sent, "logs_written": writer.rows_written, **percentiles(latencies)}))
+
+
+# === Dashboard: the reading process ===
+def dashboard(mode, db_path, start_at, seconds, sessions):
+    setup(mode, db_path)
+    import dashboard_queries as dq
+    pages = max(dq.count_rows("health", db_path) // 20, 1)
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def session(seed):
+        rng = random.Random(seed)
+        local, failed = [], 0
+        wait_until(start_at)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                dq.table_counts(db_path)
+                dq.fetch_page("health", None, rng.randint(1, pages), 20, db_path)
+                dq.recent_logs(5, db_path)
+                dq.severity_counts(db_path)
+                dq.table_versions(db_path)
+            except Exception as e:  # pandas wraps sqlite3 errors in its own DatabaseError
+                failed += 1
+                print(f"[Bench] page load failed: {e}", file=sys.stderr)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    with contextlib.redirect_stdout(sys.stderr):
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    print(json.dumps({"pages": len(latencies), "pages_per_s": len(latencies) / seconds, "errors": errors[0],
+                      **percentiles(latencies)}))
+
+
+# === Driver ===
+def build(workdir, rows, users, seed, seconds, write_rate):
+    from benchmarks.datagen import generate, write_table
+    with contextlib.redirect_stdout(sys.stderr):
+        import db
+        import db_pool
+    data_dir = os.path.join(workdir, "data")
+    generate(data_dir, rows, users, seed)
+    db.DATA_DIR, db.DB_PATH = data_dir, os.path.join(workdir, "template.db")
+    with contextlib.redirect_stdout(sys.stderr):
+        db.init_db()
+    db_pool.close_all()
+    # Streamed readings come from other devices (P-prefixed ids), so none collide with stored ones
+    stream_csv = os.path.join(workdir, "stream.csv")
+    write_table(stream_csv, "health", int(seconds * write_rate) + BATCH, users, seed + 1)
+    with open(stream_csv, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    with open(stream_csv, "w", encoding="utf-8") as f:
+        f.write("\n".join([lines[0]] + ["P" + line[1:] for line in lines[1:]]) + "\n")
+    return db.DB_PATH, stream_csv
+
+
+def run_mode(mode, template, workdir, stream_csv, args):
+    db_path = os.path.join(workdir, f"{mode}.db")
+    shutil.copy(template, db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode={'DELETE' if mode == 'per_call' else 'WAL'}")
+    conn.close()
+    start_at = time.time() + 3  # both processes have finished importing by then
+    common = ["--mode", mode, "--db", db_path, "--start-at", str(start_at), "--seconds", str(args.seconds)]
+    env = {**os.environ, "LLM_RUNTIME": "async", "VOICE_SINK": "none"}
+    procs = [subprocess.Popen([sys.executable, "-m", "benchmarks.bench_db_pool", "--role", "agents", *common,
+                               "--stream", stream_csv, "--write-rate", str(args.write_rate)],
+                              cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env),
+             subprocess.Popen([sys.executable, "-m", "benchmarks.bench_db_pool", "--role", "dashboard", *common,
+                               "--sessions", str(args.sessions)],
+                              cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)]
+    results = []
+    for proc in procs:
+        out, err = proc.communicate()
+        if proc.returncode:
+            raise RuntimeError(err)
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000, help="rows per reading table before the run")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent dashboard sessions")
+    parser.add_argument("--write-rate", type=int, default=2000, help="readings ingested per second")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--role", choices=("agents", "dashboard"), help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--stream", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.role == "agents":
+        return agents(args.mode, args.db, args.stream, args.start_at, args.seconds, args.write_rate)
+    if args.role == "dashboard":
+        return dashboard(args.mode, args.db, args.start_at, args.seconds, args.sessions)
+
+    workdir = tempfile.mkdtemp(prefix="bench_db_pool_")
+    try:
+        template, stream_csv = build(workdir, args.rows, args.users, args.seed, args.seconds, args.write_rate)
+        print(f"{args.rows:,} rows per table; {args.sessions} dashboard sessions while the agents ingest "
+              f"{args.write_rate:,} readings/s for {args.seconds:g}s")
+        print(f"\n{'mode':<10}{'pages/s':>9}{'page p50':>10}{'page p99':>10}{'failed':>8}"
+              f"{'rows/s':>9}{'write p50':>11}{'write p99':>11}{'failed':>8}{'logs':>12}")
+        for mode in args.modes:
+            writes, reads = run_mode(mode, template, workdir, stream_csv, args)
+            print(f"{mode:<10}{reads['pages_per_s']:>9.1f}{reads['p50_ms']:>10}{reads['p99_ms']:>10}"
+                  f"{reads['errors']:>8}{writes['rows_per_s']:>9,.0f}{writes['p50_ms']:>11}{writes['p99_ms']:>11}"
+                  f"{writes['errors']:>8}{writes['logs_written']:>6}/{writes['logs_sent']:<5}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
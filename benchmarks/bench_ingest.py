@@ -0,0 +1,72 @@
+# benchmarks/bench_ingest.py
+# Streaming CSV ingest throughput and peak memory on a synthetic health export.
+#
+#   python -m benchmarks.bench_ingest --rows 2000000
+import argparse
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+HEADER = ("Device-ID/User-ID,Timestamp,Heart Rate,Heart Rate Below/Above Threshold (Yes/No),Blood Pressure,"
+          "Blood Pressure Below/Above Threshold (Yes/No),Glucose Levels,Glucose Levels Below/Above Threshold (Yes/No),"
+          "Oxygen Saturation (SpO₂%),SpO₂ Below Threshold (Yes/No),Alert Triggered (Yes/No),Caregiver Notified (Yes/No)\n")
+
+START = datetime(2025, 1, 1)
+
+
+def write_health_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for i in range(rows):
+            # (user, minute) stays unique for ~13M rows, so the natural key never drops generated readings
+            t = START + timedelta(minutes=i % (365 * 24 * 60))
+            f.write(f"D{1000 + i % 10000},{t.month}/{t.day}/{t.year} {t.hour}:{t.minute:02d},"
+                    f"{60 + i % 70},No,{100 + i % 50}/{60 + i % 30} mmHg,No,{80 + i % 90},No,{90 + i % 10},No,No,No\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunksize", type=int, default=db.INGEST_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "health_export.csv")
+        write_health_csv(csv_path, args.rows)
+        size_mb = os.path.getsize(csv_path) / 1e6
+
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.DATA_DIR = tmp
+        db.CSV_SOURCES = []  # schema only
+        db.init_db()
+
+        conn = sqlite3.connect(db.DB_PATH)
+        for pragma in db.INGEST_PRAGMAS:
+            conn.execute(pragma)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        start = time.perf_counter()
+        inserted = db.ingest_csv(conn, csv_path, "health", chunksize=args.chunksize)
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        start = time.perf_counter()
+        skipped = db.ingest_csv(conn, csv_path, "health")
+        rerun = time.perf_counter() - start
+        conn.close()
+
+    print(f"CSV size:            {size_mb:.1f} MB ({args.rows} rows)")
+    print(f"Inserted:            {inserted} rows in {elapsed:.2f}s ({inserted / elapsed:,.0f} rows/s, {size_mb / elapsed:.1f} MB/s)")
+    print(f"Peak RSS:            {rss_before:.0f} MB before -> {rss_after:.0f} MB after (chunksize={args.chunksize})")
+    print(f"Re-run (idempotent): {'skipped' if skipped is None else skipped} in {rerun:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_llm_backends.py
+# Compare prompts/sec of the pooled HTTP backend against the one-process-per-prompt
+# CLI backend, both talking to the local stub server.
+#
+#   python -m benchmarks.bench_llm_backends --prompts 200 --concurrency 14
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_backends import OllamaHTTPBackend, SubprocessBackend
+from benchmarks.stub_ollama import start_stub_server
+
+STUB_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_ollama.py")
+
+
+def run_backend(backend, prompts, concurrency, model_name="tinyllama"):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        responses = list(pool.map(lambda p: backend.generate(model_name, p), prompts))
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for r in responses if not r.startswith("Stub response"))
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=14)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency per prompt (s)")
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    os.environ["OLLAMA_HOST"] = server.url  # picked up by the stub CLI subprocesses
+    prompts = [f"[SafetyAgent] User D{1000 + i} is lying in the kitchen.\nRespond with action." for i in range(args.prompts)]
+
+    backends = [
+        OllamaHTTPBackend(host=server.url, pool_size=args.concurrency),
+        SubprocessBackend(command=(sys.executable, STUB_CLI, "run")),
+    ]
+    print(f"{'backend':<12}{'prompts':>10}{'seconds':>10}{'prompts/s':>12}{'failures':>10}")
+    for backend in backends:
+        elapsed, failures = run_backend(backend, prompts, args.concurrency)
+        print(f"{backend.name:<12}{len(prompts):>10}{elapsed:>10.2f}{len(prompts) / elapsed:>12.1f}{failures:>10}")
+        backend.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_priority.py
+# Flood the LLM queue with low-severity reminders, trickle in critical fall alerts, and
+# compare prompt -> logged-response latency per severity with FIFO vs severity scheduling.
+#
+#   python -m benchmarks.bench_priority --reminders 300 --critical 20 --latency 0.05 --workers 14
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_queue_worker
+from db_writer import AgentLogWriter
+from llm_backends import OllamaHTTPBackend
+from llm_cache import ResponseCache
+from llm_scheduler import PriorityPromptQueue
+from metrics import LatencyStats
+from benchmarks.stub_ollama import start_stub_server
+
+
+def run(mode, args, server_url):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_priority.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE agent_communications (sender TEXT, user_id TEXT, message TEXT, response TEXT, timestamp TEXT)")
+    conn.close()
+
+    # The worker module reads its queue global at call time, so each run gets a fresh one
+    llm_queue_worker.llm_prompt_queue = prompt_queue = PriorityPromptQueue()
+    writer = AgentLogWriter(db_path=db_path, flush_interval=0.01)
+    sent, latency, lock = {}, {"critical": LatencyStats(), "low": LatencyStats()}, threading.Lock()
+
+    def on_commit(rows):
+        now = time.monotonic()
+        with lock:
+            for _, _, message, *_ in rows:
+                severity, started = sent.pop(message)
+                latency[severity].observe(now - started)
+    writer.commit_listeners.append(on_commit)
+
+    worker = llm_queue_worker.LLMBackgroundWorker(
+        max_workers=args.workers, backend=OllamaHTTPBackend(host=server_url, pool_size=args.workers),
+        cache=ResponseCache(), writer=writer, reserved_critical=args.reserved if mode == "priority" else 0)
+    worker.start()
+
+    def put(sender, message, user_id, severity):
+        with lock:
+            sent[message] = (severity, time.monotonic())
+        prompt_queue.put((sender, message, user_id), priority=severity if mode == "priority" else "normal")
+
+    start = time.perf_counter()
+    for i in range(args.reminders):
+        put("ReminderAgent", f"Generate a short and friendly reminder: task #{i} is scheduled now.", f"U{i}", "low")
+    every = max(args.reminders // max(args.critical, 1), 1) * args.latency / args.workers
+    for i in range(args.critical):
+        time.sleep(every)
+        put("SafetyAgent", f"Fall detected for user D{i} (case {i}) with no subsequent movement.", f"D{i}", "critical")
+    prompt_queue.join()
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    return elapsed, latency
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=300)
+    parser.add_argument("--critical", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=14)
+    parser.add_argument("--reserved", type=int, default=2, help="worker slots reserved for critical prompts")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated model latency per prompt (s)")
+    args = parser.parse_args()
+
+    llm_queue_worker.llm_worker.stop()  # the import-time singleton would compete for the queue
+    server = start_stub_server(latency=args.latency)
+    print(f"{'mode':<10}{'severity':<10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>9}")
+    for mode in ("fifo", "priority"):
+        elapsed, latency = run(mode, args, server.url)
+        for severity, stats in latency.items():
+            s = stats.summary()
+            print(f"{mode:<10}{severity:<10}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+                  f"{s['p99_ms']:>10}{s['max_ms']:>10}{elapsed:>9.2f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_rollups.py
+# Trend chart queries on the raw reading tables vs the rollup tables (rollups.py), on the
+# shipped database scaled up N times, plus the cost of folding a new ingest batch into the rollups.
+# Rollup query time should stay flat as the raw tables grow.
+#
+#   python -m benchmarks.bench_rollups --scale 1 10 50
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard_queries as dq
+import rollups
+import schema
+from benchmarks.bench_schema import build_v0, timed
+
+RAW_QUERIES = {
+    "vitals_hourly": "SELECT substr(recorded_at, 1, 13) AS bucket, MIN(heart_rate), AVG(heart_rate), MAX(heart_rate), "
+                     "COUNT(*), SUM(is_alert) FROM health WHERE recorded_at IS NOT NULL GROUP BY 1 ORDER BY 1",
+    "falls_by_location": "SELECT location, SUM(is_fall), SUM(is_alert), COUNT(*) FROM safety "
+                         "GROUP BY location ORDER BY 2 DESC",
+    "user_daily": "SELECT substr(recorded_at, 1, 10) AS bucket, MIN(heart_rate), AVG(heart_rate), MAX(heart_rate) "
+                  "FROM health WHERE user_id = ? GROUP BY 1 ORDER BY 1",
+}
+
+
+def rollup_queries(path, user_id):
+    return {
+        "vitals_hourly": lambda: dq.vitals_trend("heart_rate", path),
+        "falls_by_location": lambda: dq.falls_by_location(path),
+        "user_daily": lambda: dq.user_trend(user_id, "heart_rate", "Daily", path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--batch", type=int, default=1000, help="rows per simulated ingest batch")
+    args = parser.parse_args()
+
+    print(f"{'scale':>6}{'health rows':>13}{'query':>19}{'raw ms':>10}{'rollup ms':>11}")
+    for scale in args.scale:
+        path = os.path.join(tempfile.mkdtemp(), "bench_rollups.db")
+        build_v0(path, scale)
+        conn = sqlite3.connect(path)
+        start = time.perf_counter()
+        schema.migrate(conn)
+        build = time.perf_counter() - start
+        rows = conn.execute("SELECT COUNT(*) FROM health").fetchone()[0]
+        user_id = conn.execute("SELECT user_id FROM health LIMIT 1").fetchone()[0]
+
+        for name, fn in rollup_queries(path, user_id).items():
+            params = (user_id,) if "?" in RAW_QUERIES[name] else ()
+            raw = timed(lambda: dq._query(RAW_QUERIES[name], params, path))
+            print(f"{scale:>6}{rows:>13,}{name:>19}{raw * 1000:>10.2f}{timed(fn) * 1000:>11.2f}")
+
+        # New readings for existing buckets, folded in the way insert_data does it (same transaction)
+        batch = conn.execute(f"SELECT {', '.join(schema.RAW_COLUMNS['health'])} FROM health LIMIT ?",
+                             (args.batch,)).fetchall()
+        batch = [(f"new-{i}",) + row[1:] for i, row in enumerate(batch)]
+        with conn:
+            start = time.perf_counter()
+            conn.executemany(schema.insert_sql("health"), batch)
+            insert = time.perf_counter() - start
+            rollups.refresh(conn, ["health"])
+            fold = time.perf_counter() - start - insert
+        print(f"{'':>6}{'':>13}{'initial build':>19}{build * 1000:>10.0f} ms (migration v1-v5)")
+        print(f"{'':>6}{'':>13}{'ingest batch':>19}{insert * 1000:>10.1f} ms insert + {fold * 1000:.1f} ms rollup "
+              f"for {len(batch)} rows")
+        conn.close()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
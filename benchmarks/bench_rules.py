@@ -0,0 +1,126 @@
+# benchmarks/bench_rules.py
+# Vectorized rule engine vs the original per-row Python loops, on the shipped database
+# scaled up to --rows plus a few untidy readings (EDGE_ROWS). Also checks both produce the
+# same alerts, at the agents' alert caps and uncapped.
+#
+#   python -m benchmarks.bench_rules --rows 1000000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema
+from agents.rule_engine import RuleEngine
+from benchmarks.bench_schema import build_v0
+
+
+# === Original per-row loops (alert selection only, no LLM/voice side effects) ===
+def legacy_health(records, max_alerts=20):
+    alerts = []
+    for row in records:
+        if row[10].strip().lower() == "yes" and len(alerts) < max_alerts:
+            alerts.append(row[0])
+    return alerts
+
+
+def legacy_safety(records, max_alerts=16):
+    alerts = []
+    for row in records:
+        user_id, timestamp, activity, fall_detected, impact_force_level, post_fall_inactivity_duration, location, alert_triggered, caregiver_notified = row
+        try:
+            fall = fall_detected.strip().lower()
+            impact = impact_force_level.strip().lower()
+            alert_triggered = alert_triggered.strip().lower()
+            movement = activity.strip().lower()
+            location = location.strip().lower()
+            inactivity_seconds = int(post_fall_inactivity_duration)
+            message = None
+            if fall == "yes" and impact in ("medium", "high") and inactivity_seconds > 30 and alert_triggered == "no" and len(alerts) < max_alerts:
+                message = (f"Fall detected for user {user_id} at {location}. Impact level: {impact}. "
+                           f"Inactivity duration: {inactivity_seconds} seconds. Immediate check required.")
+            elif movement == "lying" and location in ("bathroom", "kitchen") and alert_triggered == "no" and len(alerts) < max_alerts:
+                message = f"User {user_id} is lying in the {location}. Check if the user needs assistance."
+            elif movement == "none" and inactivity_seconds > 1800 and alert_triggered == "no" and len(alerts) < max_alerts:
+                message = (f"No movement detected for user {user_id} for the last {inactivity_seconds//60} minutes. "
+                           f"Location: {location}. Consider checking in.")
+            elif fall == "yes" and movement == "none" and alert_triggered == "no" and len(alerts) < max_alerts:
+                message = f"Fall detected for user {user_id} with no subsequent movement. Immediate attention required at {location}."
+            if message:
+                alerts.append(message)
+        except Exception:
+            pass
+    return alerts
+
+
+# Appended after the scaled-up data: missing / non-numeric inactivity (the original loop skips
+# the row for every rule), padded or differently cased Yes/No flags and activity values
+EDGE_ROWS = {
+    "health": [
+        ("E1", "01/01/2025 10:00", "72", "No", "120/80", "No", "100", "No", "98", "No", " YES ", "No"),
+        ("E2", "01/01/2025 10:01", "72", "No", "120/80", "No", "100", "No", "98", "No", "maybe", "No"),
+    ],
+    "safety": [
+        ("E3", "01/01/2025 10:00", "Lying", "No", "Low", None, "Kitchen", "No", "No"),
+        ("E4", "01/01/2025 10:01", "Lying", "No", "Low", "", "Bathroom", "No", "No"),
+        ("E5", "01/01/2025 10:02", "lying", "No", "Low", "n/a", "kitchen", "No", "No"),
+        ("E6", "01/01/2025 10:03", "Lying", "No", "Low", "20", " Kitchen ", " no ", "No"),
+        ("E7", "01/01/2025 10:04", " none ", "YES", "High", "45", "Hall", "No", "No"),
+        ("E8", "01/01/2025 10:05", "None", "yes", "Low", "10", "Hall", "No", "No"),
+        ("E9", "01/01/2025 10:06", "None", "No", "Low", None, "Hall", "No", "No"),
+    ],
+}
+UNCAPPED = 10 ** 9
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-alerts", type=int, default=None, help="override the alert cap (default: from rules)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.db")
+        scale = max(args.rows // 10000, 1)
+        build_v0(path, scale)
+        conn = sqlite3.connect(path)
+        for table, rows in EDGE_ROWS.items():
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        conn.commit()
+        schema.migrate(conn)
+
+        print(f"{'agent':<8}{'rows':>9}  {'fetch+loop':>11}{'fetch+engine':>13}{'frame engine':>13}{'SQL pushdown':>13}"
+              f"  same alerts  uncapped")
+        for section, legacy in (("health", legacy_health), ("safety", legacy_safety)):
+            engine = RuleEngine.load(section)
+            cap = args.max_alerts or engine.max_alerts
+            select = f"SELECT {', '.join(schema.RAW_COLUMNS[section])} FROM {section} ORDER BY id"
+            frame = pd.read_sql_query(select, conn)
+
+            t_loop, old = timed(lambda: legacy(conn.execute(select).fetchall(), cap))
+            t_fetch_engine, _ = timed(lambda: engine.evaluate(conn.execute(select).fetchall(), limit=cap))
+            t_frame, _ = timed(lambda: engine.evaluate(frame, limit=cap))
+            t_sql, matched = timed(lambda: engine.fetch_matches(conn, limit=cap))
+            new = [msg or row["user_id"] for row, msg in engine.messages(matched)]
+            all_old = legacy(conn.execute(select).fetchall(), UNCAPPED)
+            all_new = [msg or row["user_id"] for row, msg in engine.messages(engine.fetch_matches(conn, limit=UNCAPPED))]
+            all_frame = [msg or row["user_id"] for row, msg in engine.messages(engine.evaluate(frame, limit=UNCAPPED))]
+            print(f"{section:<8}{len(frame):>9}  {t_loop:>10.2f}s{t_fetch_engine:>12.2f}s{t_frame:>12.2f}s"
+                  f"{t_sql:>12.2f}s  {str(old == new) + f' ({len(new)})':<13}"
+                  f"{all_old == all_new == all_frame} ({len(all_new)})")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
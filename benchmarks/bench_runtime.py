@@ -0,0 +1,113 @@
+# benchmarks/bench_runtime.py
+# Threaded LLM worker vs the asyncio runtime: peak thread count, peak RSS and prompts/sec
+# for a burst of distinct prompts against the stub model server. Each runtime runs in its
+# own process (and the stub server in a third) so thread and memory counts are not mixed.
+#
+#   python -m benchmarks.bench_runtime --prompts 2000 --latency 0.05 --concurrency 14 128
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(runtime, url, prompts, concurrency):
+    # Runs inside the subprocess: point the DB writer at a scratch DB before anything imports it
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_runtime.db")
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("CREATE TABLE agent_communications (sender TEXT, user_id TEXT, message TEXT, response TEXT, timestamp TEXT)")
+    conn.close()
+    os.environ["LLM_RUNTIME"] = "async"  # build the worker's cache/writer without starting its threads
+
+    import llm_queue_worker
+    from llm_backends import OllamaHTTPBackend
+    from llm_guard import GuardedBackend, AdaptiveLimiter
+
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    items = [("ReminderAgent", f"Reminder #{i}: medication is scheduled now.", f"U{i}") for i in range(prompts)]
+    if runtime == "threads":
+        worker = llm_queue_worker.LLMBackgroundWorker(
+            max_workers=concurrency, writer=llm_queue_worker.llm_worker.writer,
+            backend=GuardedBackend(OllamaHTTPBackend(host=url, pool_size=concurrency),
+                                   AdaptiveLimiter(initial=concurrency, max_limit=concurrency)))
+        worker.start()
+        start = time.perf_counter()
+        for item in items:
+            llm_queue_worker.llm_prompt_queue.put(item, priority="low")
+        llm_queue_worker.llm_prompt_queue.join()
+        stats = worker.stats
+    else:
+        from async_runtime import AsyncOllamaBackend, start_runtime
+        runtime_ = start_runtime(backend=AsyncOllamaBackend(host=url), max_concurrency=concurrency,
+                                 limiter=AdaptiveLimiter(initial=concurrency, max_limit=concurrency))
+        start = time.perf_counter()
+        for item in items:
+            runtime_.submit(*item, severity="low")
+        runtime_.join()
+        stats = runtime_.stats
+    elapsed = time.perf_counter() - start
+    llm_queue_worker.llm_worker.writer.flush()
+    done.set()
+    sampler.join()
+    print(json.dumps({
+        "runtime": runtime,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "prompts_per_s": round(prompts / elapsed, 1),
+        "peak_threads": peak_threads[0] - 1,  # minus the sampler
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "model_calls": stats["model_calls"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated model latency per prompt (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[14, 128])
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--child", nargs=3, metavar=("RUNTIME", "URL", "CONCURRENCY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        runtime, url, concurrency = args.child
+        child(runtime, url, args.prompts, int(concurrency))
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_ollama", "serve", "--port", str(args.port),
+                               "--latency", str(args.latency)], cwd=ROOT, stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    print(f"{'runtime':<10}{'concurrency':>12}{'seconds':>10}{'prompts/s':>12}{'threads':>10}{'rss MB':>10}")
+    try:
+        for concurrency in args.concurrency:
+            for runtime in ("threads", "async"):
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_runtime", "--prompts", str(args.prompts),
+                                      "--child", runtime, url, str(concurrency)],
+                                     cwd=ROOT, capture_output=True, text=True, check=True).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                print(f"{r['runtime']:<10}{r['concurrency']:>12}{r['seconds']:>10}{r['prompts_per_s']:>12}"
+                      f"{r['peak_threads']:>10}{r['peak_rss_mb']:>10}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
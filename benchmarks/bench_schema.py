@@ -0,0 +1,121 @@
+# benchmarks/bench_schema.py
+# Query latency on the original text-only layout (schema v0) vs the typed, indexed
+# layout (schema v1), using the shipped database scaled up N times.
+#
+#   python -m benchmarks.bench_schema --scale 100
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema
+from db import DB_PATH
+
+TABLES = ["health", "safety", "reminders", "agent_communications"]
+
+
+def build_v0(path, scale):
+    # The v0 tables are rebuilt from the raw column list, not copied from the source database:
+    # once db.init_db() has migrated it, its tables carry the typed columns as well.
+    conn = sqlite3.connect(path)
+    conn.execute("ATTACH DATABASE ? AS src", (DB_PATH,))
+    for table in TABLES:
+        columns = schema.RAW_COLUMNS[table]
+        definitions = ", ".join(f"{c} {schema.RAW_TYPES.get(c, 'TEXT')}" for c in columns)
+        conn.execute(f"CREATE TABLE {table} ({definitions})")
+        select = ", ".join("user_id || '-' || ?" if c == "user_id" else c for c in columns)
+        for k in range(scale):
+            conn.execute(f"INSERT INTO main.{table} SELECT {select} FROM src.{table}", (k,))
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+    conn.close()
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def v0_queries(conn, user_id):
+    def latest_for_user():
+        df = pd.read_sql_query("SELECT * FROM health WHERE user_id = ?", conn, params=(user_id,))
+        df["ts"] = pd.to_datetime(df["timestamp"], format="%m/%d/%Y %H:%M")
+        return df.sort_values("ts", ascending=False).head(10)
+
+    def alerts_in_range():
+        df = pd.read_sql_query("SELECT timestamp FROM health WHERE lower(trim(alert_triggered)) = 'yes'", conn)
+        ts = pd.to_datetime(df["timestamp"], format="%m/%d/%Y %H:%M")
+        return int(((ts >= "2025-01-20") & (ts < "2025-01-25")).sum())
+
+    def high_systolic():
+        df = pd.read_sql_query("SELECT bp FROM health", conn)
+        return int((df["bp"].str.split("/").str[0].astype(int) >= 140).sum())
+
+    def logs_for_sender():
+        return conn.execute("SELECT * FROM agent_communications WHERE sender = 'SafetyAgent' "
+                            "ORDER BY timestamp DESC LIMIT 50").fetchall()
+
+    return {"latest_for_user": latest_for_user, "alerts_in_range": alerts_in_range,
+            "high_systolic": high_systolic, "logs_for_sender": logs_for_sender}
+
+
+def v1_queries(conn, user_id):
+    def latest_for_user():
+        return conn.execute("SELECT * FROM health WHERE user_id = ? ORDER BY recorded_at DESC LIMIT 10",
+                            (user_id,)).fetchall()
+
+    def alerts_in_range():
+        return conn.execute("SELECT COUNT(*) FROM health WHERE is_alert = 1 AND recorded_at >= ? AND recorded_at < ?",
+                            ("2025-01-20", "2025-01-25")).fetchone()[0]
+
+    def high_systolic():
+        return conn.execute("SELECT COUNT(*) FROM health WHERE systolic >= 140").fetchone()[0]
+
+    def logs_for_sender():
+        return conn.execute("SELECT * FROM agent_communications WHERE sender = 'SafetyAgent' "
+                            "ORDER BY timestamp DESC LIMIT 50").fetchall()
+
+    return {"latest_for_user": latest_for_user, "alerts_in_range": alerts_in_range,
+            "high_systolic": high_systolic, "logs_for_sender": logs_for_sender}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        v0_path, v1_path = os.path.join(tmp, "v0.db"), os.path.join(tmp, "v1.db")
+        build_v0(v0_path, args.scale)
+        shutil.copy(v0_path, v1_path)
+
+        conn_v1 = sqlite3.connect(v1_path)
+        start = time.perf_counter()
+        schema.migrate(conn_v1)
+        print(f"Migration to v{schema.SCHEMA_VERSION}: {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(v0_path) / 1e6:.0f} MB -> {os.path.getsize(v1_path) / 1e6:.0f} MB)")
+
+        conn_v0 = sqlite3.connect(v0_path)
+        user_id = f"D1042-{args.scale // 2}"
+        old, new = v0_queries(conn_v0, user_id), v1_queries(conn_v1, user_id)
+        print(f"{'query':<18}{'v0 (ms)':>10}{'v1 (ms)':>10}{'speedup':>10}")
+        for name in old:
+            t0, t1 = timed(old[name]), timed(new[name])
+            print(f"{name:<18}{t0 * 1000:>10.1f}{t1 * 1000:>10.2f}{t0 / t1:>9.0f}x")
+        conn_v0.close()
+        conn_v1.close()
+
+
+if __name__ == "__main__":
+    main()
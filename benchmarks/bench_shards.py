@@ -0,0 +1,68 @@
+# benchmarks/bench_shards.py
+# Agent pass time (rule evaluation + prompt building, no model calls) with the work split
+# across 1..N shard processes by user_id, on the shipped data scaled up N times.
+# --scale 1000 gives 10M rows per table (~10 GB scratch DB).
+#
+#   python -m benchmarks.bench_shards --scale 100 --shards 1 2 4 8
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import schema
+from benchmarks.bench_schema import build_v0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_shards.db")
+    start = time.perf_counter()
+    build_v0(path, args.scale)
+    conn = schema.register_functions(sqlite3.connect(path))
+    schema.migrate(conn)
+    rows = {t: conn.execute(f"SELECT MAX(id) FROM {t}").fetchone()[0] for t in ("health", "safety", "reminders")}
+    conn.close()
+    print(f"Built {sum(rows.values()):,} rows in {time.perf_counter() - start:.1f}s ({os.cpu_count()} cores)")
+
+    # Shard workers read through db.*, which looks DB_PATH up at call time (passed on by shard_pool)
+    db.DB_PATH = path
+    from agents.health_agent import HealthAgent
+    from agents.reminder_agent import ReminderAgent
+    from agents.safety_agent import SafetyAgent
+    from agents.sharded_runner import ShardedRunAgent, _alert_cap, _run_shard, shard_pool
+
+    agents = [(HealthAgent, "HealthAgent", "health"), (ReminderAgent, "ReminderAgent", "reminders"),
+              (SafetyAgent, "SafetyAgent", "safety")]
+    print(f"{'shards':>7}{'seconds':>10}{'speedup':>10}{'prompts':>10}")
+    baseline = expected = None
+    for shards in sorted(set(args.shards)):
+        with shard_pool(shards) as pool:
+            pool.submit(int).result()  # start-up is not part of the pass
+            start = time.perf_counter()
+            futures = {name: [pool.submit(_run_shard, cls, name, table, 0, rows[table], k, shards)
+                              for k in range(shards)] for cls, name, table in agents}
+            prompts = 0
+            for cls, name, _ in agents:
+                # What the parent sends: the shards' alerts merged in id order, up to the pass's cap
+                alerts = sorted((a for f in futures[name] for a in f.result()[0]), key=lambda a: a[0])
+                upto_id = ShardedRunAgent.cap_alerts(alerts, _alert_cap(cls(name)))
+                prompts += sum(1 for row_id, (kind, *_) in alerts
+                               if kind == "llm" and (upto_id is None or row_id <= upto_id))
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        expected = expected or prompts
+        print(f"{shards:>7}{elapsed:>10.2f}{baseline / elapsed:>10.2f}{prompts:>10}")
+        assert prompts == expected, "the alert caps apply per pass, not per shard"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/datagen.py
+# Seeded synthetic device exports in the same CSV layout as data/, from 10K to 100M rows per
+# table. Value ranges and alert ratios follow the shipped data: ~74% of health readings have an
+# out-of-range vital (and an alert), 5% of safety readings are falls (all while "No Movement"),
+# ~3.5% raise a safety alert, half the reminders are sent and 80% of those acknowledged.
+# (user_id, timestamp) is unique, so every generated row survives the natural-key dedup.
+#
+#   python -m benchmarks.datagen --rows 1000000 --out /tmp/data --seed 7
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+START = pd.Timestamp("2025-01-01")
+WINDOW_MINUTES = 30 * 24 * 60  # readings span 30 days, like the shipped exports
+CHUNK_ROWS = 500_000
+
+HEADERS = {
+    "health": ("Device-ID/User-ID,Timestamp,Heart Rate,Heart Rate Below/Above Threshold (Yes/No),Blood Pressure,"
+               "Blood Pressure Below/Above Threshold (Yes/No),Glucose Levels,Glucose Levels Below/Above Threshold "
+               "(Yes/No),Oxygen Saturation (SpO₂%),SpO₂ Below Threshold (Yes/No),Alert Triggered (Yes/No),"
+               "Caregiver Notified (Yes/No)"),
+    "safety": ("Device-ID/User-ID,Timestamp,Movement Activity,Fall Detected (Yes/No),Impact Force Level,"
+               "Post-Fall Inactivity Duration (Seconds),Location,Alert Triggered (Yes/No),Caregiver Notified (Yes/No),"),
+    "reminders": ("Device-ID/User-ID,Timestamp,Reminder Type,Scheduled Time,Reminder Sent (Yes/No),"
+                  "Acknowledged (Yes/No),"),
+}
+FILE_NAMES = {"health": "health_monitoring.csv", "safety": "safety_monitoring.csv", "reminders": "daily_reminder.csv"}
+
+ACTIVITIES = np.array(["Sitting", "No Movement", "Walking", "Lying"])
+LOCATIONS = np.array(["Bedroom", "Bathroom", "Living Room", "Kitchen"])
+IMPACTS = np.array(["High", "Medium", "Low"])
+REMINDER_TYPES = np.array(["Appointment", "Hydration", "Medication", "Exercise"])
+SCHEDULED = np.array([f"{m // 60}:{m % 60:02d}:00" for m in range(6 * 60, 22 * 60 + 1, 30)])
+YES_NO = np.array(["No", "Yes"])
+
+
+def _timestamps(start_row, n, users, rows, rng):
+    # Row i belongs to user i % users and is that user's (i // users)-th reading; each reading
+    # gets its own slice of the 30-day window, so (user, minute) never repeats
+    i = np.arange(start_row, start_row + n)
+    per_user = -(-rows // users)
+    step = max(WINDOW_MINUTES // per_user, 1)
+    minutes = (i // users) * step + rng.integers(0, step, n)
+    ts = START + pd.to_timedelta(minutes, unit="min")
+    stamps = [f"{mo}/{d}/{y} {h}:{mi:02d}" for mo, d, y, h, mi in
+              zip(ts.month, ts.day, ts.year, ts.hour, ts.minute)]
+    return [f"D{1000 + u}" for u in i % users], stamps
+
+
+def _health(users, stamps, rng):
+    n = len(stamps)
+    hr = rng.integers(60, 121, n)
+    systolic = rng.integers(100, 141, n)
+    diastolic = rng.integers(60, 91, n)
+    glucose = rng.integers(70, 151, n)
+    oxygen = rng.integers(90, 101, n)
+    hr_flag, bp_flag = hr > 100, (systolic > 130) | (diastolic > 85)
+    glucose_flag, oxygen_flag = (glucose < 80) | (glucose > 140), oxygen < 92
+    alert = YES_NO[(hr_flag | bp_flag | glucose_flag | oxygen_flag).astype(int)]
+    return (f"{u},{t},{a},{b},{s}/{d} mmHg,{c},{g},{e},{o},{f},{x},{x}"
+            for u, t, a, b, s, d, c, g, e, o, f, x in zip(
+                users, stamps, hr, YES_NO[hr_flag.astype(int)], systolic, diastolic, YES_NO[bp_flag.astype(int)],
+                glucose, YES_NO[glucose_flag.astype(int)], oxygen, YES_NO[oxygen_flag.astype(int)], alert))
+
+
+def _safety(users, stamps, rng):
+    n = len(stamps)
+    activity = ACTIVITIES[rng.integers(0, len(ACTIVITIES), n)]
+    fall = (activity == "No Movement") & (rng.random(n) < 0.2)
+    impact = np.where(fall, IMPACTS[rng.choice(3, n, p=[0.4, 0.3, 0.3])], "-")
+    inactivity = np.where(fall, rng.integers(34, 600, n), 0)
+    location = LOCATIONS[rng.integers(0, len(LOCATIONS), n)]
+    alert = YES_NO[(fall & (impact != "Low")).astype(int)]
+    return (f"{u},{t},{a},{f},{i},{d},{loc},{x},{x},"
+            for u, t, a, f, i, d, loc, x in zip(users, stamps, activity, YES_NO[fall.astype(int)], impact,
+                                                inactivity, location, alert))
+
+
+def _reminders(users, stamps, rng):
+    n = len(stamps)
+    kind = REMINDER_TYPES[rng.integers(0, len(REMINDER_TYPES), n)]
+    scheduled = SCHEDULED[rng.integers(0, len(SCHEDULED), n)]
+    sent = rng.random(n) < 0.5
+    acknowledged = sent & (rng.random(n) < 0.8)
+    return (f"{u},{t},{k},{s},{a},{b},"
+            for u, t, k, s, a, b in zip(users, stamps, kind, scheduled, YES_NO[sent.astype(int)],
+                                        YES_NO[acknowledged.astype(int)]))
+
+
+ROW_WRITERS = {"health": _health, "safety": _safety, "reminders": _reminders}
+
+
+def write_table(path, table_name, rows, users=10000, seed=0):
+    # Same (seed, table, rows, users) -> byte-identical file
+    rng = np.random.default_rng([seed, list(ROW_WRITERS).index(table_name)])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADERS[table_name] + "\n")
+        for start in range(0, rows, CHUNK_ROWS):
+            n = min(CHUNK_ROWS, rows - start)
+            user_ids, stamps = _timestamps(start, n, users, rows, rng)
+            f.write("\n".join(ROW_WRITERS[table_name](user_ids, stamps, rng)) + "\n")
+    return path
+
+
+def generate(out_dir, rows, users=10000, seed=0, tables=tuple(ROW_WRITERS)):
+    # Writes the three exports under their data/ file names; returns {table: path}
+    os.makedirs(out_dir, exist_ok=True)
+    return {t: write_table(os.path.join(out_dir, FILE_NAMES[t]), t, rows, users, seed) for t in tables}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic health/safety/reminder CSVs")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per table")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    paths = generate(args.out, args.rows, args.users, args.seed)
+    size = sum(os.path.getsize(p) for p in paths.values()) / 1e6
+    print(f"Wrote {3 * args.rows:,} rows ({size:.1f} MB) to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
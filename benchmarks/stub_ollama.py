@@ -0,0 +1,150 @@
+# benchmarks/stub_ollama.py
+# Minimal stand-in for `ollama serve` / `ollama run` so the LLM backends can be
+# exercised without a real model. --failure-rate answers that share of prompts with HTTP 500.
+# StubBackend is the same model in-process (no HTTP), for queue/worker benchmarks.
+#
+#   python -m benchmarks.stub_ollama serve --port 11434 --latency 0.05 --failure-rate 0.02
+#   OLLAMA_HOST=http://127.0.0.1:11434 python benchmarks/stub_ollama.py run tinyllama "prompt"
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_backends import LLMBackend
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.count_request()
+        if self.server.should_fail():
+            self._send(500, {"error": "stub failure"})
+            return
+        prompt = payload.get("prompt", "")
+        self._send(200, {
+            "model": payload.get("model", ""),
+            "response": f"Stub response: check on the user. ({len(prompt)} chars)",
+            "done": True,
+        })
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, failure_rate=0.0, seed=0):
+        super().__init__(address, StubOllamaHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def count_request(self):
+        with self._lock:
+            self.requests_served += 1
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(port=0, latency=0.0, failure_rate=0.0, seed=0):
+    server = StubOllamaServer(("127.0.0.1", port), latency=latency, failure_rate=failure_rate, seed=seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StubBackend(LLMBackend):
+    """In-process model stand-in: sleeps latency (+/- jitter) per call and fails failure_rate of them
+    the way the HTTP backend reports a non-200 answer."""
+
+    name = "stub"
+
+    def __init__(self, latency=0.05, failure_rate=0.0, jitter=0.2, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, model_name, prompt):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+            fail = self._random.random() < self.failure_rate
+            self.failures += fail
+        time.sleep(max(delay, 0))
+        if fail:
+            return "LLM failed with code 500: stub failure"
+        return f"Stub response: check on the user. ({len(prompt)} chars)"
+
+
+def _run_cli(model_name, prompt):
+    # Mirrors `ollama run MODEL PROMPT`: a thin client that posts to the server and prints the answer
+    host = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434").rstrip("/")
+    body = json.dumps({"model": model_name, "prompt": prompt, "stream": False}).encode("utf-8")
+    req = urllib.request.Request(host + "/api/generate", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        print(json.loads(resp.read())["response"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server / CLI")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--port", type=int, default=11434)
+    serve.add_argument("--latency", type=float, default=0.0, help="seconds to sleep per prompt")
+    serve.add_argument("--failure-rate", type=float, default=0.0, help="share of prompts answered with HTTP 500")
+    run = sub.add_parser("run")
+    run.add_argument("model")
+    run.add_argument("prompt")
+    args = parser.parse_args()
+
+    if args.cmd == "run":
+        _run_cli(args.model, args.prompt)
+        return
+
+    server = StubOllamaServer(("127.0.0.1", args.port), latency=args.latency, failure_rate=args.failure_rate)
+    print(f"[StubOllama] Listening on {server.url} (latency={args.latency}s, failure rate={args.failure_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
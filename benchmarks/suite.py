@@ -0,0 +1,333 @@
+# benchmarks/suite.py
+# Reproducible end-to-end benchmark: for each dataset size, generates seeded device exports
+# (datagen.py) and times the pipeline stage by stage on a scratch database:
+#   ingest     init_db() on the generated CSVs (always runs: the other scenarios read its DB)
+#   rules      each agent's process() over the new rows in stream-sized batches, plus the
+#              SQL-pushdown fetch the rule agents use in batch runs
+#   queue      the health/safety alert prompts from `rules` through LLMBackgroundWorker against
+#              an in-process stub model (latency, failure rate), with enqueue-to-commit latency
+#   dashboard  the dashboard's count, page, log, aggregate and trend queries and a cold/idle
+#              LiveDashboardData.refresh()
+# Results are written as JSON with the git commit and parameters; --compare diffs two result files.
+#
+#   python -m benchmarks.suite --rows 10000 100000 --seed 0 --out results.json
+#   python -m benchmarks.suite --compare before.json after.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("ingest", "rules", "queue", "dashboard")
+SUITE_VERSION = 1
+# The reminder agent's alerts depend on the wall clock, so its prompts are timed but not replayed
+QUEUE_AGENTS = ("HealthAgent", "SafetyAgent")
+
+
+def _isolate(workdir):
+    # db_writer/llm_queue_worker bind DB_PATH at import time: point it at a scratch file
+    # before anything imports them so the shipped elderly_care.db is never touched
+    os.environ.setdefault("LLM_RUNTIME", "async")  # build the singleton worker without starting it
+    os.environ.setdefault("VOICE_SINK", "none")
+    with contextlib.redirect_stdout(sys.stderr):
+        import db
+    db.DB_PATH = os.path.join(workdir, "suite_default.db")
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit or None, bool(dirty)
+    except OSError:
+        return None, None
+
+
+def timed(fn, repeat=1):
+    # Best of `repeat` runs, in seconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+# === Scenarios ===
+# Each takes the per-size context dict and returns a flat-ish dict of numbers
+def run_ingest(ctx, args):
+    import db
+    from benchmarks import datagen
+    data_dir = os.path.join(ctx["workdir"], f"data_{ctx['rows']}")
+    start = time.perf_counter()
+    datagen.generate(data_dir, ctx["rows"], args.users, args.seed)
+    generate_s = time.perf_counter() - start
+
+    db.DATA_DIR = data_dir
+    db.DB_PATH = ctx["db_path"]
+    init_s = timed(db.init_db)
+    import dashboard_queries as dq
+    counts = dq.table_counts(ctx["db_path"])
+    return {
+        "generate_s": round(generate_s, 3),
+        "init_db_s": round(init_s, 3),
+        "rows_per_s": round(sum(counts.values()) / init_s),
+        "db_mb": round(os.path.getsize(ctx["db_path"]) / 1e6, 1),
+        "rows": counts,
+    }
+
+
+def run_rules(ctx, args):
+    import db
+    from agents.health_agent import HealthAgent
+    from agents.reminder_agent import ReminderAgent
+    from agents.safety_agent import SafetyAgent
+
+    results, prompts = {}, []
+    for agent, table in ((HealthAgent(), "health"), (SafetyAgent(), "safety"), (ReminderAgent(), "reminders")):
+        agent.outbox = []  # collect prompts/voice alerts instead of queueing them
+        rows = process_s = 0.0
+        fetch_start = time.perf_counter()
+        for _, records in db.iter_new_records(table, 0, None, batch_size=args.batch):
+            start = time.perf_counter()
+            agent.process(records)
+            process_s += time.perf_counter() - start
+            rows += len(records)
+        total_s = time.perf_counter() - fetch_start
+        alerts = [item for item in agent.outbox if item[0] == "llm"]
+        result = {
+            "rows": int(rows),
+            "fetch_process_s": round(total_s, 3),
+            "process_s": round(process_s, 3),
+            "rows_per_s": round(rows / total_s) if total_s else None,
+            "prompts": len(alerts),
+        }
+        if hasattr(agent, "rules"):
+            result["pushdown_s"] = round(timed(lambda: db.fetch_matching_records(agent.rules)), 4)
+        results[agent.name] = result
+        if agent.name in QUEUE_AGENTS:
+            prompts += [(agent.name, message, user_id, severity) for _, message, user_id, severity, _ in alerts]
+    ctx["prompts"] = prompts
+    return results
+
+
+def run_queue(ctx, args):
+    from benchmarks.stub_ollama import StubBackend
+    from db_writer import AgentLogWriter
+    from llm_cache import ResponseCache
+    from llm_guard import AdaptiveLimiter, GuardedBackend
+    from llm_queue_worker import LLMBackgroundWorker, llm_prompt_queue
+    from metrics import LatencyStats
+
+    prompts = ctx.get("prompts") or []
+    if not prompts:
+        # rules skipped: the same shape of prompt, one per user
+        prompts = [("HealthAgent", f"User has the following readings: heart rate {60 + i % 60} bpm.", f"D{1000 + i}",
+                    "high") for i in range(args.prompts)]
+    prompts = prompts[:args.prompts]
+
+    stub = StubBackend(latency=args.llm_latency, failure_rate=args.llm_failure_rate, seed=args.seed)
+    writer = AgentLogWriter(db_path=ctx["db_path"])
+    worker = LLMBackgroundWorker(backend=GuardedBackend(stub, AdaptiveLimiter(max_limit=args.concurrency)),
+                                 max_workers=args.concurrency, cache=ResponseCache(), writer=writer)
+    latency = LatencyStats(window=len(prompts) or 1)
+    enqueued, lock = {}, threading.Lock()
+
+    def on_commit(rows):
+        now = time.perf_counter()
+        with lock:
+            for sender, user_id, message, _, _ in rows:
+                times = enqueued.get((sender, user_id, message))
+                if times:
+                    latency.observe(now - times.pop(0))
+    writer.commit_listeners.append(on_commit)
+
+    worker.start()
+    start = time.perf_counter()
+    for sender, message, user_id, severity in prompts:
+        with lock:
+            enqueued.setdefault((sender, user_id, message), []).append(time.perf_counter())
+        llm_prompt_queue.put((sender, message, user_id), priority=severity)
+    llm_prompt_queue.join()
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    guard = worker.guard_stats()
+    worker.stop()
+    return {
+        "prompts": len(prompts),
+        "elapsed_s": round(elapsed, 3),
+        "prompts_per_s": round(len(prompts) / elapsed, 1) if elapsed else None,
+        "model_calls": stub.calls,
+        "model_failures": stub.failures,
+        "rows_written": writer.rows_written,
+        "breaker_state": guard.get("breaker", {}).get("state"),
+        "latency": latency.summary(),
+    }
+
+
+def run_dashboard(ctx, args):
+    import dashboard_queries as dq
+    path = ctx["db_path"]
+    user_id = dq._scalar("SELECT user_id FROM health LIMIT 1", db_path=path)
+    middle_page = max(dq.count_rows("health", path) // 2 // 20, 1)
+    queries = {
+        "table_counts": lambda: dq.table_counts(path),
+        "first_page": lambda: dq.fetch_page("health", page=1, db_path=path),
+        "middle_page": lambda: dq.fetch_page("health", page=middle_page, db_path=path),
+        "recent_logs": lambda: dq.recent_logs(5, path),
+        "agent_logs": lambda: dq.agent_logs("health", db_path=path),
+        "severity_logs": lambda: dq.severity_logs(200, ["High"], path),
+        "hourly_log_counts": lambda: dq.hourly_log_counts(path),
+        "severity_counts": lambda: dq.severity_counts(path),
+        "message_length_counts": lambda: dq.message_length_counts(path),
+        "user_trend": lambda: dq.user_trend(user_id, "heart_rate", "Daily", path),
+        "vitals_trend": lambda: dq.vitals_trend("heart_rate", path),
+        "falls_by_location": lambda: dq.falls_by_location(path),
+    }
+    results = {f"{name}_ms": _ms(timed(fn, args.repeat)) for name, fn in queries.items()}
+    live = dq.LiveDashboardData(path)
+    results["live_refresh_cold_ms"] = _ms(timed(live.refresh))
+    results["live_refresh_idle_ms"] = _ms(timed(live.refresh, args.repeat))
+    return results
+
+
+RUNNERS = {"ingest": run_ingest, "rules": run_rules, "queue": run_queue, "dashboard": run_dashboard}
+
+
+def run_size(rows, args, workdir):
+    ctx = {"rows": rows, "workdir": workdir, "db_path": os.path.join(workdir, f"suite_{rows}.db")}
+    results = {}
+    for name in SCENARIOS:
+        if name != "ingest" and name not in args.scenarios:
+            continue
+        print(f"[Suite] {rows:,} rows: {name}...", file=sys.stderr)
+        # Pipeline modules print progress per chunk/commit; keep it out of the report unless asked
+        out = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with out:
+            results[name] = RUNNERS[name](ctx, args)
+    return results
+
+
+# === Comparison ===
+def _flatten(results, prefix=""):
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def _lower_is_better(path):
+    name = path.rsplit(".", 1)[-1]
+    if name.endswith("per_s"):
+        return False
+    if name.endswith(("_s", "_ms")) or name in ("model_calls", "db_mb"):
+        return True
+    return None  # counts: reported, not judged
+
+
+def compare(before_path, after_path, threshold=0.10):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+    if before.get("params") != after.get("params"):
+        print(f"warning: parameters differ\n  before {before.get('params')}\n  after  {after.get('params')}")
+    old = dict(_flatten(before["results"]))
+    regressions = 0
+    print(f"{'metric':<52}{'before':>12}{'after':>12}{'change':>9}")
+    for path, new_value in _flatten(after["results"]):
+        if path not in old:
+            continue
+        old_value = old[path]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        lower = _lower_is_better(path)
+        flag = ""
+        if lower is not None and abs(change) >= threshold:
+            worse = change > 0 if lower else change < 0
+            flag = "  REGRESSION" if worse else "  improved"
+            regressions += worse
+        print(f"{path:<52}{old_value:>12,.6g}{new_value:>12,.6g}{change:>+9.1%}{flag}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded end-to-end pipeline benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="rows per table, per run")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--batch", type=int, default=1000, help="rows per agent.process() call in `rules`")
+    parser.add_argument("--prompts", type=int, default=2000, help="cap on prompts replayed in `queue`")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="stub model seconds per call")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=3, help="dashboard queries: best of N")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data and databases")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="--compare: relative change to flag")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    workdir = tempfile.mkdtemp(prefix="suite_")
+    _isolate(workdir)
+    commit, dirty = _git_commit()
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: getattr(args, k) for k in ("users", "seed", "scenarios", "batch", "prompts", "llm_latency",
+                                                 "llm_failure_rate", "concurrency", "repeat")},
+        "results": {},
+    }
+    try:
+        for rows in args.rows:
+            report["results"][str(rows)] = run_size(rows, args, workdir)
+    finally:
+        if args.keep:
+            print(f"[Suite] Kept data and databases in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"[Suite] Wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+# columnar.py
+# Compact columnar snapshot of the reading tables for fast cold starts (set COLUMNAR_SNAPSHOT to
+# its directory; export with `python main.py --export-snapshot DIR`).
+#
+# Each column is stored under <table>/ next to id.npy, in the encoding that suits it:
+#   dict  low-cardinality text (user_id, location, activity, flags...): the distinct values are
+#         kept once in manifest.json and each row stores a small code (int8/int16/int32, -1 for NULL)
+#   int   integer columns (readings, systolic/diastolic, 0/1 flags): a plain array of the
+#         narrowest integer dtype that holds the values, plus a NULL mask if there are NULLs
+#   str   other text (timestamp, recorded_at, bp): the UTF-8 bytes of all values back to back in
+#         <column>.utf8 and row boundaries in <column>.offsets.npy, plus a NULL mask if needed
+# Arrays are opened memory-mapped, so opening a snapshot reads only the manifest (small: it holds
+# the dictionaries of the low-cardinality columns only) and the pages a reader touches: RunAgent
+# replays history from it (rows past the snapshot's max_id still come from SQLite), and the
+# dashboard slices pages out of it instead of walking OFFSET in SQLite.
+#
+# open_snapshot() checks the snapshot against the database (first/last row of each table) and
+# returns None when it is missing or stale, so readers fall back to SQLite.
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import db_pool
+import schema
+
+COLUMNAR_SNAPSHOT = os.environ.get("COLUMNAR_SNAPSHOT")  # unset: agents and dashboard read SQLite only
+FORMAT_VERSION = 2
+READING_TABLES = ("health", "safety", "reminders")
+MANIFEST = "manifest.json"
+# Text columns with few distinct values; other text columns are stored as strings
+DICTIONARY_COLUMNS = {
+    "user_id", "activity", "location", "impact_force_level", "fall_detected", "reminder_type", "scheduled_time",
+    "sent", "acknowledged", "hear_rate_threshold_flag", "bp_threshold_flag", "glucose_Threshold_flag",
+    "oxygen_threshold_flag", "alert_triggered", "caregiver_notified",
+}
+
+
+def _code_dtype(cardinality):
+    for dtype in (np.int8, np.int16, np.int32):
+        if cardinality <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _int_dtype(lo, hi):
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})") if row[1] != "id"]
+
+
+def _encodings(conn, table_name):
+    # dict for DICTIONARY_COLUMNS, int for integer columns, str for the other text columns. A column
+    # holding values of another type (SQLite does not enforce column types) is dictionary-encoded
+    # instead, which keeps every value exactly as stored.
+    planned = {}
+    for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table_name})"):
+        if name != "id":
+            planned[name] = ("dict" if name in DICTIONARY_COLUMNS else
+                             "int" if declared.upper().startswith("INT") else "str")
+    checked = [c for c, encoding in planned.items() if encoding != "dict"]
+    if checked:
+        # One scan for all columns: how many values each has outside its encoding's type
+        stray = conn.execute("SELECT " + ", ".join(
+            f"TOTAL(typeof({c}) NOT IN ('{'integer' if planned[c] == 'int' else 'text'}', 'null'))"
+            for c in checked) + f" FROM {table_name}").fetchone()
+        for c, count in zip(checked, stray):
+            if count:
+                planned[c] = "dict"
+    return planned
+
+
+def _key_rows(conn, table_name):
+    # Raw values of the first and last row: a rebuilt or rewritten table will not match them
+    columns = ", ".join(schema.RAW_COLUMNS[table_name])
+    first = conn.execute(f"SELECT id, {columns} FROM {table_name} ORDER BY id LIMIT 1").fetchone()
+    last = conn.execute(f"SELECT id, {columns} FROM {table_name} ORDER BY id DESC LIMIT 1").fetchone()
+    return [list(first), list(last)] if first else []
+
+
+# === Export ===
+def export_snapshot(out_dir, db_path=None, tables=READING_TABLES, chunk_rows=200_000):
+    """Write a snapshot of ``tables`` (every row in the database now) to ``out_dir``, replacing any
+    snapshot there. Streams the tables in id order, so memory is bounded by ``chunk_rows``."""
+    db_path = db_path or _default_db_path()
+    tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    manifest = {"version": FORMAT_VERSION, "created_at": time.time(), "tables": {}}
+    with db_pool.pool(db_path).reader() as conn:
+        for table_name in tables:
+            manifest["tables"][table_name] = _export_table(conn, table_name, tmp_dir, chunk_rows)
+    with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    # Swap in the finished snapshot so readers never see a half-written one
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    for table_name, meta in manifest["tables"].items():
+        print(f"[Columnar] {table_name}: {meta['rows']} rows up to id {meta['max_id']} -> {out_dir}")
+    return manifest
+
+
+class _DictColumn:
+    # Codes go to int32 while the dictionary grows, then are narrowed once its size is known
+    def __init__(self, path, rows):
+        self.path = path
+        self.codes = np.lib.format.open_memmap(path + ".npy.tmp", mode="w+", dtype=np.int32, shape=(rows,))
+        self.dictionary = {}
+
+    def write(self, at, values):
+        # Factorize the chunk in C, then map its few distinct values onto the table-wide codes
+        local, uniques = pd.factorize(np.array(values, dtype=object))
+        lut = np.array([self.dictionary.setdefault(u, len(self.dictionary)) for u in uniques.tolist()] + [-1],
+                       dtype=np.int32)
+        self.codes[at:at + len(values)] = lut[local]
+
+    def finish(self, rows, chunk_rows):
+        dtype = _code_dtype(len(self.dictionary))
+        _narrow(self.codes, self.path + ".npy", dtype, rows, chunk_rows)
+        del self.codes
+        os.remove(self.path + ".npy.tmp")
+        return {"encoding": "dict", "dtype": np.dtype(dtype).name, "values": list(self.dictionary)}
+
+
+class _IntColumn:
+    # int64 while exporting, then narrowed to the smallest dtype that holds the range seen
+    def __init__(self, path, rows):
+        self.path = path
+        self.values = np.lib.format.open_memmap(path + ".npy.tmp", mode="w+", dtype=np.int64, shape=(rows,))
+        self.nulls = np.lib.format.open_memmap(path + ".nulls.npy", mode="w+", dtype=np.bool_, shape=(rows,))
+        self.lo, self.hi, self.has_nulls = 0, 0, False
+
+    def write(self, at, values):
+        nulls = np.fromiter((v is None for v in values), dtype=np.bool_, count=len(values))
+        chunk = np.array([0 if v is None else v for v in values], dtype=np.int64)
+        self.values[at:at + len(values)] = chunk
+        self.nulls[at:at + len(values)] = nulls
+        self.has_nulls |= bool(nulls.any())
+        self.lo, self.hi = min(self.lo, int(chunk.min())), max(self.hi, int(chunk.max()))
+
+    def finish(self, rows, chunk_rows):
+        dtype = _int_dtype(self.lo, self.hi)
+        _narrow(self.values, self.path + ".npy", dtype, rows, chunk_rows)
+        del self.values, self.nulls
+        os.remove(self.path + ".npy.tmp")
+        if not self.has_nulls:
+            os.remove(self.path + ".nulls.npy")
+        return {"encoding": "int", "dtype": np.dtype(dtype).name, "nulls": self.has_nulls}
+
+
+class _StrColumn:
+    # Value i is data[offsets[i]:offsets[i + 1]], UTF-8
+    def __init__(self, path, rows):
+        self.path = path
+        self.offsets = np.lib.format.open_memmap(path + ".offsets.npy", mode="w+", dtype=np.int64,
+                                                 shape=(rows + 1,))
+        self.offsets[0] = 0
+        self.nulls = np.lib.format.open_memmap(path + ".nulls.npy", mode="w+", dtype=np.bool_, shape=(rows,))
+        self.data = open(path + ".utf8", "wb")
+        self.size, self.has_nulls = 0, False
+
+    def write(self, at, values):
+        encoded = [b"" if v is None else v.encode("utf-8") for v in values]
+        nulls = np.fromiter((v is None for v in values), dtype=np.bool_, count=len(values))
+        ends = self.size + np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+        self.offsets[at + 1:at + 1 + len(values)] = ends
+        self.nulls[at:at + len(values)] = nulls
+        self.has_nulls |= bool(nulls.any())
+        self.data.write(b"".join(encoded))
+        self.size = int(ends[-1]) if len(ends) else self.size
+
+    def finish(self, rows, chunk_rows):
+        self.data.close()
+        self.offsets.flush()
+        del self.offsets, self.nulls
+        if not self.has_nulls:
+            os.remove(self.path + ".nulls.npy")
+        return {"encoding": "str", "nulls": self.has_nulls}
+
+
+ENCODERS = {"dict": _DictColumn, "int": _IntColumn, "str": _StrColumn}
+
+
+def _narrow(wide, path, dtype, rows, chunk_rows):
+    narrow = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(rows,))
+    for start in range(0, rows, chunk_rows):
+        narrow[start:start + chunk_rows] = wide[start:start + chunk_rows]
+    narrow.flush()
+
+
+def _export_table(conn, table_name, out_dir, chunk_rows):
+    os.makedirs(os.path.join(out_dir, table_name))
+    columns = _table_columns(conn, table_name)
+    encodings = _encodings(conn, table_name)
+    rows, max_id = conn.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {table_name}").fetchone()
+
+    ids = np.lib.format.open_memmap(os.path.join(out_dir, table_name, "id.npy"), mode="w+", dtype=np.int64,
+                                    shape=(rows,))
+    writers = {c: ENCODERS[encodings[c]](os.path.join(out_dir, table_name, c), rows) for c in columns}
+
+    cursor = conn.execute(f"SELECT id, {', '.join(columns)} FROM {table_name} WHERE id <= ? ORDER BY id", (max_id,))
+    at = 0
+    while True:
+        batch = cursor.fetchmany(chunk_rows)
+        if not batch:
+            break
+        values = list(zip(*batch))
+        ids[at:at + len(batch)] = values[0]
+        for c, column in zip(columns, values[1:]):
+            writers[c].write(at, column)
+        at += len(batch)
+    ids.flush()
+
+    meta = {"rows": at, "max_id": int(ids[at - 1]) if at else 0, "key_rows": _key_rows(conn, table_name),
+            "columns": {c: writers[c].finish(at, chunk_rows) for c in columns}}
+    return meta
+
+
+# === Reading ===
+class SnapshotTable:
+    """One table of a snapshot: memory-mapped ``ids`` and per-column arrays, decoded on demand."""
+
+    def __init__(self, path, name, meta):
+        self.name = name
+        self.rows = meta["rows"]
+        self.max_id = meta["max_id"]
+        self.columns = list(meta["columns"])
+        self.raw_columns = schema.RAW_COLUMNS[name]
+        self._dir = os.path.join(path, name)
+        self.ids = self._load("id.npy")
+        self._meta = meta["columns"]
+        self._arrays = {}
+        self._luts = {}
+
+    def _load(self, file_name, dtype=None):
+        if not self.rows:
+            return np.empty(0, dtype=dtype or np.int64)  # numpy cannot memory-map an empty array
+        if dtype is not None:
+            path = os.path.join(self._dir, file_name)
+            return np.memmap(path, dtype=dtype, mode="r") if os.path.getsize(path) else np.empty(0, dtype=dtype)
+        return np.load(os.path.join(self._dir, file_name), mmap_mode="r")
+
+    def _array(self, column, part):
+        # Arrays are mapped on first use, so a page touches only the columns it shows
+        key = (column, part)
+        array = self._arrays.get(key)
+        if array is None:
+            file_name = {"data": f"{column}.utf8", "": f"{column}.npy"}.get(part, f"{column}.{part}.npy")
+            array = self._arrays[key] = self._load(file_name, np.uint8 if part == "data" else None)
+        return array
+
+    def _nulls(self, column, start, stop):
+        return self._array(column, "nulls")[start:stop] if self._meta[column].get("nulls") else None
+
+    def _lut(self, column):
+        # Object array of the distinct values with None in the last slot, so code -1 decodes to NULL
+        lut = self._luts.get(column)
+        if lut is None:
+            lut = self._luts[column] = np.array(self._meta[column]["values"] + [None], dtype=object)
+        return lut
+
+    def _strings(self, column, start, stop):
+        offsets = np.asarray(self._array(column, "offsets")[start:stop + 1])
+        if len(offsets) < 2:
+            return []
+        data = self._array(column, "data")[offsets[0]:offsets[-1]].tobytes()
+        bounds = (offsets - offsets[0]).tolist()
+        text = data.decode("utf-8")
+        if len(text) == len(data):  # ASCII: byte offsets are character offsets
+            values = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+        else:
+            values = [data[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+        nulls = self._nulls(column, start, stop)
+        if nulls is not None:
+            for i in np.flatnonzero(nulls):
+                values[i] = None
+        return values
+
+    def position(self, after_id):
+        # Index of the first row with id > after_id
+        return int(np.searchsorted(self.ids, after_id, side="right"))
+
+    def values(self, column, start=0, stop=None):
+        """Rows ``start:stop`` of ``column`` as a list of Python values (None for NULL), as SQLite returns them."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        encoding = self._meta[column]["encoding"]
+        if encoding == "dict":
+            return self._lut(column)[self._array(column, "")[start:stop]].tolist()
+        if encoding == "str":
+            return self._strings(column, start, stop)
+        values = self._array(column, "")[start:stop].tolist()
+        nulls = self._nulls(column, start, stop)
+        if nulls is not None:
+            for i in np.flatnonzero(nulls):
+                values[i] = None
+        return values
+
+    def iter_records(self, after_id=0, upto_id=None, batch_size=5000):
+        # Same (last_id, rows) batches as db.iter_new_records(), rows as tuples of the raw columns
+        start = self.position(after_id)
+        stop = self.rows if upto_id is None else self.position(upto_id)
+        for at in range(start, stop, batch_size):
+            end = min(at + batch_size, stop)
+            columns = [self.values(c, at, end) for c in self.raw_columns]
+            yield int(self.ids[end - 1]), list(zip(*columns))
+
+    def frame(self, start=0, stop=None, columns=None, categorical=True):
+        """Rows ``start:stop`` as a DataFrame. Low-cardinality text columns are Categoricals over the
+        memory-mapped codes (no copy; ``categorical=False`` decodes them), integer columns are Int64
+        and other text columns object strings."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        data = {}
+        for c in columns or self.columns:
+            encoding = self._meta[c]["encoding"]
+            if encoding == "int":
+                nulls = self._nulls(c, start, stop)
+                values = np.asarray(self._array(c, "")[start:stop], dtype=np.int64)
+                data[c] = pd.arrays.IntegerArray(values, np.zeros(len(values), dtype=np.bool_) if nulls is None
+                                                 else np.array(nulls))
+            elif encoding == "dict" and categorical and c in DICTIONARY_COLUMNS:
+                data[c] = pd.Categorical.from_codes(self._array(c, "")[start:stop],
+                                                    categories=self._meta[c]["values"], validate=False)
+            else:
+                data[c] = np.array(self.values(c, start, stop), dtype=object)
+        return pd.DataFrame(data, copy=False)
+
+    def fetch_matches(self, rules, after_id=0, upto_id=None, limit=None, chunk_rows=250_000):
+        # rules.fetch_matches() over the snapshot: the rules are evaluated chunk by chunk on the
+        # raw-column frames until `limit` (default rules.max_alerts) rows have matched
+        limit = rules.max_alerts if limit is None else limit
+        start = self.position(after_id)
+        stop = self.rows if upto_id is None else self.position(upto_id)
+        parts = []
+        for at in range(start, stop, chunk_rows):
+            remaining = None if limit is None else limit - sum(len(p) for p in parts)
+            if remaining is not None and remaining <= 0:
+                break
+            matched = rules.evaluate(self._match_frame(at, min(at + chunk_rows, stop)), remaining)
+            if len(matched):
+                parts.append(matched)
+        if not parts:
+            return rules.evaluate(self._match_frame(0, 0), 0)
+        return pd.concat(parts).reset_index(drop=True)
+
+    def _match_frame(self, start, stop):
+        # The columns rules.fetch_matches() selects: id, then the raw columns
+        frame = self.frame(start, stop, self.raw_columns)
+        frame.insert(0, "id", self.ids[start:stop])
+        return frame
+
+
+class Snapshot:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.created_at = manifest["created_at"]
+        self.tables = {name: SnapshotTable(path, name, meta) for name, meta in manifest["tables"].items()}
+
+    def table(self, table_name):
+        return self.tables.get(table_name)
+
+
+def _default_db_path():
+    import db
+    return db.DB_PATH
+
+
+def manifest_mtime(path=COLUMNAR_SNAPSHOT):
+    # Changes whenever the snapshot is re-exported; 0 when there is none
+    try:
+        return os.path.getmtime(os.path.join(path, MANIFEST))
+    except (OSError, TypeError):
+        return 0
+
+
+def open_snapshot(path=COLUMNAR_SNAPSHOT, db_path=None, check=True):
+    """The snapshot at ``path``, or None if there is none or it no longer matches the database."""
+    if not path:
+        return None
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Columnar] No snapshot at {path} ({e}); reading SQLite.")
+        return None
+    if manifest.get("version") != FORMAT_VERSION:
+        print(f"[Columnar] Snapshot at {path} has format {manifest.get('version')}, expected {FORMAT_VERSION}; "
+              f"reading SQLite.")
+        return None
+    if check and not _matches_db(manifest, db_path or _default_db_path()):
+        print(f"[Columnar] Snapshot at {path} does not match the database (rebuilt?); reading SQLite. "
+              f"Re-export it with main.py --export-snapshot.")
+        return None
+    return Snapshot(path, manifest)
+
+
+def _matches_db(manifest, db_path):
+    if not os.path.exists(db_path):
+        return False
+    try:
+        with db_pool.pool(db_path).reader() as conn:
+            for table_name, meta in manifest["tables"].items():
+                columns = ", ".join(schema.RAW_COLUMNS[table_name])
+                for key_row in meta["key_rows"]:
+                    row = conn.execute(f"SELECT id, {columns} FROM {table_name} WHERE id = ?",
+                                       (key_row[0],)).fetchone()
+                    if row is None or list(row) != key_row:
+                        return False
+        return True
+    except sqlite3.Error:
+        return False
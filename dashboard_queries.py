@@ -0,0 +1,305 @@
+# dashboard_queries.py
+# Query layer for the Streamlit dashboard (app.py). Counts, pages, projections and the
+# chart aggregates are computed in SQLite, so only what is on screen is loaded into pandas
+# and dashboard memory stays flat as the tables grow. Works on schema v0 and later
+# (ordering uses rowid, which the v1 `id` column aliases). Queries run on pooled WAL reader
+# connections (db_pool.py), so they do not block the agents' writes and reuse prepared statements.
+import os
+import threading
+from contextlib import contextmanager
+import pandas as pd
+import columnar
+import db_pool
+import rollups
+import schema
+import severity
+from db import DB_PATH
+
+READING_TABLES = ("health", "safety", "reminders")
+# "incidents": consolidated prompts from the per-user correlator (agents/correlator.py)
+AGENT_SENDERS = {"health": "HealthAgent", "safety": "SafetyAgent", "reminders": "ReminderAgent",
+                 "incidents": "IncidentAgent"}
+
+# Schema v3 stores severity, word count and hour bucket with each log row (indexed); on older
+# databases the same values are computed per query from the raw columns
+STORED_COLUMNS = {c: c for c in schema.COMMUNICATION_DERIVED}
+SEVERITY_LEVELS = severity.classifier.levels + [severity.EMPTY]
+COMPUTED_COLUMNS = {
+    "severity": "response_severity(response)",
+    "word_count": "word_count(message)",
+    "hour": "CAST(strftime('%H', timestamp) AS INTEGER)",
+}
+
+
+@contextmanager
+def connect(db_path=DB_PATH):
+    # A pooled reader connection, or None while the database file does not exist yet
+    if not os.path.exists(db_path):
+        yield None
+        return
+    with db_pool.pool(db_path).reader() as conn:
+        yield conn
+
+
+def _query(sql, params=(), db_path=DB_PATH):
+    with connect(db_path) as conn:
+        if conn is None:
+            return pd.DataFrame()
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def _scalar(sql, params=(), db_path=DB_PATH):
+    with connect(db_path) as conn:
+        if conn is None:
+            return 0
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def _table(table_name):
+    table_name = table_name.lower()
+    if table_name not in READING_TABLES + ("agent_communications",):
+        raise ValueError(f"Unknown table: {table_name}")
+    return table_name
+
+
+# === Tables ===
+def table_columns(table_name, db_path=DB_PATH):
+    with connect(db_path) as conn:
+        if conn is None:
+            return []
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({_table(table_name)})")]
+
+
+def count_rows(table_name, db_path=DB_PATH):
+    return _scalar(f"SELECT COUNT(*) FROM {_table(table_name)}", db_path=db_path)
+
+
+def table_counts(db_path=DB_PATH):
+    return {t: count_rows(t, db_path) for t in READING_TABLES}
+
+
+def fetch_page(table_name, columns=None, page=1, page_size=20, db_path=DB_PATH, snapshot=None):
+    # Only the requested columns of one page leave SQLite; OFFSET walks the rowid b-tree, not the rows' data.
+    # Pages that lie inside a columnar snapshot (open_snapshot()) are sliced from its arrays instead.
+    table_name = _table(table_name)
+    available = table_columns(table_name, db_path)
+    columns = [c for c in (columns or available) if c in available]
+    start = (page - 1) * page_size
+    snap = snapshot.table(table_name) if snapshot else None
+    if snap is not None and start + page_size <= snap.rows and set(columns) <= set(snap.columns) | {"id"}:
+        frame = snap.frame(start, start + page_size, [c for c in columns if c != "id"], categorical=False)
+        frame["id"] = snap.ids[start:start + page_size]
+        return frame[columns]
+    projection = ", ".join(f'"{c}"' for c in columns) or "*"
+    return _query(f"SELECT {projection} FROM {table_name} ORDER BY rowid LIMIT ? OFFSET ?",
+                  (page_size, start), db_path)
+
+
+def open_snapshot(db_path=DB_PATH):
+    # The COLUMNAR_SNAPSHOT snapshot if it matches this database, else None
+    return columnar.open_snapshot(columnar.COLUMNAR_SNAPSHOT, db_path)
+
+
+def snapshot_version():
+    return columnar.manifest_mtime()
+
+
+# === Agent communications ===
+def recent_logs(limit=5, db_path=DB_PATH):
+    # Rows are appended by the writer as they are produced, so rowid order is time order
+    return _query("SELECT sender, user_id, message, response, timestamp FROM agent_communications "
+                  "ORDER BY rowid DESC LIMIT ?", (limit,), db_path)
+
+
+def _agent_filter(agent_type, user_filter):
+    sql, params = " WHERE sender = ?", [AGENT_SENDERS.get(agent_type.lower(), agent_type)]
+    if user_filter:
+        sql += " AND user_id LIKE ?"
+        params.append(f"%{user_filter}%")
+    return sql, params
+
+
+def count_agent_logs(agent_type, user_filter="", db_path=DB_PATH):
+    where, params = _agent_filter(agent_type, user_filter)
+    return _scalar("SELECT COUNT(*) FROM agent_communications" + where, params, db_path)
+
+
+def agent_logs(agent_type, user_filter="", page=1, page_size=50, db_path=DB_PATH):
+    where, params = _agent_filter(agent_type, user_filter)
+    return _query("SELECT user_id, message, response, timestamp, sender FROM agent_communications"
+                  + where + " ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                  params + [page_size, (page - 1) * page_size], db_path)
+
+
+def log_columns(db_path=DB_PATH):
+    stored = set(table_columns("agent_communications", db_path))
+    return STORED_COLUMNS if set(STORED_COLUMNS) <= stored else COMPUTED_COLUMNS
+
+
+def severity_logs(limit=200, severities=None, db_path=DB_PATH):
+    severity = log_columns(db_path)["severity"]
+    where, params = "", []
+    if severities:
+        where = f" WHERE {severity} IN ({', '.join('?' * len(severities))})"
+        params = list(severities)
+    return _query(f"SELECT user_id, message, {severity} AS Severity FROM agent_communications{where} "
+                  "ORDER BY rowid DESC LIMIT ?", params + [limit], db_path)
+
+
+# === Change detection ===
+def table_version(table_name, db_path=DB_PATH):
+    # Tables are append-only (INSERT OR IGNORE, no deletes), so the max rowid changes exactly
+    # when rows are added; it is a b-tree seek, cheap enough to poll
+    return _scalar(f"SELECT COALESCE(MAX(rowid), 0) FROM {_table(table_name)}", db_path=db_path)
+
+
+def table_versions(db_path=DB_PATH):
+    return {t: table_version(t, db_path) for t in READING_TABLES + ("agent_communications",)}
+
+
+# === Aggregates for Visual Insights ===
+# after_rowid/upto_rowid limit an aggregate to the rows in (after_rowid, upto_rowid], so running
+# totals can be topped up exactly up to a version read earlier
+def _rowid_range(after_rowid, upto_rowid):
+    if upto_rowid is None:
+        return "rowid > ?", [after_rowid]
+    return "rowid > ? AND rowid <= ?", [after_rowid, upto_rowid]
+
+
+def hourly_log_counts(db_path=DB_PATH, after_rowid=0, upto_rowid=None):
+    hour = log_columns(db_path)["hour"]
+    rows, params = _rowid_range(after_rowid, upto_rowid)
+    return _query(f"SELECT {hour} AS hour, COUNT(*) AS log_count FROM agent_communications "
+                  f"WHERE {hour} IS NOT NULL AND {rows} GROUP BY 1 ORDER BY 1", params, db_path)
+
+
+def agent_log_counts(db_path=DB_PATH, after_rowid=0, upto_rowid=None):
+    rows, params = _rowid_range(after_rowid, upto_rowid)
+    return _query('SELECT sender AS "Agent", COUNT(*) AS "Log Count" FROM agent_communications '
+                  f'WHERE {rows} GROUP BY sender ORDER BY 2 DESC', params, db_path)
+
+
+def message_length_counts(db_path=DB_PATH, after_rowid=0, upto_rowid=None):
+    # One row per distinct word count, not per message
+    word_count = log_columns(db_path)["word_count"]
+    rows, params = _rowid_range(after_rowid, upto_rowid)
+    return _query(f"SELECT {word_count} AS msg_len, COUNT(*) AS count FROM agent_communications "
+                  f"WHERE {rows} GROUP BY 1 ORDER BY 1", params, db_path)
+
+
+def severity_counts(db_path=DB_PATH, after_rowid=0, upto_rowid=None):
+    severity = log_columns(db_path)["severity"]
+    rows, params = _rowid_range(after_rowid, upto_rowid)
+    return _query(f"SELECT {severity} AS Severity, COUNT(*) AS count FROM agent_communications "
+                  f"WHERE {rows} GROUP BY 1 ORDER BY 2 DESC", params, db_path)
+
+
+# === Trends (rollup tables, schema v4) ===
+# Chart queries read pre-aggregated buckets: one primary-key range per user or location,
+# so their cost does not grow with the raw reading tables.
+TREND_METRICS = list(rollups.HEALTH_STATS)
+TREND_GRANULARITY = {"Hourly": "health_hourly", "Daily": "health_daily"}
+
+
+def rollups_ready(db_path=DB_PATH):
+    with connect(db_path) as conn:
+        if conn is None:
+            return False
+        return rollups.enabled(conn)
+
+
+def _metric(metric):
+    if metric not in TREND_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    return metric
+
+
+def user_trend(user_id, metric="heart_rate", granularity="Daily", db_path=DB_PATH):
+    m = _metric(metric)
+    table = rollups.table_name(TREND_GRANULARITY[granularity])
+    return _query(f"SELECT bucket, {m}_min AS min, {m}_sum / NULLIF({m}_n, 0) AS mean, {m}_max AS max, "
+                  f"readings, alerts, abnormal_readings FROM {table} WHERE user_id = ? ORDER BY bucket",
+                  (user_id,), db_path)
+
+
+def vitals_trend(metric="heart_rate", db_path=DB_PATH):
+    # All users, per hour
+    m = _metric(metric)
+    return _query(f"SELECT bucket, {m}_min AS min, {m}_sum / NULLIF({m}_n, 0) AS mean, {m}_max AS max, "
+                  f"readings, alerts, abnormal_readings FROM {rollups.table_name('vitals_hourly')} ORDER BY bucket",
+                  db_path=db_path)
+
+
+def falls_by_location(db_path=DB_PATH):
+    return _query(f"SELECT location, SUM(falls) AS falls, SUM(alerts) AS alerts, SUM(readings) AS readings "
+                  f"FROM {rollups.table_name('location_daily')} GROUP BY location ORDER BY falls DESC",
+                  db_path=db_path)
+
+
+def falls_by_day(db_path=DB_PATH):
+    return _query(f"SELECT bucket AS day, location, falls FROM {rollups.table_name('location_daily')} "
+                  "ORDER BY bucket, location", db_path=db_path)
+
+
+def _merge_counts(total, delta, key, value):
+    if total is None or total.empty:
+        return delta
+    if delta.empty:
+        return total
+    merged = pd.concat([total, delta]).groupby(key, as_index=False)[value].sum()
+    by_count = key in ("Agent", "Severity")
+    return merged.sort_values(value if by_count else key, ascending=not by_count, ignore_index=True)
+
+
+class LiveDashboardData:
+    """Counts, chart aggregates and the latest agent logs, kept up to date incrementally.
+
+    refresh() polls each table's version (max rowid) and, for tables that grew, reads only
+    the rows between the last version seen and the one just polled: counts and aggregates are
+    topped up with deltas and new log rows are appended to the cached tail. Rows committed after
+    the poll are left for the next refresh. Nothing is re-read while versions are unchanged.
+    """
+
+    def __init__(self, db_path=DB_PATH, keep_logs=1000):
+        self.db_path = db_path
+        self.keep_logs = keep_logs
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.versions = {}
+        self.counts = {}
+        self.hourly = self.agents = self.lengths = self.severities = None
+        self.logs = pd.DataFrame()
+
+    def refresh(self):
+        # Returns the tables that changed since the previous call
+        with self._lock:
+            current = table_versions(self.db_path)
+            if any(current[t] < self.versions.get(t, 0) for t in current):
+                self.reset()  # database replaced or rebuilt
+            changed = [t for t, v in current.items() if v != self.versions.get(t)]
+            for table in changed:
+                after, upto = self.versions.get(table, 0), current[table]
+                added = _scalar(f"SELECT COUNT(*) FROM {table} WHERE rowid > ? AND rowid <= ?", (after, upto),
+                                self.db_path)
+                self.counts[table] = self.counts.get(table, 0) + added
+                if table == "agent_communications":
+                    self._append_logs(after, upto)
+            self.versions = current
+            return changed
+
+    def _append_logs(self, after, upto):
+        new_logs = _query("SELECT rowid AS rowid, sender, user_id, message, response, timestamp "
+                          "FROM agent_communications WHERE rowid > ? AND rowid <= ? ORDER BY rowid DESC LIMIT ?",
+                          (after, upto, self.keep_logs), self.db_path)
+        self.logs = pd.concat([new_logs, self.logs], ignore_index=True).head(self.keep_logs)
+        args = (self.db_path, after, upto)
+        self.hourly = _merge_counts(self.hourly, hourly_log_counts(*args), "hour", "log_count")
+        self.agents = _merge_counts(self.agents, agent_log_counts(*args), "Agent", "Log Count")
+        self.lengths = _merge_counts(self.lengths, message_length_counts(*args), "msg_len", "count")
+        self.severities = _merge_counts(self.severities, severity_counts(*args), "Severity", "count")
+
+    def recent_logs(self, limit=5):
+        with self._lock:
+            return self.logs.drop(columns="rowid", errors="ignore").head(limit)
@@ -1,35 +1,173 @@
-import sqlite3
 import os
+import hashlib
 import pandas as pd
+import db_pool
+import rollups
+import schema
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "elderly_care.db")
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 DATA_DIR = os.path.abspath(DATA_DIR)
 print(f"DATA_DIR: {DATA_DIR}")
 
-## read daat from csv file and insert the data into database
-def read_csv_and_insert(filename, table_name):
+# === Streaming CSV ingest ===
+# Column name -> dtype, in table column order. CSV columns are mapped by position,
+# so extra trailing columns (e.g. the empty "Unnamed" ones) are never loaded.
+TABLE_COLUMNS = {
+    "health": {
+        "user_id": "str", "timestamp": "str",
+        "heart_rate": "Int64", "hear_rate_threshold_flag": "str",
+        "bp": "str", "bp_threshold_flag": "str",
+        "glucose": "Int64", "glucose_Threshold_flag": "str",
+        "oxygen": "Int64", "oxygen_threshold_flag": "str",
+        "alert_triggered": "str", "caregiver_notified": "str",
+    },
+    "safety": {
+        "user_id": "str", "timestamp": "str", "activity": "str",
+        "fall_detected": "str", "impact_force_level": "str",
+        "post_fall_inactivity_duration": "Int64", "location": "str",
+        "alert_triggered": "str", "caregiver_notified": "str",
+    },
+    "reminders": {
+        "user_id": "str", "timestamp": "str", "reminder_type": "str",
+        "scheduled_time": "str", "sent": "str", "acknowledged": "str",
+    },
+}
+
+# Natural key of a reading; re-ingesting a row with the same key is a no-op. Health and safety
+# readings are keyed on the whole raw row (schema's raw_key), so two different readings from one
+# user in the same minute are both kept; a reminder is identified by its scheduled slot.
+NATURAL_KEYS = {
+    "health": tuple(schema.RAW_COLUMNS["health"]),
+    "safety": tuple(schema.RAW_COLUMNS["safety"]),
+    "reminders": ("user_id", "timestamp", "reminder_type", "scheduled_time"),
+}
+# Set to 1 to delete duplicate readings left by earlier append-only loads (first copy kept);
+# otherwise startup stops and reports them, since the natural keys cannot be enforced over them
+DEDUP_EXISTING_ROWS = os.environ.get("DEDUP_EXISTING_ROWS") == "1"
+
+CSV_SOURCES = [
+    ("health_monitoring.csv", "health"),
+    ("safety_monitoring.csv", "safety"),
+    ("daily_reminder.csv", "reminders"),
+]
+
+INGEST_CHUNK_ROWS = 50000
+
+INGEST_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB page cache
+)
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _ensure_ingest_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingest_log (
+                        file_name TEXT,
+                        table_name TEXT,
+                        content_hash TEXT PRIMARY KEY,
+                        rows_inserted INT,
+                        loaded_at TEXT)''')
+    for table_name, key in NATURAL_KEYS.items():
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                        (f"ux_{table_name}_natural_key",)).fetchone():
+            continue  # the key is enforced already
+        _check_duplicates(conn, table_name, key)
+    conn.commit()
+
+
+def _check_duplicates(conn, table_name, key):
+    # Tables from before the natural keys (append-only loads) may hold a reading more than once;
+    # the schema migration cannot add the unique key until they are gone
+    cols = ", ".join(key)
+    first_copies = f"SELECT MIN(rowid) FROM {table_name} GROUP BY {cols}"
+    duplicates = conn.execute(f"SELECT (SELECT COUNT(*) FROM {table_name}) - "
+                              f"(SELECT COUNT(*) FROM ({first_copies}))").fetchone()[0]
+    if not duplicates:
+        return
+    if not DEDUP_EXISTING_ROWS:
+        raise RuntimeError(f"'{table_name}' holds {duplicates} duplicate rows (same {cols}). "
+                           f"Set DEDUP_EXISTING_ROWS=1 to delete them, keeping the first copy of each.")
+    removed = conn.execute(f"DELETE FROM {table_name} WHERE rowid NOT IN ({first_copies})").rowcount
+    print(f"[INFO] Removed {removed} duplicate rows from '{table_name}' (DEDUP_EXISTING_ROWS=1).")
+
+
+def iter_csv_chunks(path, table_name, chunksize=INGEST_CHUNK_ROWS):
+    columns = TABLE_COLUMNS[table_name]
+    reader = pd.read_csv(
+        path,
+        encoding="utf-8",
+        header=0,
+        names=list(columns),
+        usecols=range(len(columns)),
+        dtype=columns,
+        keep_default_na=False,
+        na_values={c: [""] for c, t in columns.items() if t == "Int64"},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        # object dtype turns pd.NA into None and numpy ints into Python ints for sqlite3
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield list(chunk.itertuples(index=False, name=None))
+
+
+def ingest_csv(conn, path, table_name, chunksize=INGEST_CHUNK_ROWS, force=False):
+    content_hash = file_sha256(path)
+    if not force and conn.execute(
+        "SELECT 1 FROM ingest_log WHERE content_hash = ?", (content_hash,)
+    ).fetchone():
+        print(f"[INFO] Skipping {os.path.basename(path)}: already loaded into '{table_name}'.")
+        return None
+
+    inserted = 0
+    for records in iter_csv_chunks(path, table_name, chunksize):
+        with conn:  # one transaction per chunk
+            inserted += insert_data(table_name, records, conn=conn)
+
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_log VALUES (?, ?, ?, ?, datetime('now'))",
+            (os.path.basename(path), table_name, content_hash, inserted)
+        )
+    return inserted
+
+
+## read data from csv file and insert the data into database
+def read_csv_and_insert(filename, table_name, conn=None):
     full_path = os.path.join(DATA_DIR, filename)
-    if os.path.exists(full_path):
-        try:
-            df = pd.read_csv(full_path, encoding='utf-8')
-
-            # handle extra columns
-            if (table_name == "reminders" or  table_name == "safety" or table_name == "health") and df.shape[1] > 6:
-                df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-            records = [tuple(row) for row in df.itertuples(index=False, name=None)]
-                
-            # Insert the records into the specified table
-            insert_data(table_name, records)
-            print(f"[INFO] Inserted data into table '{table_name}'.")
-        except Exception as e:
-            print(f"[ERROR] Could not read {filename}: {e}")
-    else:
+    if not os.path.exists(full_path):
         print(f"[WARNING] File not found: {full_path}")
+        return
+    if conn is None:
+        with db_pool.pool(DB_PATH).writer() as conn:
+            _ensure_ingest_schema(conn)
+            return read_csv_and_insert(filename, table_name, conn)
+    try:
+        inserted = ingest_csv(conn, full_path, table_name)
+        if inserted is not None:
+            print(f"[INFO] Inserted {inserted} new rows into table '{table_name}'.")
+    except Exception as e:
+        print(f"[ERROR] Could not read {filename}: {e}")
 
 #  intialize the database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    # On the process's shared writer connection (db_pool.py), so nothing else writes mid-ingest
+    with db_pool.pool(DB_PATH).writer() as conn:
+        _init_db(conn)
+
+
+def _init_db(conn):
+    for pragma in INGEST_PRAGMAS:
+        conn.execute(pragma)
     cursor = conn.cursor()
     cursor.execute('''CREATE TABLE IF NOT EXISTS health (
                         user_id TEXT, 
@@ -69,39 +207,129 @@ def init_db():
                         message TEXT, 
                         response TEXT, 
                         timestamp TEXT)''')
-                        
-    read_csv_and_insert("health_monitoring.csv", "health")
-    read_csv_and_insert("safety_monitoring.csv", "safety")
-    read_csv_and_insert("daily_reminder.csv", "reminders")
-
     conn.commit()
-    conn.close()
+    _ensure_ingest_schema(conn)
+    schema.migrate(conn)
 
-def insert_data(table_name, records):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    if table_name == "health":
-        cursor.executemany("INSERT INTO health VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
-    elif table_name == "safety":
-        cursor.executemany("INSERT INTO safety VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
-    elif table_name == "reminders":
-        cursor.executemany("INSERT INTO reminders VALUES (?, ?, ?, ?, ?, ?)", records)
-    else:
+    for filename, table_name in CSV_SOURCES:
+        read_csv_and_insert(filename, table_name, conn=conn)
+
+def insert_data(table_name, records, conn=None):
+    if table_name not in TABLE_COLUMNS:
         print(f"Unknown table: {table_name}")
-        conn.close()
-        return
-    
-    conn.commit()
-    conn.close()
+        return 0
+
+    if conn is None:
+        with db_pool.pool(DB_PATH).writer() as conn:  # committed when the block exits
+            return insert_data(table_name, records, conn)
+    # Callers may pass their own connection; the insert needs iso_ts() and the other SQL functions
+    schema.register_functions(conn)
+    before = conn.total_changes
+    # Typed columns (recorded_at, systolic/diastolic, 0/1 flags) are derived in the same statement
+    conn.executemany(schema.insert_sql(table_name), records)
+    inserted = conn.total_changes - before
+    # Fold the new rows into the rollup tables in the same transaction
+    if rollups.enabled(conn):
+        rollups.refresh(conn, [table_name])
+    return inserted
 
 
 def fetch_records(table_name):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table_name}")
-    records = cursor.fetchall()
-    conn.close()
-    return records
+    # Agents unpack rows positionally, so select the original columns explicitly
+    columns = ", ".join(schema.RAW_COLUMNS[table_name])
+    with db_pool.pool(DB_PATH).reader() as conn:
+        return conn.execute(f"SELECT {columns} FROM {table_name} ORDER BY id").fetchall()
+
+
+def fetch_matching_records(rules, after_id=0, upto_id=None, shard=None, limit=None):
+    # Push the agent's alert rules down to SQL so only matching rows are loaded (limit defaults to rules.max_alerts)
+    with db_pool.pool(DB_PATH).reader() as conn:
+        return rules.fetch_matches(conn, limit=limit, after_id=after_id, upto_id=upto_id, shard=shard)
+
+
+# === Incremental processing ===
+def max_record_id(table_name):
+    with db_pool.pool(DB_PATH).reader() as conn:
+        return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+
+
+def record_id_at(table_name, after_id, n):
+    # id of the n-th row with id > after_id (after_id itself for n == 0)
+    if n <= 0:
+        return after_id
+    with db_pool.pool(DB_PATH).reader() as conn:
+        return conn.execute(f"SELECT id FROM {table_name} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?",
+                            (after_id, n - 1)).fetchone()[0]
+
+
+def record_ids(table_name, after_id, upto_id, shard=None):
+    # ids of the rows iter_new_records(table_name, after_id, upto_id, shard=shard) yields, in the same order
+    sql = f"SELECT id FROM {table_name} WHERE id > ? AND id <= ?"
+    params = [after_id, upto_id]
+    if shard is not None:
+        sql += " AND shard_of(user_id, ?) = ?"
+        params += [shard[1], shard[0]]
+    with db_pool.pool(DB_PATH).reader() as conn:
+        return [row[0] for row in conn.execute(sql + " ORDER BY id", params)]
+
+
+def fetch_pending(agent_name, table_name, shard=None):
+    # (ids, rows) of the rows the agent left pending (agent_pending), in id order; rows as in fetch_records()
+    columns = ", ".join(f"t.{c}" for c in schema.RAW_COLUMNS[table_name])
+    sql = (f"SELECT t.id, {columns} FROM agent_pending p JOIN {table_name} t ON t.id = p.record_id "
+           f"WHERE p.agent = ?")
+    params = [agent_name]
+    if shard is not None:
+        sql += " AND shard_of(t.user_id, ?) = ?"
+        params += [shard[1], shard[0]]
+    with db_pool.pool(DB_PATH).reader() as conn:
+        rows = conn.execute(sql + " ORDER BY t.id", params).fetchall()
+    return [row[0] for row in rows], [row[1:] for row in rows]
+
+
+def iter_new_records(table_name, after_id=0, upto_id=None, batch_size=5000, shard=None):
+    # Yields (last_id, rows) batches of rows with after_id < id <= upto_id, in id order.
+    # Rows have the same shape as fetch_records(). shard=(k, n) keeps only users with shard_of(user_id, n) == k.
+    columns = ", ".join(schema.RAW_COLUMNS[table_name])
+    sql = f"SELECT id, {columns} FROM {table_name} WHERE id > ?"
+    params = [after_id]
+    if upto_id is not None:
+        sql += " AND id <= ?"
+        params.append(upto_id)
+    if shard is not None:
+        sql += " AND shard_of(user_id, ?) = ?"
+        params += [shard[1], shard[0]]
+    with db_pool.pool(DB_PATH).reader() as conn:
+        cursor = conn.execute(sql + " ORDER BY id", params)
+        try:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch[-1][0], [row[1:] for row in batch]
+        finally:
+            cursor.close()  # releases the read snapshot before the connection goes back to the pool
+
+
+def get_watermark(agent_name):
+    with db_pool.pool(DB_PATH).reader() as conn:
+        row = conn.execute("SELECT last_id FROM agent_watermarks WHERE agent = ?", (agent_name,)).fetchone()
+        return row[0] if row else 0
 
 
+def set_watermark(agent_name, table_name, last_id, pending=(), resolved=()):
+    # pending: ids to keep re-checking; resolved: pending ids that are done. Same transaction as
+    # the watermark, so a row is never both past the watermark and forgotten.
+    with db_pool.pool(DB_PATH).writer() as conn:
+        conn.execute(
+            """INSERT INTO agent_watermarks (agent, table_name, last_id, updated_at)
+               VALUES (?, ?, ?, datetime('now'))
+               ON CONFLICT(agent) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at""",
+            (agent_name, table_name, last_id)
+        )
+        if resolved:
+            conn.executemany("DELETE FROM agent_pending WHERE agent = ? AND record_id = ?",
+                             [(agent_name, i) for i in resolved])
+        if pending:
+            conn.executemany("INSERT OR IGNORE INTO agent_pending (agent, record_id) VALUES (?, ?)",
+                             [(agent_name, i) for i in pending])
@@ -0,0 +1,194 @@
+# db_pool.py
+# Shared SQLite connections for db.py, the dashboard (dashboard_queries.py) and the LLM log
+# writer (db_writer.py): per database file, one writer connection behind a lock and a small
+# pool of reader connections, all kept open so their prepared statements are reused.
+#
+# The database is switched to WAL on first open, so readers see the last committed state
+# while a write is in progress and never block the writer (or each other). Writers in this
+# process queue on the lock instead of spinning on SQLITE_BUSY; other processes (sharded
+# runners, the dashboard) still wait up to busy_timeout.
+#
+#   with pool().reader() as conn: conn.execute("SELECT ...")
+#   with pool().writer() as conn: conn.execute("INSERT ...")   # committed on exit
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import schema
+
+READERS = int(os.environ.get("DB_READERS", "4"))
+
+# Applied to every pooled connection
+PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MB of the file read through the page cache, not read() copies
+)
+READER_WAIT = 1.0  # seconds to wait for a free reader before opening a temporary one
+READER_CACHE_KB = 16384
+WRITER_CACHE_KB = 65536
+STATEMENT_CACHE = 256  # prepared statements kept per connection (sqlite3 default: 128)
+
+
+class ConnectionPool:
+    """Reader connections (up to ``readers``, created on demand) and one writer connection for
+    ``db_path``. Connections are checked out by one thread at a time and may move between threads."""
+
+    def __init__(self, db_path, readers=READERS, synchronous="NORMAL"):
+        self.db_path = db_path
+        self.readers = readers
+        self.synchronous = synchronous
+        self._idle = queue.LifoQueue()  # (generation, conn); most recently used first: its cache is warm
+        self._opened = 0
+        self._generation = 0
+        self._inode = None
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._local = threading.local()  # .write_depth: this thread's nesting of writer() blocks
+        self._lock = threading.Lock()
+        self.stats = {"readers_opened": 0, "reader_waits": 0, "reader_overflow": 0, "writes": 0}
+
+    def _connect(self, cache_kb):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA cache_size=-{cache_kb}")
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")  # persistent: done once per database file
+            except sqlite3.OperationalError as e:
+                print(f"[DBPool] Could not switch {self.db_path} to WAL: {e}")
+        return schema.register_functions(conn)
+
+    def _check_file(self):
+        # A database file replaced under the same path (rebuilt, restored) gets fresh connections
+        try:
+            inode = os.stat(self.db_path).st_ino
+        except OSError:
+            inode = None
+        if inode != self._inode:
+            with self._write_lock, self._lock:
+                if inode != self._inode:
+                    self._reset()
+                    self._inode = inode
+
+    def _reset(self):
+        # Caller holds both locks. Checked-out readers of the old generation are closed when returned.
+        while True:
+            try:
+                self._idle.get_nowait()[1].close()
+            except queue.Empty:
+                break
+        self._generation += 1
+        self._opened = 0
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    @contextmanager
+    def reader(self):
+        self._check_file()
+        try:
+            generation, conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                generation = self._generation
+                create = self._opened < self.readers
+                if create:
+                    self._opened += 1
+            if create:
+                try:
+                    conn = self._connect(READER_CACHE_KB)
+                except Exception:
+                    with self._lock:
+                        if generation == self._generation:
+                            self._opened -= 1
+                    raise
+                self.stats["readers_opened"] += 1
+            else:
+                self.stats["reader_waits"] += 1
+                try:
+                    generation, conn = self._idle.get(timeout=READER_WAIT)
+                except queue.Empty:
+                    # Every reader is checked out (e.g. by generators still iterating): never deadlock
+                    generation, conn = None, self._connect(READER_CACHE_KB)
+                    self.stats["reader_overflow"] += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # a reader never keeps a snapshot open while idle
+            with self._lock:
+                current = generation == self._generation
+            if current:
+                self._idle.put((generation, conn))
+            else:
+                conn.close()
+
+    @contextmanager
+    def writer(self, synchronous=None):
+        # Commits on success, rolls back on error. Re-entrant within a thread: nested blocks
+        # join the outermost block's transaction. The depth is per thread, so another thread's
+        # open block never hides (or fakes) this thread's outermost one.
+        depth = getattr(self._local, "write_depth", 0)
+        if depth == 0:
+            # Never inside this thread's own block: a replaced file would close the writer under it
+            self._check_file()
+        with self._write_lock:
+            outer = depth == 0
+            self._local.write_depth = depth + 1
+            try:
+                if self._writer is None:
+                    self._writer = self._connect(WRITER_CACHE_KB)
+                    self._writer.execute(f"PRAGMA synchronous={self.synchronous}")
+                conn = self._writer
+                override = outer and synchronous and synchronous.upper() != self.synchronous.upper()
+                if override:
+                    conn.execute(f"PRAGMA synchronous={synchronous}")
+                try:
+                    yield conn
+                    if outer and conn.in_transaction:
+                        conn.commit()
+                except BaseException:
+                    if outer and conn.in_transaction:
+                        conn.rollback()
+                    raise
+                finally:
+                    if override:
+                        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+                if outer:
+                    self.stats["writes"] += 1
+            finally:
+                self._local.write_depth = depth
+
+    def close(self):
+        with self._write_lock, self._lock:
+            self._reset()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool(db_path=None):
+    """The shared pool for ``db_path`` (default db.DB_PATH) in this process."""
+    if db_path is None:
+        import db
+        db_path = db.DB_PATH
+    # Keyed by pid as well: connections must not cross a fork (sharded runners)
+    key = (os.getpid(), os.path.abspath(db_path))
+    p = _pools.get(key)
+    if p is None:
+        with _pools_lock:
+            p = _pools.setdefault(key, ConnectionPool(db_path))
+    return p
+
+
+def close_all():
+    with _pools_lock:
+        for key, p in list(_pools.items()):
+            if key[0] == os.getpid():
+                p.close()  # another process's connections are left alone, never closed after a fork
+            del _pools[key]
@@ -0,0 +1,168 @@
+import atexit
+import queue
+import threading
+import time
+import db_pool
+from db import DB_PATH
+from metrics import registry as metrics
+from schema import COMMUNICATION_DERIVED
+from severity import derived_fields
+
+INSERT_COMMUNICATION = (
+    "INSERT INTO agent_communications (sender, user_id, message, response, timestamp) VALUES (?, ?, ?, ?, ?)"
+)
+# Schema v3+: severity, word count and hour bucket are stored with the row
+ROWS_WRITTEN = metrics.counter("db_rows_written_total", "agent_communications rows committed")
+ROWS_DROPPED = metrics.counter("db_rows_dropped_total", "agent_communications rows lost to a failed commit")
+
+INSERT_COMMUNICATION_DERIVED = (
+    "INSERT INTO agent_communications (sender, user_id, message, response, timestamp, "
+    + ", ".join(COMMUNICATION_DERIVED) + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class _FlushRequest:
+    # Queue marker: commit everything received so far, then signal the caller
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _AfterCommit:
+    # Queue marker: call fn once every row written before it is committed
+    def __init__(self, fn):
+        self.fn = fn
+
+
+class AgentLogWriter:
+    """Single writer thread for ``agent_communications``.
+
+    Workers call ``write()`` and return immediately; the writer commits rows with
+    ``executemany`` once ``batch_size`` rows are pending or ``flush_interval`` seconds
+    have passed since the first pending row, on the process's shared WAL writer
+    connection (db_pool.py), so its commits queue behind other writes in this process
+    instead of failing with "database is locked".
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=200, flush_interval=0.5, synchronous="NORMAL"):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.rows_written = 0
+        self.rows_dropped = 0
+        # Called with the list of rows after each successful commit (e.g. for latency tracking)
+        self.commit_listeners = []
+        self._queue = queue.Queue()
+        self._closed = False
+        self.thread = threading.Thread(target=self._run, name="AgentLogWriter", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, row):
+        self._queue.put(row)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def durability(self):
+        guarantee = (
+            "survives process crash and power loss"
+            if self.synchronous.upper() in ("FULL", "EXTRA")
+            else "survives process crash; last transactions may roll back on power loss"
+        )
+        return (
+            f"Rows are committed within {self.flush_interval}s or every {self.batch_size} rows "
+            f"(WAL, synchronous={self.synchronous}): once committed a row {guarantee}. "
+            f"Call flush() to wait for pending rows."
+        )
+
+    def after_commit(self, fn):
+        # Non-blocking: fn() runs on the writer thread after the commit that covers every row
+        # written so far; it is dropped if that commit fails (e.g. durable job acks, llm_job_queue.py)
+        self._queue.put(_AfterCommit(fn))
+
+    def flush(self, timeout=None):
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        self._derived = False
+        pending = []
+        callbacks = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # flush_interval elapsed since the first pending row
+                self._commit(pending, callbacks)
+                pending, callbacks, deadline = [], [], None
+                continue
+
+            if item is None:
+                self._commit(pending, callbacks)
+                break
+            if isinstance(item, _FlushRequest):
+                self._commit(pending, callbacks)
+                pending, callbacks, deadline = [], [], None
+                item.done.set()
+                continue
+            if isinstance(item, _AfterCommit):
+                if pending:
+                    callbacks.append(item.fn)
+                else:
+                    self._run_callbacks([item.fn])  # everything before it is already committed
+                continue
+
+            pending.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(pending) >= self.batch_size:
+                self._commit(pending, callbacks)
+                pending, callbacks, deadline = [], [], None
+
+    def _commit(self, rows, callbacks=()):
+        if not rows:
+            return
+        try:
+            with metrics.span("db_commit"), db_pool.pool(self.db_path).writer(self.synchronous) as conn:
+                if not self._derived:
+                    # Re-checked per commit until present: the writer starts before init_db migrates
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(agent_communications)")}
+                    self._derived = set(COMMUNICATION_DERIVED) <= columns
+                if self._derived:
+                    conn.executemany(INSERT_COMMUNICATION_DERIVED,
+                                     [row + derived_fields(row[2], row[3], row[4]) for row in rows])
+                else:
+                    conn.executemany(INSERT_COMMUNICATION, rows)
+        except Exception as e:
+            # The rows are not retried: count them so the loss shows up in metrics, not just the log
+            self.rows_dropped += len(rows)
+            ROWS_DROPPED.inc(len(rows))
+            print(f"[DBWriter] Failed to write {len(rows)} rows: {e}")
+            return
+        self.rows_written += len(rows)
+        ROWS_WRITTEN.inc(len(rows))
+        print(f"[DBWriter] Committed {len(rows)} rows to agent_communications (queue depth {self.queue_depth()}).")
+        for listener in self.commit_listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"[DBWriter] Commit listener failed: {e}")
+        self._run_callbacks(callbacks)
+
+    def _run_callbacks(self, callbacks):
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[DBWriter] After-commit callback failed: {e}")
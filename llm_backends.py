@@ -0,0 +1,116 @@
+import os
+import subprocess
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "auto")  # auto | http | subprocess
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))  # per-call deadline (s); was a fixed 300
+
+TIMEOUT_RESPONSE = "LLM Timeout: Default response triggered. Escalate to caregiver."
+UNAVAILABLE_RESPONSE = "LLM Unavailable: Default response triggered. Escalate to caregiver."
+ERROR_PREFIXES = ("LLM Timeout", "LLM Unavailable", "LLM failed", "LLM Error")
+
+
+def is_error_response(response: str) -> bool:
+    return response.startswith(ERROR_PREFIXES)
+
+
+class LLMBackendError(Exception):
+    """Raised when a backend cannot reach the model at all (used to trigger fallback)."""
+
+
+class LLMBackend:
+    name = "base"
+
+    def generate(self, model_name: str, prompt: str) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# === Ollama CLI: one process per prompt (original behaviour) ===
+class SubprocessBackend(LLMBackend):
+    name = "subprocess"
+
+    def __init__(self, command=("ollama", "run"), timeout=LLM_TIMEOUT):
+        self.command = list(command)
+        self.timeout = timeout
+
+    def generate(self, model_name, prompt):
+        try:
+            result = subprocess.run(
+                self.command + [model_name, prompt],
+                capture_output=True,
+                text=True,
+                encoding="utf-8",  # force UTF-8 decoding
+                errors="replace",
+                timeout=self.timeout
+            )
+        except FileNotFoundError as e:
+            raise LLMBackendError(f"{self.command[0]} not found: {e}")
+        except subprocess.TimeoutExpired:
+            return TIMEOUT_RESPONSE
+        if result.returncode == 0:
+            return result.stdout.strip()
+        return f"LLM failed with code {result.returncode}: {result.stderr.strip()}"
+
+
+# === Ollama REST API: pooled keep-alive connections to `ollama serve` ===
+class OllamaHTTPBackend(LLMBackend):
+    name = "http"
+
+    def __init__(self, host=OLLAMA_HOST, pool_size=14, timeout=LLM_TIMEOUT, keep_alive="30m"):
+        self.url = host.rstrip("/") + "/api/generate"
+        self.timeout = timeout
+        self.keep_alive = keep_alive  # keeps the model loaded between prompts
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, model_name, prompt):
+        payload = {"model": model_name, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive}
+        try:
+            resp = self.session.post(self.url, json=payload, timeout=(min(5, self.timeout), self.timeout))
+        except requests.exceptions.ConnectionError as e:
+            raise LLMBackendError(f"Ollama server unreachable at {self.url}: {e}")
+        except requests.exceptions.Timeout:
+            return TIMEOUT_RESPONSE
+        if resp.status_code != 200:
+            return f"LLM failed with code {resp.status_code}: {resp.text.strip()}"
+        return resp.json().get("response", "").strip()
+
+    def close(self):
+        self.session.close()
+
+
+# === Try the HTTP client first, drop to the CLI if the server is not reachable ===
+class FallbackBackend(LLMBackend):
+    name = "auto"
+
+    def __init__(self, primary: LLMBackend, fallback: LLMBackend):
+        self.primary = primary
+        self.fallback = fallback
+
+    def generate(self, model_name, prompt):
+        try:
+            return self.primary.generate(model_name, prompt)
+        except LLMBackendError as e:
+            print(f"[LLMBackend] {self.primary.name} unavailable, falling back to {self.fallback.name}: {e}")
+            return self.fallback.generate(model_name, prompt)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+def get_backend(kind=LLM_BACKEND, pool_size=14):
+    if kind == "http":
+        return OllamaHTTPBackend(pool_size=pool_size)
+    if kind == "subprocess":
+        return SubprocessBackend()
+    if kind == "auto":
+        return FallbackBackend(OllamaHTTPBackend(pool_size=pool_size), SubprocessBackend())
+    raise ValueError(f"Unknown LLM backend: {kind}")
@@ -0,0 +1,56 @@
+import re
+import time
+import queue
+from llm_scheduler import NORMAL
+
+USER_PLACEHOLDER = "{user_id}"
+
+
+def _user_pattern(user_id):
+    return re.compile(rf"\b{re.escape(user_id)}\b")
+
+
+def template_key(sender, message, user_id):
+    # Prompts that only differ by the user they mention share one key,
+    # e.g. "User D1003 is lying in the kitchen." -> "User {user_id} is lying in the kitchen."
+    if user_id and user_id != "unknown":
+        message = _user_pattern(user_id).sub(USER_PLACEHOLDER, message)
+    return (sender, message)
+
+
+def collect_batch(prompt_queue, max_batch_size=32, window=0.05, timeout=1, max_priority=None):
+    # Block for the first item (raises queue.Empty), then keep draining until the
+    # batch is full or the time window has elapsed.
+    batch = [prompt_queue.get(timeout=timeout, max_priority=max_priority)]
+    deadline = time.monotonic() + window
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                item = prompt_queue.get(timeout=remaining, max_priority=max_priority)
+            else:
+                item = prompt_queue.get_nowait(max_priority=max_priority)
+        except queue.Empty:
+            break
+        batch.append(item)
+    return batch
+
+
+def group_batch(batch):
+    # Most urgent group first, then first-arrival order; the first item of each group is the one sent to the model
+    groups = {}
+    for item in batch:
+        sender, message, user_id = item
+        groups.setdefault(template_key(sender, message, user_id), []).append(item)
+    return sorted(groups.values(), key=group_priority)
+
+
+def group_priority(group):
+    return min(getattr(item, "priority", NORMAL) for item in group)
+
+
+def fan_out(response, leader_user_id, user_id):
+    # Re-address the shared answer to each member of the group
+    if not leader_user_id or leader_user_id == user_id or leader_user_id == "unknown":
+        return response
+    return _user_pattern(leader_user_id).sub(user_id, response)
@@ -0,0 +1,116 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Whitespace only: case can change what is asked (user ids, units, "NOT"), so it stays in the key
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed LLM response cache.
+
+    An in-memory LRU tier sits in front of an optional SQLite tier (``db_path``).
+    Both tiers expire entries after ``ttl`` seconds and are bounded in size.
+    """
+
+    def __init__(self, max_entries=1024, ttl=6 * 3600, db_path=None, max_persistent_entries=50000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_persistent_entries = max_persistent_entries
+        self._memory = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "memory_hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0}
+
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS llm_response_cache (
+                                    key TEXT PRIMARY KEY,
+                                    model TEXT,
+                                    response TEXT,
+                                    expires_at REAL,
+                                    last_access REAL)''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_response_cache(last_access)")
+            self._conn.commit()
+
+    def get(self, model_name, prompt):
+        key = cache_key(model_name, prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["hits"] += 1
+                    self.counters["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, expires_at FROM llm_response_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row:
+                    self._conn.execute("UPDATE llm_response_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+                    self._put_memory(key, row[0], row[1])
+                    self.counters["hits"] += 1
+                    self.counters["persistent_hits"] += 1
+                    return row[0]
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, model_name, prompt, response):
+        key = cache_key(model_name, prompt)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._put_memory(key, response, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache (key, model, response, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, model_name, response, expires_at, now)
+                )
+                self._evict_persistent(now)
+                self._conn.commit()
+
+    def _put_memory(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _evict_persistent(self, now):
+        cur = self._conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+        evicted = cur.rowcount
+        cur = self._conn.execute(
+            """DELETE FROM llm_response_cache WHERE key IN (
+                   SELECT key FROM llm_response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)""",
+            (self.max_persistent_entries,)
+        )
+        self.counters["evictions"] += evicted + max(cur.rowcount, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,162 @@
+# llm_guard.py
+# Protects the model server from the worker pool: an AIMD concurrency limit that backs
+# off when calls fail or slow down, per-call deadlines, and a circuit breaker that answers
+# with the deterministic fallback immediately while the backend is unhealthy.
+import threading
+import time
+from llm_backends import LLMBackend, TIMEOUT_RESPONSE, UNAVAILABLE_RESPONSE, is_error_response
+
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease limit on concurrent model calls.
+
+    Each success that is not much slower than the best latency seen raises the limit by
+    ``1/limit`` (about +1 per round of calls); a failure or a call slower than
+    ``latency_tolerance`` x baseline (and at least ``latency_slack`` seconds over it) halves it,
+    at most once per ``cooldown`` seconds.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=14, backoff=0.5, latency_tolerance=2.0,
+                 latency_slack=0.05, cooldown=1.0):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack  # ignore jitter on very fast (e.g. cached/stub) calls
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline = None  # best recent latency; drifts up 1% per call so it follows the model
+        self.shed = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def concurrency(self):
+        return int(self.limit)
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def try_acquire(self):
+        # Non-blocking variant for callers that wait elsewhere (e.g. the asyncio runtime)
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, ok=True):
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+            slow = (self.baseline is not None and latency > self.latency_tolerance * self.baseline
+                    and latency - self.baseline > self.latency_slack)
+            now = time.monotonic()
+            if not ok or slow:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "baseline_ms": round(self.baseline * 1000, 2) if self.baseline is not None else None,
+                "shed": self.shed,
+            }
+
+
+class CircuitBreaker:
+    """closed -> open after ``failure_threshold`` consecutive failures; after ``reset_timeout``
+    seconds one probe call is let through (half_open) and its result closes or re-opens it."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "closed" or (self.state == "half_open" and not self._probing):
+                self._probing = self.state == "half_open"
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state, self.failures = "closed", 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"[LLMGuard] Circuit opened after {self.failures} failures; "
+                          f"answering with the fallback for {self.reset_timeout:g}s.")
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def cancel(self):
+        # An allowed call that never reached the backend: let another probe through
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class GuardedBackend(LLMBackend):
+    name = "guarded"
+
+    def __init__(self, backend: LLMBackend, limiter=None, breaker=None, queue_timeout=30.0):
+        self.backend = backend
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.queue_timeout = queue_timeout  # longest a call waits for a concurrency slot
+
+    def generate(self, model_name, prompt):
+        if not self.breaker.allow():
+            return UNAVAILABLE_RESPONSE
+        if not self.limiter.acquire(timeout=self.queue_timeout):
+            self.breaker.cancel()  # overload, not a backend fault
+            return TIMEOUT_RESPONSE
+        start = time.monotonic()
+        ok = False
+        try:
+            response = self.backend.generate(model_name, prompt)
+            ok = not is_error_response(response)
+            return response
+        finally:
+            self.limiter.release(time.monotonic() - start, ok)
+            self.breaker.record(ok)
+
+    def stats(self):
+        return {"breaker": self.breaker.stats(), "limiter": self.limiter.stats()}
+
+    def close(self):
+        self.backend.close()
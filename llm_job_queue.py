@@ -0,0 +1,265 @@
+# llm_job_queue.py
+# Crash-safe alternative to PriorityPromptQueue (set LLM_QUEUE_DB): every prompt is a row in
+# a SQLite llm_jobs table from put() until its response row is committed to agent_communications.
+#
+#   pending --claim--> leased --response committed--> (deleted)
+#                        |--model error--> pending again after a backoff (attempts < max_attempts)
+#                        '--last attempt fails--> dead (kept for inspection; the fallback answer is logged)
+#
+# Workers claim a few jobs at a time (bounded prefetch) under a lease; leases still held when the
+# process exits are released on the next start, and a lease of another owner that outlives
+# lease_timeout is reclaimed by the next claim, so a restart resumes exactly the prompts that were
+# not answered. This process's own leases are never reclaimed: their jobs are still in its buffer,
+# with a worker, or waiting for ack()/retry(), however long that takes.
+# One consuming process per queue file, like the single agent_communications writer.
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from llm_scheduler import NORMAL, PRIORITY_NAMES, Prompt, priority_level
+from metrics import LatencyStats, registry as metrics
+
+JOBS = metrics.counter("llm_jobs_total", "Durable LLM job transitions (retried, dead_lettered, recovered)")
+
+CREATE_JOBS = '''CREATE TABLE IF NOT EXISTS llm_jobs (
+                    id INTEGER PRIMARY KEY,
+                    sender TEXT,
+                    message TEXT,
+                    user_id TEXT,
+                    priority INTEGER NOT NULL,
+                    rank REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    last_error TEXT)'''
+
+
+class DurableJobQueue:
+    """SQLite-backed drop-in for ``PriorityPromptQueue`` (put/get/task_done/join/qsize/requeue).
+
+    Ordering matches the in-memory queue's aging: a job ranks as if enqueued
+    ``priority * aging_interval`` seconds later, stored as ``rank`` so claims are one index range.
+    ``get`` serves from at most ``prefetch`` claimed jobs held in memory.
+    Completion is two-step: ``task_done()`` counts for ``join()`` as usual, while ``ack()``
+    (called once the response row is committed) deletes the job; ``retry()`` reschedules a failed one.
+    """
+
+    def __init__(self, db_path, aging_interval=15.0, prefetch=32, lease_timeout=300.0,
+                 max_attempts=3, backoff=5.0, max_backoff=300.0, poll_interval=0.5, synchronous="NORMAL"):
+        self.db_path = db_path
+        self.aging_interval = aging_interval
+        self.prefetch = prefetch
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._buffer = []  # claimed (leased) prompts not yet handed out
+        self._mutex = threading.Lock()
+        self.not_empty = threading.Condition(self._mutex)
+        self.all_tasks_done = threading.Condition(self._mutex)
+        self.wait_times = {level: LatencyStats() for level in PRIORITY_NAMES}
+        self.counters = {"enqueued": 0, "completed": 0, "retried": 0, "dead_lettered": 0, "recovered": 0}
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        with self._conn:
+            self._conn.execute(CREATE_JOBS)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_jobs_ready ON llm_jobs(status, rank)")
+            # Whoever held these leases is gone (one consumer per file): their jobs are pending again
+            recovered = self._conn.execute("UPDATE llm_jobs SET status = 'pending', lease_owner = NULL "
+                                           "WHERE status = 'leased'").rowcount
+        self.counters["recovered"] = recovered
+        if recovered:
+            JOBS.inc(recovered, outcome="recovered")
+            print(f"[JobQueue] Recovered {recovered} unfinished prompts from {db_path}.")
+        # Jobs left from a previous run count towards join() like freshly queued ones
+        self.unfinished_tasks = self._conn.execute(
+            "SELECT COUNT(*) FROM llm_jobs WHERE status != 'dead'").fetchone()[0]
+
+    # === queue.Queue API ===
+    def put(self, item, block=True, timeout=None, priority=NORMAL):
+        sender, message, user_id = item
+        level = priority_level(priority)
+        now = time.time()
+        with self._mutex:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO llm_jobs (sender, message, user_id, priority, rank, enqueued_at, available_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (sender, message, user_id, level, now + level * self.aging_interval, now, now))
+            self.counters["enqueued"] += 1
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, item, priority=NORMAL):
+        self.put(item, priority=priority)
+
+    def get(self, block=True, timeout=None, max_priority=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.not_empty:
+            while True:
+                prompt = self._pop(max_priority)
+                if prompt is None:
+                    # A reserved (critical-only) slot may claim past a full buffer of other prompts
+                    room = self.prefetch - len(self._buffer)
+                    if room > 0 or max_priority is not None:
+                        self._claim(max(room, 1), max_priority)
+                        prompt = self._pop(max_priority)
+                if prompt is not None:
+                    break
+                if not block:
+                    raise queue.Empty
+                # Polls as well as waiting for put(): retries become due and other processes may enqueue
+                wait = self.poll_interval
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = min(wait, remaining)
+                self.not_empty.wait(wait)
+        if not prompt.requeued:
+            waited = time.monotonic() - prompt.enqueued_at
+            self.wait_times[prompt.priority].observe(waited)
+            metrics.record_span("queue_wait", waited, agent=prompt[0], user=prompt[-1])
+        return prompt
+
+    def get_nowait(self, max_priority=None):
+        return self.get(block=False, max_priority=max_priority)
+
+    def task_done(self):
+        with self.all_tasks_done:
+            unfinished = self.unfinished_tasks - 1
+            if unfinished < 0:
+                raise ValueError("task_done() called too many times")
+            if unfinished == 0:
+                self.all_tasks_done.notify_all()
+            self.unfinished_tasks = unfinished
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+
+    def qsize(self):
+        with self._mutex:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_jobs WHERE status = 'pending'").fetchone()[0] \
+                + len(self._buffer)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    # === Scheduling ===
+    def requeue(self, prompts):
+        # Back into the in-memory buffer, still leased; not counted as new tasks
+        with self._mutex:
+            for prompt in prompts:
+                prompt.requeued = True
+                self._buffer.append(prompt)
+            self.not_empty.notify(len(prompts))
+
+    def _pop(self, max_priority):
+        eligible = [p for p in self._buffer if max_priority is None or p.priority <= max_priority]
+        if not eligible:
+            return None
+        prompt = min(eligible, key=lambda p: p.rank)
+        self._buffer.remove(prompt)
+        return prompt
+
+    def _claim(self, limit, max_priority):
+        now = time.time()
+        where = ("(status = 'pending' AND available_at <= ?) "
+                 "OR (status = 'leased' AND lease_until <= ? AND lease_owner IS NOT ?)")
+        params = [now, now, self.owner]
+        if max_priority is not None:
+            where = f"({where}) AND priority <= ?"
+            params.append(max_priority)
+        with self._conn:
+            rows = self._conn.execute(
+                f"UPDATE llm_jobs SET status = 'leased', lease_owner = ?, lease_until = ? "
+                f"WHERE id IN (SELECT id FROM llm_jobs WHERE {where} ORDER BY rank LIMIT ?) "
+                "RETURNING id, sender, message, user_id, priority, rank, enqueued_at, attempts",
+                [self.owner, now + self.lease_timeout] + params + [limit]).fetchall()
+        offset = time.monotonic() - now  # wall clock -> monotonic, for wait times
+        for job_id, sender, message, user_id, level, rank, enqueued_at, attempts in rows:
+            prompt = Prompt((sender, message, user_id), level, enqueued_at + offset)
+            prompt.job_id, prompt.rank, prompt.attempts = job_id, rank, attempts
+            prompt.requeued = attempts > 0  # wait was recorded on the first attempt
+            self._buffer.append(prompt)
+        return len(rows)
+
+    # === Completion ===
+    def ack(self, prompts):
+        # The prompts' responses are committed: their jobs are finished
+        ids = [(p.job_id,) for p in prompts]
+        with self._mutex, self._conn:
+            self._conn.executemany("DELETE FROM llm_jobs WHERE id = ? AND status = 'leased'", ids)
+            self.counters["completed"] += len(ids)
+
+    def retry(self, prompt, error):
+        # Returns True if the job was rescheduled (the caller logs nothing), False once it is dead-lettered
+        # attempts counts failed model calls, so prompts claimed but never run (prefetched, requeued,
+        # or still buffered when the process stopped) do not use up a job's attempts
+        with self._mutex:
+            prompt.attempts += 1
+            if prompt.attempts >= self.max_attempts:
+                with self._conn:
+                    self._conn.execute("UPDATE llm_jobs SET status = 'dead', attempts = ?, lease_owner = NULL, "
+                                       "last_error = ? WHERE id = ?", (prompt.attempts, error, prompt.job_id))
+                self.counters["dead_lettered"] += 1
+                JOBS.inc(outcome="dead_lettered")
+                return False
+            delay = min(self.backoff * 2 ** (prompt.attempts - 1), self.max_backoff)
+            with self._conn:
+                self._conn.execute("UPDATE llm_jobs SET status = 'pending', attempts = ?, lease_owner = NULL, "
+                                   "available_at = ?, last_error = ? WHERE id = ?",
+                                   (prompt.attempts, time.time() + delay, error, prompt.job_id))
+            self.counters["retried"] += 1
+            self.unfinished_tasks += 1  # the caller's task_done() closes this attempt only
+        JOBS.inc(outcome="retried")
+        return True
+
+    def dead_letters(self, limit=100):
+        with self._mutex:
+            return self._conn.execute(
+                "SELECT id, sender, user_id, message, attempts, last_error FROM llm_jobs WHERE status = 'dead' "
+                "ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def revive_dead(self):
+        # Give dead-lettered jobs a fresh set of attempts (e.g. once the model server is back)
+        with self._mutex:
+            with self._conn:
+                revived = self._conn.execute("UPDATE llm_jobs SET status = 'pending', attempts = 0, available_at = ? "
+                                             "WHERE status = 'dead'", (time.time(),)).rowcount
+            self.unfinished_tasks += revived
+            self.not_empty.notify(revived)
+        return revived
+
+    # === Stats ===
+    def lane_depths(self):
+        with self._mutex:
+            depths = dict(self._conn.execute("SELECT priority, COUNT(*) FROM llm_jobs WHERE status = 'pending' "
+                                             "GROUP BY priority").fetchall())
+            for prompt in self._buffer:
+                depths[prompt.priority] = depths.get(prompt.priority, 0) + 1
+        return {PRIORITY_NAMES[level]: depths.get(level, 0) for level in PRIORITY_NAMES}
+
+    def wait_stats(self):
+        return {PRIORITY_NAMES[level]: stats.summary() for level, stats in self.wait_times.items()}
+
+    def stats(self):
+        with self._mutex:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM llm_jobs GROUP BY status").fetchall())
+            return dict(self.counters, prefetched=len(self._buffer), **{s: by_status.get(s, 0)
+                                                                       for s in ("pending", "leased", "dead")})
+
+    def close(self):
+        with self._mutex:
+            self._conn.close()
@@ -1,15 +1,47 @@
+import os
 import threading
 import queue
-import subprocess
-import sqlite3
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
+from llm_backends import get_backend, is_error_response
+from llm_guard import GuardedBackend, AdaptiveLimiter
+from llm_cache import ResponseCache
+from llm_batching import collect_batch, group_batch, group_priority, fan_out
+from llm_scheduler import PriorityPromptQueue, WorkerSlots
+from llm_job_queue import DurableJobQueue
+from db_writer import AgentLogWriter
+from metrics import registry as metrics
 
-llm_prompt_queue = queue.Queue()
+LLM_RUNTIME = os.environ.get("LLM_RUNTIME", "threads")  # threads | async (see async_runtime.py)
+# Set LLM_QUEUE_DB to a SQLite path to keep queued prompts across crashes and restarts
+LLM_QUEUE_DB = os.environ.get("LLM_QUEUE_DB")
+
+# Severity lanes: critical > high > normal > low, with aging so low lanes still drain
+llm_prompt_queue = DurableJobQueue(LLM_QUEUE_DB) if LLM_QUEUE_DB else PriorityPromptQueue()
+
+PROMPTS = metrics.counter("llm_prompts_total", "Prompts answered, including ones served by a shared model call")
+RESPONSES = metrics.counter("llm_responses_total", "LLM answers by source (model, cache, error)")
 
 class LLMBackgroundWorker:
-    def __init__(self, model_name="tinyllama", max_workers=14):
+    def __init__(self, model_name="tinyllama", max_workers=14, backend=None,
+                 batch_window=0.05, max_batch_size=32, cache=None, writer=None, reserved_critical=2):
         self.model_name = model_name
+        # max_workers is only the ceiling: the guard adapts how many model calls run at once
+        # and short-circuits to the fallback response while the backend is failing
+        self.backend = backend or GuardedBackend(get_backend(pool_size=max_workers),
+                                                 AdaptiveLimiter(max_limit=max_workers))
+        # Set LLM_CACHE_DB to a SQLite path to keep cached answers across runs
+        self.cache = cache or ResponseCache(db_path=os.environ.get("LLM_CACHE_DB"))
+        # Micro-batching: prompts arriving within batch_window seconds (up to max_batch_size)
+        # are deduplicated so identical/templated prompts cost one model call
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.stats = {"prompts": 0, "model_calls": 0}
+        # One connection/thread commits agent_communications rows in batches
+        self.writer = writer or AgentLogWriter()
+        self._stats_lock = threading.Lock()
+        # reserved_critical of the max_workers slots only ever serve critical prompts
+        self.slots = WorkerSlots(max_workers, reserved_critical)
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.running = False
         self.thread = threading.Thread(target=self._worker, daemon=True)
@@ -22,62 +54,102 @@ class LLMBackgroundWorker:
         self.running = False
         self.thread.join()
         self.executor.shutdown(wait=True)
+        self.backend.close()
+        self.cache.close()
+        self.writer.close()
 
     def _worker(self):
         while self.running:
+            limiter = getattr(self.backend, "limiter", None)
+            if limiter:
+                self.slots.resize(limiter.concurrency())
+            # Only pull prompts once a worker is free, so urgent prompts wait in the queue (where
+            # they can overtake) rather than behind work already handed to the thread pool
+            kind, max_priority = self.slots.acquire(timeout=0.2)
+            if kind is None:
+                continue
             try:
-                # Get an item from the queue (blocking with timeout)
-                item = llm_prompt_queue.get(timeout=1)
-                if item:
-                    # Submit the processing to the thread pool so multiple prompts run concurrently
-                    self.executor.submit(self._process_item, item)
+                # Get a window of items from the queue (blocking with timeout for the first one).
+                # A reserved slot only polls briefly so a general slot freeing up is picked up quickly.
+                batch = collect_batch(llm_prompt_queue, self.max_batch_size, self.batch_window,
+                                      timeout=0.2 if kind == "general" else 0.01, max_priority=max_priority)
             except queue.Empty:
+                self.slots.release(kind, polling=True)
                 continue
+            self.slots.started(kind)
+            # Submit each group to the thread pool so multiple prompts run concurrently, most urgent first
+            groups = group_batch(batch)
+            for i, group in enumerate(groups):
+                if i > 0:
+                    kind = self.slots.try_acquire(group_priority(group))
+                    if kind is None:
+                        llm_prompt_queue.requeue([item for g in groups[i:] for item in g])
+                        break
+                self.executor.submit(self._process_group, group, kind)
 
-    def _process_item(self, item):
+    def _process_group(self, group, slot=None):
         try:
-            sender, message, user_id = item
-            response = self._ask_llm(sender, message)
-            self._log_to_db(sender, user_id, message, response)
+            sender, message, leader_user_id = group[0]
+            response = self._ask_llm(sender, message, leader_user_id)
+            answered = group
+            if is_error_response(response) and hasattr(llm_prompt_queue, "retry"):
+                # Durable queue: failed prompts are retried after a backoff; only the last failure is logged
+                answered = [item for item in group if not llm_prompt_queue.retry(item, response)]
+            with self._stats_lock:
+                self.stats["prompts"] += len(answered)
+                self.stats["model_calls"] += 1
+            PROMPTS.inc(len(answered), agent=sender)
+            for sender, message, user_id in answered:
+                self._log_to_db(sender, user_id, message, fan_out(response, leader_user_id, user_id))
+            if answered and hasattr(llm_prompt_queue, "ack"):
+                # Jobs are only finished once their response rows are committed
+                self.writer.after_commit(lambda: llm_prompt_queue.ack(answered))
         finally:
-            # Mark the task as done only after processing is complete
-            llm_prompt_queue.task_done()
+            # Mark the tasks as done only after processing is complete
+            for _ in group:
+                llm_prompt_queue.task_done()
+            if slot:
+                self.slots.release(slot)
 
-    def _ask_llm(self, sender, message):
-        prompt = f"[{sender}] {message}\nRespond with action."
-        try:
-            result = subprocess.run(
-                ["ollama", "run", self.model_name, prompt],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",  # force UTF-8 decoding
-                errors="replace",
-                timeout=300
-            )
-            if result.returncode == 0:
-                return result.stdout.strip()
+    def _ask_llm(self, sender, message, user_id=None):
+        with metrics.span("ask_llm", agent=sender, user=user_id):
+            prompt = f"[{sender}] {message}\nRespond with action."
+            cached = self.cache.get(self.model_name, prompt)
+            if cached is not None:
+                RESPONSES.inc(source="cache")
+                return cached
+            try:
+                response = self.backend.generate(self.model_name, prompt)
+            except Exception as e:
+                RESPONSES.inc(source="error")
+                return f"LLM Error: {e}"
+            if is_error_response(response):
+                RESPONSES.inc(source="error")
             else:
-                return f"LLM failed with code {result.returncode}: {result.stderr.strip()}"
-        except subprocess.TimeoutExpired:
-            return "LLM Timeout: Default response triggered. Escalate to caregiver."
-        except Exception as e:
-            return f"LLM Error: {e}"
+                RESPONSES.inc(source="model")
+                self.cache.put(self.model_name, prompt, response)
+            return response
+
+    def guard_stats(self):
+        stats = self.backend.stats() if hasattr(self.backend, "stats") else {}
+        return dict(stats, slots=self.slots.stats())
 
     def _log_to_db(self, sender, user_id, message, response):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            conn = sqlite3.connect("elderly_care.db")
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO agent_communications (sender, user_id,  message, response, timestamp) VALUES (?, ?, ?, ?, ?)",
-                (sender, user_id, message, response, timestamp)
-            )
-            conn.commit()
-            conn.close()
-            print(f"[LLMWorker] Logged response for [{sender}] into database at {timestamp}.")
-        except Exception as e:
-            print(f"[LLMWorker] Failed to log to database: {e}")
+        with metrics.span("log_to_db", agent=sender, user=user_id):
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.writer.write((sender, user_id, message, response, timestamp))
 
-# Singleton worker instance
+# Singleton worker instance; with LLM_RUNTIME=async only its cache and writer are used
 llm_worker = LLMBackgroundWorker()
-llm_worker.start()
+if LLM_RUNTIME != "async":
+    llm_worker.start()
+
+# Sampled when metrics are exported (async_runtime points llm_queue_depth at its own queue)
+metrics.gauge("llm_queue_depth", "Prompts waiting for a model call", fn=llm_prompt_queue.qsize)
+metrics.gauge("llm_queue_lane_depth", "Prompts waiting per severity lane", fn=llm_prompt_queue.lane_depths,
+              label="severity")
+metrics.gauge("db_writer_queue_depth", "Rows waiting for the agent_communications writer",
+              fn=llm_worker.writer.queue_depth)
+if hasattr(llm_worker.backend, "limiter"):
+    metrics.gauge("llm_concurrency_limit", "Adaptive limit on concurrent model calls",
+                  fn=llm_worker.backend.limiter.concurrency)
@@ -0,0 +1,195 @@
+# llm_scheduler.py
+# Severity-aware scheduling for the LLM prompt queue: one FIFO lane per severity class,
+# aging so low-severity prompts are not starved, and worker slots reserved for critical alerts.
+import threading
+import time
+import queue
+from collections import deque
+from metrics import LatencyStats, registry as metrics
+
+CRITICAL, HIGH, NORMAL, LOW = 0, 1, 2, 3
+PRIORITY_NAMES = {CRITICAL: "critical", HIGH: "high", NORMAL: "normal", LOW: "low"}
+PRIORITIES = {name: level for level, name in PRIORITY_NAMES.items()}
+
+
+def priority_level(priority):
+    return PRIORITIES[priority.lower()] if isinstance(priority, str) else int(priority)
+
+
+class Prompt(tuple):
+    """(sender, message, user_id) plus scheduling metadata; unpacks like the plain tuple."""
+
+    def __new__(cls, item, priority=NORMAL, enqueued_at=None):
+        self = super().__new__(cls, item)
+        self.priority = priority
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self.requeued = False
+        return self
+
+
+class PriorityPromptQueue:
+    """Drop-in replacement for ``queue.Queue`` (put/get/task_done/join/qsize).
+
+    ``get`` serves the lane whose head has the best effective priority, where every
+    ``aging_interval`` seconds of waiting promotes a prompt by one class.
+    ``max_priority`` restricts ``get`` to that class or more urgent (used for reserved slots).
+    """
+
+    def __init__(self, aging_interval=15.0):
+        self.aging_interval = aging_interval
+        self._lanes = {level: deque() for level in PRIORITY_NAMES}
+        self._mutex = threading.Lock()
+        self.not_empty = threading.Condition(self._mutex)
+        self.all_tasks_done = threading.Condition(self._mutex)
+        self.unfinished_tasks = 0
+        self.wait_times = {level: LatencyStats() for level in PRIORITY_NAMES}
+
+    # === queue.Queue API ===
+    def put(self, item, block=True, timeout=None, priority=NORMAL):
+        level = priority_level(priority)
+        with self._mutex:
+            self._lanes[level].append(Prompt(item, level))
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, item, priority=NORMAL):
+        self.put(item, priority=priority)
+
+    def get(self, block=True, timeout=None, max_priority=None):
+        with self.not_empty:
+            if not block:
+                if not self._has_items(max_priority):
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._has_items(max_priority):
+                    self.not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._has_items(max_priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            prompt = self._lanes[self._pick_lane(max_priority)].popleft()
+        if not prompt.requeued:
+            waited = time.monotonic() - prompt.enqueued_at
+            self.wait_times[prompt.priority].observe(waited)
+            # Items are (sender, message, user_id) prompts
+            metrics.record_span("queue_wait", waited, agent=prompt[0], user=prompt[-1])
+        return prompt
+
+    def get_nowait(self, max_priority=None):
+        return self.get(block=False, max_priority=max_priority)
+
+    def task_done(self):
+        with self.all_tasks_done:
+            unfinished = self.unfinished_tasks - 1
+            if unfinished < 0:
+                raise ValueError("task_done() called too many times")
+            if unfinished == 0:
+                self.all_tasks_done.notify_all()
+            self.unfinished_tasks = unfinished
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+
+    def qsize(self):
+        with self._mutex:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def empty(self):
+        return self.qsize() == 0
+
+    # === Scheduling ===
+    def requeue(self, prompts):
+        # Put prompts back at the front of their lanes without counting them as new tasks
+        with self._mutex:
+            for prompt in reversed(prompts):
+                prompt.requeued = True  # wait was already recorded at the first get
+                self._lanes[prompt.priority].appendleft(prompt)
+            self.not_empty.notify(len(prompts))
+
+    def _has_items(self, max_priority):
+        return any(lane for level, lane in self._lanes.items() if max_priority is None or level <= max_priority)
+
+    def _pick_lane(self, max_priority):
+        now = time.monotonic()
+        best, best_score = None, None
+        for level, lane in self._lanes.items():
+            if not lane or (max_priority is not None and level > max_priority):
+                continue
+            score = level - (now - lane[0].enqueued_at) / self.aging_interval
+            if best_score is None or score < best_score:
+                best, best_score = level, score
+        return best
+
+    def lane_depths(self):
+        with self._mutex:
+            return {PRIORITY_NAMES[level]: len(lane) for level, lane in self._lanes.items()}
+
+    def wait_stats(self):
+        # Queue-wait latency percentiles per severity class
+        return {PRIORITY_NAMES[level]: stats.summary() for level, stats in self.wait_times.items()}
+
+
+class WorkerSlots:
+    """Counts busy LLM workers; ``reserved`` of them only ever take critical prompts.
+
+    A slot from acquire() is ``polling`` (held by the dispatcher while it waits for prompts)
+    until started() hands it to a model call, when it counts as ``in_flight``.
+    """
+
+    def __init__(self, total, reserved=2):
+        self.reserved = reserved
+        self.in_flight = {"general": 0, "critical": 0}
+        self.polling = {"general": 0, "critical": 0}
+        self._cond = threading.Condition()
+        self.resize(total)
+
+    def resize(self, total):
+        # Follows the adaptive concurrency limit; busy slots above a lowered capacity drain naturally
+        with self._cond:
+            reserved = min(self.reserved, total - 1)
+            self.capacity = {"general": total - reserved, "critical": reserved}
+            self._cond.notify_all()
+
+    def _free(self, kind):
+        return self.in_flight[kind] + self.polling[kind] < self.capacity[kind]
+
+    def acquire(self, timeout=None):
+        # Blocks until any worker is free; returns (slot kind, max priority it may serve) or (None, None)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free("general") or self._free("critical"), timeout):
+                return None, None
+            kind = "general" if self._free("general") else "critical"
+            self.polling[kind] += 1
+            return kind, (None if kind == "general" else CRITICAL)
+
+    def started(self, kind):
+        # The acquire()d slot got prompts to run
+        with self._cond:
+            self.polling[kind] -= 1
+            self.in_flight[kind] += 1
+
+    def try_acquire(self, priority):
+        with self._cond:
+            for kind in ("general", "critical"):
+                if kind == "critical" and priority != CRITICAL:
+                    continue
+                if self._free(kind):
+                    self.in_flight[kind] += 1
+                    return kind
+            return None
+
+    def release(self, kind, polling=False):
+        # polling=True: an acquire()d slot that found nothing to run
+        with self._cond:
+            (self.polling if polling else self.in_flight)[kind] -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {"in_flight": dict(self.in_flight), "polling": dict(self.polling),
+                    "capacity": dict(self.capacity)}
@@ -1,9 +1,44 @@
+import argparse
+import os
 from db import init_db
+from metrics import start_exporter
 from agents.run_agent import RunAgent
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elderly care multi-agent runner")
+    parser.add_argument("--stream", action="store_true", help="run continuously, tailing new rows and serving the ingest API")
+    parser.add_argument("--port", type=int, default=8765, help="ingest API port for --stream")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="with --stream, dispatch rows already in the DB before tailing (default: start at the tail)")
+    parser.add_argument("--shards", type=int, default=0, help="run agents across N processes, partitioned by user_id")
+    parser.add_argument("--export-snapshot", metavar="DIR",
+                        help="write a columnar snapshot of the reading tables to DIR and exit (read it with COLUMNAR_SNAPSHOT=DIR)")
+    args = parser.parse_args()
+
+    # METRICS=1 turns on stage timings/counters; snapshots go to METRICS_FILE (and METRICS_PORT if set)
+    start_exporter()
+
     #  run only once
     init_db()
-    agent_runner = RunAgent()
-    agent_runner.run_agents()
-    print("✅ All agents have finished processing and saved to the database.")
\ No newline at end of file
+    if args.export_snapshot:
+        from columnar import export_snapshot
+        export_snapshot(args.export_snapshot)
+    elif args.stream:
+        from agents.stream_runner import StreamRunner
+        from llm_queue_worker import LLM_RUNTIME, llm_worker
+        if LLM_RUNTIME == "async":
+            print("[Main] --stream uses the threaded LLM worker; LLM_RUNTIME=async applies to batch runs.")
+            llm_worker.start()
+        StreamRunner(port=args.port, catch_up=args.catch_up).run()
+    elif args.shards:
+        from agents.sharded_runner import ShardedRunAgent
+        ShardedRunAgent(shards=args.shards).run_agents()
+        print("✅ All agents have finished processing and saved to the database.")
+    elif os.environ.get("LLM_RUNTIME") == "async":
+        from agents.async_runner import AsyncRunAgent
+        AsyncRunAgent().run_agents()
+        print("✅ All agents have finished processing and saved to the database.")
+    else:
+        agent_runner = RunAgent()
+        agent_runner.run_agents()
+        print("✅ All agents have finished processing and saved to the database.")
\ No newline at end of file
@@ -0,0 +1,360 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _pick(sorted_samples, p):
+    return sorted_samples[min(int(round(p / 100 * (len(sorted_samples) - 1))), len(sorted_samples) - 1)]
+
+
+class LatencyStats:
+    """Rolling window of latency samples (seconds) with percentile summaries."""
+
+    def __init__(self, window=10000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        return _pick(samples, p) if samples else None
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+        summary = {"count": count}
+        for p in (50, 95, 99):
+            summary[f"p{p}_ms"] = round(_pick(samples, p) * 1000, 2)
+        summary["max_ms"] = round(samples[-1] * 1000, 2)
+        return summary
+
+
+# === Pipeline instrumentation ===
+# Counters, callback gauges, latency histograms and per-stage spans for the agent pipeline.
+# Off unless METRICS=1: every recording call then returns after one attribute check and
+# span() hands back a shared no-op context manager, so instrumented code costs ~nothing.
+# start_exporter() writes a JSON snapshot to METRICS_FILE every few seconds (the dashboard
+# reads it) and, with METRICS_PORT set, serves Prometheus text on /metrics and JSON on /metrics.json.
+METRICS_ENABLED = os.environ.get("METRICS", "").lower() in ("1", "true", "yes", "on")
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "pipeline_metrics.json"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Seconds; a model call can take up to LLM_TIMEOUT (60s by default)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _prom_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, registry, name, help=""):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge:
+    """Sampled at export time from a callback, so keeping it current costs nothing."""
+
+    def __init__(self, registry, name, help="", fn=None, label="label"):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+
+    def values(self):
+        # fn returns a number, or {label value: number} for one label (e.g. queue lane)
+        try:
+            value = self.fn() if self.fn else None
+        except Exception:
+            return {}
+        if isinstance(value, dict):
+            return {((self.label, str(k)),): v for k, v in value.items()}
+        return {(): value} if value is not None else {}
+
+
+class Histogram:
+    """Cumulative buckets (for Prometheus) plus a rolling window per label set for p50/p99."""
+
+    def __init__(self, registry, name, help="", buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # label key -> [bucket counts, sum, LatencyStats]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        if not self.registry.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, LatencyStats(window=2000)]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += seconds
+        series[2].observe(seconds)
+
+    def series(self):
+        with self._lock:
+            return {key: (list(s[0]), s[1], s[2]) for key, s in self._series.items()}
+
+
+class _Span:
+    __slots__ = ("registry", "stage", "agent", "user", "start")
+
+    def __init__(self, registry, stage, agent, user):
+        self.registry = registry
+        self.stage = stage
+        self.agent = agent
+        self.user = user
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.record_span(self.stage, time.perf_counter() - self.start, self.agent, self.user,
+                                  error=exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=METRICS_ENABLED, trace_size=200):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._metrics = {}
+        self._lock = threading.Lock()
+        # Recent spans with their user id; the histograms are only labelled by stage and agent
+        # to keep the Prometheus series count bounded
+        self.traces = deque(maxlen=trace_size)
+        self.stage_seconds = self.histogram("pipeline_stage_seconds", "Time spent per pipeline stage")
+        self.stage_errors = self.counter("pipeline_stage_errors_total", "Pipeline stages that raised")
+        self.rate_window = 60.0
+        self._rate_samples = deque([(self.started_at, {})])  # (time, counter totals), newest last
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def gauge(self, name, help="", fn=None, label="label"):
+        gauge = self._get(Gauge, name, help, label=label)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def span(self, stage, agent=None, user=None):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, agent, user)
+
+    def timed_iter(self, iterable, stage, agent=None):
+        # Records one span per item produced (e.g. a DB batch fetched lazily), not for the final exhaustion
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record_span(stage, time.perf_counter() - start, agent)
+            yield item
+
+    def record_span(self, stage, seconds, agent=None, user=None, error=False):
+        if not self.enabled:
+            return
+        self.stage_seconds.observe(seconds, stage=stage, agent=agent)
+        if error:
+            self.stage_errors.inc(stage=stage, agent=agent)
+        self.traces.append((time.time(), stage, agent, user, round(seconds * 1000, 3), error))
+
+    # === Export ===
+    def snapshot(self):
+        now = time.time()
+        counters, gauges, stages = {}, {}, []
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Counter):
+                counters[metric.name] = [dict(key, value=v) for key, v in metric.values().items()]
+            elif isinstance(metric, Gauge):
+                gauges[metric.name] = [dict(key, value=v) for key, v in metric.values().items()]
+        for key, (_, total, stats) in self.stage_seconds.series().items():
+            stages.append(dict(key, total_s=round(total, 4), **stats.summary()))
+        return {
+            "time": now,
+            "uptime_s": round(now - self.started_at, 1),
+            "enabled": self.enabled,
+            "counters": counters,
+            "gauges": gauges,
+            "stages": stages,
+            "rates": self._rates(now, counters),
+            "traces": [dict(zip(("time", "stage", "agent", "user", "ms", "error"), t)) for t in list(self.traces)],
+        }
+
+    def _rates(self, now, counters):
+        # Per-second rate of each counter over roughly the last rate_window seconds (since start-up
+        # until then); samples are kept at most once a second, whoever is taking the snapshot
+        totals = {name: sum(v["value"] for v in values) for name, values in counters.items()}
+        with self._lock:
+            samples = self._rate_samples
+            while len(samples) > 1 and now - samples[1][0] >= self.rate_window:
+                samples.popleft()
+            since, previous = samples[0]
+            if now - samples[-1][0] >= 1:
+                samples.append((now, totals))
+        elapsed = now - since
+        if elapsed <= 0:
+            return {}
+        return {name: round((total - previous.get(name, 0)) / elapsed, 2) for name, total in totals.items()}
+
+    def prometheus_text(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            kind = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[type(metric)]
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {kind}"]
+            if isinstance(metric, Histogram):
+                for key, (counts, total, stats) in metric.series().items():
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, counts):
+                        cumulative += count
+                        lines.append(f"{metric.name}_bucket{_prom_labels(key, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{metric.name}_bucket{_prom_labels(key, [('le', '+Inf')])} {stats.count}")
+                    lines.append(f"{metric.name}_sum{_prom_labels(key)} {total}")
+                    lines.append(f"{metric.name}_count{_prom_labels(key)} {stats.count}")
+            else:
+                for key, value in metric.values().items():
+                    lines.append(f"{metric.name}{_prom_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export_json(self, path=METRICS_FILE):
+        # Write-then-rename so a reader never sees a half-written file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+
+registry = MetricsRegistry()
+span = registry.span
+
+
+def start_exporter(registry=registry, path=METRICS_FILE, port=METRICS_PORT, interval=5.0):
+    # JSON snapshot every `interval` seconds (and once more at exit); Prometheus endpoint if port is set
+    if not registry.enabled:
+        return None
+    stop = threading.Event()
+
+    def export():
+        try:
+            registry.export_json(path)
+        except OSError as e:
+            print(f"[Metrics] Could not write {path}: {e}")
+
+    def loop():
+        while not stop.wait(interval):
+            export()
+
+    threading.Thread(target=loop, name="MetricsExporter", daemon=True).start()
+    atexit.register(export)
+    server = None
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(registry))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+        print(f"[Metrics] Prometheus metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+    print(f"[Metrics] Writing snapshots to {path} every {interval}s")
+    return server
+
+
+def _make_handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+
+def read_snapshot(path=METRICS_FILE):
+    # For readers in other processes (the dashboard); None if the pipeline has not exported yet
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
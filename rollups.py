@@ -0,0 +1,111 @@
+# rollups.py
+# Incrementally maintained summary tables over the reading tables (schema v4).
+#
+# Each rollup groups new source rows (id past its watermark) by time bucket and keys and
+# merges them into rollup_<name> with an upsert: counts and sums add up, min/max combine,
+# so a rollup row never has to be recomputed from raw readings. insert_data() refreshes
+# the rollups of a table in the same transaction as the insert.
+#
+# Means are <metric>_sum / <metric>_n; buckets are "YYYY-MM-DDTHH" (hour) or "YYYY-MM-DD" (day).
+
+HOUR = "substr(recorded_at, 1, 13)"
+DAY = "substr(recorded_at, 1, 10)"
+
+HEALTH_STATS = {c: c for c in ("heart_rate", "glucose", "oxygen", "systolic", "diastolic")}
+SAFETY_STATS = {"inactivity": "post_fall_inactivity_duration"}
+HEALTH_COUNTS = {
+    "alerts": "is_alert",
+    "abnormal_readings": "max(IFNULL(heart_rate_abnormal, 0), IFNULL(bp_abnormal, 0), "
+                         "IFNULL(glucose_abnormal, 0), IFNULL(oxygen_abnormal, 0))",
+}
+SAFETY_COUNTS = {"falls": "is_fall", "alerts": "is_alert"}
+
+# name -> source table, bucket expression, grouping keys, per-metric stats ({alias: column}), counted 0/1 expressions
+ROLLUPS = {
+    "health_hourly": {"source": "health", "bucket": HOUR, "keys": ["user_id"],
+                      "stats": HEALTH_STATS, "counts": HEALTH_COUNTS},
+    "health_daily": {"source": "health", "bucket": DAY, "keys": ["user_id"],
+                     "stats": HEALTH_STATS, "counts": HEALTH_COUNTS},
+    "vitals_hourly": {"source": "health", "bucket": HOUR, "keys": [],
+                      "stats": HEALTH_STATS, "counts": HEALTH_COUNTS},
+    "safety_daily": {"source": "safety", "bucket": DAY, "keys": ["user_id", "location"],
+                     "stats": SAFETY_STATS, "counts": SAFETY_COUNTS},
+    "location_daily": {"source": "safety", "bucket": DAY, "keys": ["location"],
+                       "stats": SAFETY_STATS, "counts": SAFETY_COUNTS},
+}
+
+
+def table_name(rollup):
+    return f"rollup_{rollup}"
+
+
+def _create_sql(rollup, spec):
+    columns = [f"{k} TEXT NOT NULL" for k in spec["keys"]] + ["bucket TEXT NOT NULL", "readings INTEGER NOT NULL"]
+    for stat in spec["stats"]:
+        columns += [f"{stat}_n INTEGER NOT NULL", f"{stat}_sum REAL NOT NULL", f"{stat}_min REAL", f"{stat}_max REAL"]
+    columns += [f"{name} INTEGER NOT NULL" for name in spec["counts"]]
+    # Keys first: a per-user (or per-location) trend is one range seek on the primary key
+    columns.append(f"PRIMARY KEY ({', '.join(spec['keys'] + ['bucket'])})")
+    return f"CREATE TABLE IF NOT EXISTS {table_name(rollup)} (\n    " + ",\n    ".join(columns) + "\n) WITHOUT ROWID"
+
+
+def _upsert_sql(rollup, spec):
+    keys = spec["keys"]
+    target = keys + ["bucket", "readings"]
+    select = [f"COALESCE({k}, '')" for k in keys] + [spec["bucket"], "COUNT(*)"]
+    merge = ["readings = readings + excluded.readings"]
+    for stat, column in spec["stats"].items():
+        target += [f"{stat}_n", f"{stat}_sum", f"{stat}_min", f"{stat}_max"]
+        select += [f"COUNT({column})", f"TOTAL({column})", f"MIN({column})", f"MAX({column})"]
+        merge += [f"{stat}_n = {stat}_n + excluded.{stat}_n",
+                  f"{stat}_sum = {stat}_sum + excluded.{stat}_sum",
+                  # two-argument min()/max() return NULL if either side is NULL
+                  f"{stat}_min = COALESCE(min({stat}_min, excluded.{stat}_min), {stat}_min, excluded.{stat}_min)",
+                  f"{stat}_max = COALESCE(max({stat}_max, excluded.{stat}_max), {stat}_max, excluded.{stat}_max)"]
+    for name, expr in spec["counts"].items():
+        target.append(name)
+        select.append(f"COALESCE(SUM({expr}), 0)")
+        merge.append(f"{name} = {name} + excluded.{name}")
+    group = [str(i) for i in range(1, len(keys) + 2)]
+    return (f"INSERT INTO {table_name(rollup)} ({', '.join(target)})\n"
+            f"SELECT {', '.join(select)} FROM {spec['source']}\n"
+            f"WHERE id > ? AND id <= ? AND recorded_at IS NOT NULL GROUP BY {', '.join(group)}\n"
+            f"ON CONFLICT ({', '.join(keys + ['bucket'])}) DO UPDATE SET {', '.join(merge)}")
+
+
+def create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                        rollup TEXT PRIMARY KEY,
+                        last_id INTEGER NOT NULL DEFAULT 0,
+                        updated_at TEXT)''')
+    for rollup, spec in ROLLUPS.items():
+        conn.execute(_create_sql(rollup, spec))
+
+
+def enabled(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_watermarks'").fetchone() is not None
+
+
+def refresh(conn, sources=None):
+    # Folds source rows past each rollup's watermark into it; the caller commits.
+    # Returns {rollup: source rows folded in}.
+    folded = {}
+    high_ids = {}
+    for rollup, spec in ROLLUPS.items():
+        source = spec["source"]
+        if sources is not None and source not in sources:
+            continue
+        if source not in high_ids:
+            high_ids[source] = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source}").fetchone()[0]
+        row = conn.execute("SELECT last_id FROM rollup_watermarks WHERE rollup = ?", (rollup,)).fetchone()
+        last_id = row[0] if row else 0
+        if high_ids[source] <= last_id:
+            continue
+        conn.execute(_upsert_sql(rollup, spec), (last_id, high_ids[source]))
+        conn.execute(
+            """INSERT INTO rollup_watermarks (rollup, last_id, updated_at) VALUES (?, ?, datetime('now'))
+               ON CONFLICT(rollup) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at""",
+            (rollup, high_ids[source])
+        )
+        folded[rollup] = high_ids[source] - last_id
+    return folded
@@ -0,0 +1,292 @@
+# schema.py
+# Versioned schema migrations, tracked with PRAGMA user_version.
+#
+# Version 0 is the original layout created by init_db (text-only columns, no keys).
+# Version 1 rebuilds every table with an INTEGER PRIMARY KEY, typed columns derived
+# from the raw text (ISO-8601 timestamps, systolic/diastolic, 0/1 flags) and indexes.
+# Version 2 adds agent_watermarks for incremental processing.
+# Version 3 adds severity / word_count / hour to agent_communications (computed at write
+# time by db_writer, backfilled here) with indexes for the dashboard filters and charts.
+# Version 4 adds the rollup tables (rollups.py) and builds them from the existing readings.
+# Version 5 keys health and safety readings on the whole raw row (raw_key) instead of
+# (user_id, timestamp), so different readings taken in the same minute are all kept.
+# Version 6 adds agent_pending: rows behind an agent's watermark that it re-checks every pass
+# (reminders not due yet).
+import hashlib
+import sqlite3
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+import rollups
+import severity
+
+TIMESTAMP_FORMATS = ("%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+
+
+@lru_cache(maxsize=65536)
+def to_iso_timestamp(text):
+    # "1/22/2025 20:42" -> "2025-01-22T20:42:00"; readings repeat per minute so the cache hit rate is high
+    if text is None:
+        return None
+    text = str(text).strip()
+    date_part, _, time_part = text.partition(" ")
+    if date_part.count("/") == 2:
+        # Fast path for the device export format (M/D/YYYY H:MM[:SS]); strptime is ~10x slower
+        try:
+            month, day, year = map(int, date_part.split("/"))
+            hms = [int(x) for x in time_part.split(":")] if time_part else [0, 0]
+            return datetime(year, month, day, *hms).isoformat()
+        except (ValueError, TypeError):
+            pass
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def shard_of(user_id, shards):
+    # Stable across processes and runs (unlike hash()), so a user always lands on the same shard
+    return zlib.crc32(str(user_id).encode("utf-8")) % shards
+
+
+def row_key(*values):
+    # Signed 64-bit hash of a reading's raw values for its natural key. NULL-safe, and a value hashes
+    # the same whether it arrives as 72, 72.0 or "72" (SQLite stores all three as 72)
+    parts = []
+    for value in values:
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        parts.append("\x00" if value is None else str(value))
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def register_functions(conn):
+    conn.create_function("iso_ts", 1, to_iso_timestamp, deterministic=True)
+    conn.create_function("row_key", -1, row_key, deterministic=True)
+    conn.create_function("shard_of", 2, shard_of, deterministic=True)
+    conn.create_function("response_severity", 1, severity.classify, deterministic=True)
+    conn.create_function("word_count", 1, severity.word_count, deterministic=True)
+    return conn
+
+
+def _flag(column):
+    # Exact 'Yes'/'No' (what the devices send) short-circuits the lower(trim()) normalisation
+    return (f"CASE {{{column}}} WHEN 'Yes' THEN 1 WHEN 'No' THEN 0 "
+            f"ELSE CASE lower(trim({{{column}}})) WHEN 'yes' THEN 1 WHEN 'no' THEN 0 END END")
+
+
+# Raw (CSV) columns of each reading table, in their original order
+RAW_COLUMNS = {
+    "health": ["user_id", "timestamp", "heart_rate", "hear_rate_threshold_flag", "bp", "bp_threshold_flag",
+               "glucose", "glucose_Threshold_flag", "oxygen", "oxygen_threshold_flag",
+               "alert_triggered", "caregiver_notified"],
+    "safety": ["user_id", "timestamp", "activity", "fall_detected", "impact_force_level",
+               "post_fall_inactivity_duration", "location", "alert_triggered", "caregiver_notified"],
+    "reminders": ["user_id", "timestamp", "reminder_type", "scheduled_time", "sent", "acknowledged"],
+    "agent_communications": ["sender", "user_id", "message", "response", "timestamp"],
+}
+
+def _row_key(table_name):
+    return "row_key(" + ", ".join(f"{{{c}}}" for c in RAW_COLUMNS[table_name]) + ")"
+
+
+# Typed columns: name -> (SQL type, expression template over the raw columns).
+# "{bp}" is filled with the column name when migrating and with a bound parameter when inserting.
+DERIVED_COLUMNS = {
+    "health": {
+        "recorded_at": ("TEXT", "iso_ts({timestamp})"),
+        "systolic": ("INTEGER", "CAST(substr({bp}, 1, instr({bp}, '/') - 1) AS INTEGER)"),
+        "diastolic": ("INTEGER", "CAST(substr({bp}, instr({bp}, '/') + 1) AS INTEGER)"),
+        "heart_rate_abnormal": ("INTEGER", _flag("hear_rate_threshold_flag")),
+        "bp_abnormal": ("INTEGER", _flag("bp_threshold_flag")),
+        "glucose_abnormal": ("INTEGER", _flag("glucose_Threshold_flag")),
+        "oxygen_abnormal": ("INTEGER", _flag("oxygen_threshold_flag")),
+        "is_alert": ("INTEGER", _flag("alert_triggered")),
+        "is_caregiver_notified": ("INTEGER", _flag("caregiver_notified")),
+        "raw_key": ("INTEGER", _row_key("health")),
+    },
+    "safety": {
+        "recorded_at": ("TEXT", "iso_ts({timestamp})"),
+        "is_fall": ("INTEGER", _flag("fall_detected")),
+        "is_alert": ("INTEGER", _flag("alert_triggered")),
+        "is_caregiver_notified": ("INTEGER", _flag("caregiver_notified")),
+        "raw_key": ("INTEGER", _row_key("safety")),
+    },
+    "reminders": {
+        "recorded_at": ("TEXT", "iso_ts({timestamp})"),
+        "is_sent": ("INTEGER", _flag("sent")),
+        "is_acknowledged": ("INTEGER", _flag("acknowledged")),
+    },
+    "agent_communications": {},
+}
+
+# Yes/No raw column -> its typed 1/0/NULL column, e.g. FLAG_COLUMNS["safety"]["fall_detected"] == "is_fall"
+FLAG_COLUMNS = {
+    table_name: {raw: name for name, (_, expr) in derived.items() for raw in RAW_COLUMNS[table_name]
+                 if expr == _flag(raw)}
+    for table_name, derived in DERIVED_COLUMNS.items()
+}
+
+RAW_TYPES = {"heart_rate": "INT", "glucose": "INT", "oxygen": "INT", "post_fall_inactivity_duration": "INT"}
+
+INDEXES = {
+    "health": [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_health_natural_key ON health (user_id, timestamp, raw_key)",
+        "CREATE INDEX IF NOT EXISTS ix_health_user_time ON health (user_id, recorded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_health_alert ON health (is_alert, recorded_at)",
+    ],
+    "safety": [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_safety_natural_key ON safety (user_id, timestamp, raw_key)",
+        "CREATE INDEX IF NOT EXISTS ix_safety_user_time ON safety (user_id, recorded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_safety_alert ON safety (is_alert, is_fall)",
+    ],
+    "reminders": [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_reminders_natural_key ON reminders (user_id, timestamp, reminder_type, scheduled_time)",
+        "CREATE INDEX IF NOT EXISTS ix_reminders_user_time ON reminders (user_id, recorded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_reminders_pending ON reminders (is_sent, is_acknowledged)",
+    ],
+    "agent_communications": [
+        "CREATE INDEX IF NOT EXISTS ix_agent_comm_user_time ON agent_communications (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_agent_comm_sender ON agent_communications (sender, timestamp)",
+    ],
+}
+
+
+def _derived_exprs(table_name, names):
+    return [expr.format(**names) for _, expr in DERIVED_COLUMNS[table_name].values()]
+
+
+def insert_sql(table_name, verb="INSERT OR IGNORE"):
+    # Takes the raw columns as parameters and computes the typed ones in the same statement
+    raw = RAW_COLUMNS[table_name]
+    params = {c: f"?{i}" for i, c in enumerate(raw, start=1)}
+    target = ", ".join(raw + list(DERIVED_COLUMNS[table_name]))
+    values = ", ".join(list(params.values()) + _derived_exprs(table_name, params))
+    return f"{verb} INTO {table_name} ({target}) VALUES ({values})"
+
+
+def _create_table_sql(table_name):
+    columns = ["id INTEGER PRIMARY KEY"]
+    columns += [f"{c} {RAW_TYPES.get(c, 'TEXT')}" for c in RAW_COLUMNS[table_name]]
+    columns += [f"{c} {sql_type}" for c, (sql_type, _) in DERIVED_COLUMNS[table_name].items()]
+    return f"CREATE TABLE {table_name} (\n    " + ",\n    ".join(columns) + "\n)"
+
+
+def _migrate_v1(conn):
+    for table_name in RAW_COLUMNS:
+        raw = RAW_COLUMNS[table_name]
+        derived = list(DERIVED_COLUMNS[table_name])
+        conn.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_v0")
+        conn.execute(_create_table_sql(table_name))
+        conn.execute(
+            f"INSERT INTO {table_name} (id, {', '.join(raw + derived)}) "
+            f"SELECT rowid, {', '.join(raw + _derived_exprs(table_name, {c: c for c in raw}))} FROM {table_name}_v0"
+        )
+        conn.execute(f"DROP TABLE {table_name}_v0")
+        for statement in INDEXES[table_name]:
+            conn.execute(statement)
+
+
+def _migrate_v2(conn):
+    # Per-agent high-water mark: the last row id each agent has fully enqueued
+    conn.execute('''CREATE TABLE IF NOT EXISTS agent_watermarks (
+                        agent TEXT PRIMARY KEY,
+                        table_name TEXT,
+                        last_id INTEGER NOT NULL DEFAULT 0,
+                        updated_at TEXT)''')
+
+
+# Columns of agent_communications filled in by the writer from (message, response, timestamp)
+COMMUNICATION_DERIVED = {
+    "severity": ("TEXT", "response_severity(response)"),
+    "word_count": ("INTEGER", "word_count(message)"),
+    "hour": ("INTEGER", "CAST(substr(timestamp, 12, 2) AS INTEGER)"),
+}
+
+COMMUNICATION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_agent_comm_severity ON agent_communications (severity)",
+    "CREATE INDEX IF NOT EXISTS ix_agent_comm_hour ON agent_communications (hour)",
+    "CREATE INDEX IF NOT EXISTS ix_agent_comm_word_count ON agent_communications (word_count)",
+]
+
+
+def backfill_communications(conn, only_missing=True):
+    # Also the way to re-classify every row after changing the severity tiers (only_missing=False)
+    register_functions(conn)
+    assignments = ", ".join(f"{c} = {expr}" for c, (_, expr) in COMMUNICATION_DERIVED.items())
+    where = " WHERE severity IS NULL" if only_missing else ""
+    return conn.execute(f"UPDATE agent_communications SET {assignments}{where}").rowcount
+
+
+def _migrate_v3(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(agent_communications)")}
+    for column, (sql_type, _) in COMMUNICATION_DERIVED.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE agent_communications ADD COLUMN {column} {sql_type}")
+    backfill_communications(conn)
+    for statement in COMMUNICATION_INDEXES:
+        conn.execute(statement)
+
+
+def _migrate_v4(conn):
+    rollups.create_tables(conn)
+    rollups.refresh(conn)
+
+
+def _migrate_v5(conn):
+    # Databases built before v5 have the (user_id, timestamp) key; on newer ones v1 already made raw_key
+    for table_name in ("health", "safety"):
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+        if "raw_key" not in existing:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN raw_key INTEGER")
+        expr = DERIVED_COLUMNS[table_name]["raw_key"][1].format(**{c: c for c in RAW_COLUMNS[table_name]})
+        conn.execute(f"UPDATE {table_name} SET raw_key = {expr} WHERE raw_key IS NULL")
+        conn.execute(f"DROP INDEX IF EXISTS ux_{table_name}_natural_key")
+        conn.execute(INDEXES[table_name][0])
+
+
+def _migrate_v6(conn):
+    # Rows whose outcome depends on the time (a reminder not due yet, one still in its grace period)
+    # stay here while the agent's watermark moves past them, and are handed back until they resolve
+    conn.execute('''CREATE TABLE IF NOT EXISTS agent_pending (
+                        agent TEXT NOT NULL,
+                        record_id INTEGER NOT NULL,
+                        PRIMARY KEY (agent, record_id)) WITHOUT ROWID''')
+
+
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection):
+    register_functions(conn)
+    current = schema_version(conn)
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"[INFO] Migrating database schema to version {version}...")
+        conn.execute("BEGIN")  # DDL is not wrapped implicitly, so open the transaction ourselves
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
@@ -0,0 +1,75 @@
+# severity.py
+# Keyword severity of an LLM response, computed once when the response is written to
+# agent_communications (see db_writer.py and the v3 migration in schema.py).
+#
+# Tiers are checked highest first; a response takes the first tier any of whose keywords
+# occurs in it (case-insensitive substring, as the dashboard used to match). Override the
+# tiers with a JSON file of [["High", ["immediate", ...]], ...] in SEVERITY_TIERS_PATH.
+import json
+import os
+import re
+
+DEFAULT_TIERS = [
+    ("High", ["immediate", "emergency", "critical"]),
+    ("Medium", ["should", "check", "notify"]),
+]
+NO_MATCH = "Low"
+EMPTY = "Unknown"
+
+TIERS_PATH = os.environ.get("SEVERITY_TIERS_PATH")
+
+
+def load_tiers(path=TIERS_PATH):
+    if not path:
+        return DEFAULT_TIERS
+    with open(path, encoding="utf-8") as f:
+        return [(name, list(keywords)) for name, keywords in json.load(f)]
+
+
+class SeverityClassifier:
+    """One compiled alternation per tier's keywords.
+
+    Tiers are searched highest first and the first tier with a match wins, so a lower-tier
+    keyword overlapping a higher-tier one (e.g. "sale" in "salert") cannot hide it.
+    """
+
+    def __init__(self, tiers=None, no_match=NO_MATCH, empty=EMPTY):
+        self.tiers = list(tiers if tiers is not None else load_tiers())
+        self.levels = [name for name, _ in self.tiers] + [no_match]
+        self.empty = empty
+        self._patterns = []
+        for i, (_, keywords) in enumerate(self.tiers):
+            # Longest first so a keyword that prefixes another cannot shadow it
+            words = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+            if words:
+                self._patterns.append((i, re.compile("|".join(map(re.escape, words)), re.IGNORECASE)))
+
+    def classify(self, text):
+        if not text:
+            return self.empty
+        for i, pattern in self._patterns:
+            if pattern.search(text):
+                return self.levels[i]
+        return self.levels[-1]
+
+    __call__ = classify
+
+
+classifier = SeverityClassifier()
+classify = classifier.classify
+
+
+def word_count(text):
+    return len(text.split()) if text else 0
+
+
+def hour_of(timestamp):
+    # "YYYY-MM-DD HH:MM:SS" or the ISO 'T' form
+    try:
+        return int(timestamp[11:13])
+    except (TypeError, ValueError):
+        return None
+
+
+def derived_fields(message, response, timestamp):
+    return classify(response), word_count(message), hour_of(timestamp)
@@ -0,0 +1,177 @@
+# speech_service.py
+# One long-lived text-to-speech thread for voice alerts. Agents call say() and return
+# immediately; the TTS engine is initialised once, on the speech thread, and identical
+# messages waiting to be spoken (or spoken within dedup_window seconds) are merged.
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+VOICE_SINK = os.environ.get("VOICE_SINK", "auto")  # auto | pyttsx3 | file | none
+VOICE_LOG = os.environ.get("VOICE_LOG", os.path.join(os.path.dirname(__file__), "voice_alerts.log"))
+
+
+class SpeechSink:
+    name = "none"
+
+    def open(self):
+        pass
+
+    def speak(self, message: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class Pyttsx3Sink(SpeechSink):
+    name = "pyttsx3"
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.engine = None
+
+    def open(self):
+        # pyttsx3 engines must be driven from the thread that created them
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        if self.rate:
+            self.engine.setProperty("rate", self.rate)
+
+    def speak(self, message):
+        self.engine.say(message)
+        self.engine.runAndWait()
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+
+class FileSink(SpeechSink):
+    """Headless sink: appends each spoken message to a text file."""
+    name = "file"
+
+    def __init__(self, path=VOICE_LOG):
+        self.path = path
+        self._file = None
+
+    def open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def speak(self, message):
+        self._file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def get_sink(kind=VOICE_SINK):
+    if kind == "pyttsx3":
+        return Pyttsx3Sink()
+    if kind == "file":
+        return FileSink()
+    if kind == "none":
+        return SpeechSink()
+    if kind == "auto":
+        try:
+            import pyttsx3  # noqa: F401
+            return Pyttsx3Sink()
+        except ImportError:
+            return SpeechSink()
+    raise ValueError(f"Unknown voice sink: {kind}")
+
+
+class SpeechService:
+    def __init__(self, sink=None, max_pending=100, dedup_window=30.0):
+        self.sink = sink or get_sink()
+        self.max_pending = max_pending
+        self.dedup_window = dedup_window
+        self.stats = {"requested": 0, "spoken": 0, "merged": 0, "dropped": 0, "failed": 0}
+        self._pending = OrderedDict()  # message -> number of requests merged into it
+        self._recent = {}  # message -> monotonic time it was last spoken
+        self._cond = threading.Condition()
+        self._closed = False
+        self._speaking = False
+        self.thread = threading.Thread(target=self._run, name="SpeechService", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        atexit.register(self.close)
+
+    def say(self, message: str):
+        # Never blocks: duplicates are merged and a full queue drops the message
+        with self._cond:
+            self.stats["requested"] += 1
+            if self._closed:
+                self.stats["dropped"] += 1
+                return False
+            spoken_at = self._recent.get(message)
+            if message in self._pending or (spoken_at and time.monotonic() - spoken_at < self.dedup_window):
+                self.stats["merged"] += 1
+                if message in self._pending:
+                    self._pending[message] += 1
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self._pending[message] = 1
+            self._cond.notify()
+            return True
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def wait_idle(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._speaking, timeout)
+
+    def close(self, timeout=30):
+        # Speak whatever is already queued, then release the engine
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.sink.open()
+        except Exception as e:
+            print(f"[Speech] Voice output unavailable ({self.sink.name}: {e}); alerts will not be spoken.")
+            self.sink = SpeechSink()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    break
+                message, count = self._pending.popitem(last=False)
+                self._speaking = True
+            try:
+                self.sink.speak(message)
+                with self._cond:
+                    self.stats["spoken"] += 1
+                if self.sink.name != "none":
+                    suffix = f" (x{count})" if count > 1 else ""
+                    print(f"[Speech] 🔊 {message}{suffix}")
+            except Exception:
+                with self._cond:
+                    self.stats["failed"] += 1  # voice failures never reach the agents
+            with self._cond:
+                self._speaking = False
+                self._recent[message] = time.monotonic()
+                if len(self._recent) > 1000:
+                    cutoff = time.monotonic() - self.dedup_window
+                    self._recent = {m: t for m, t in self._recent.items() if t >= cutoff}
+                self._cond.notify_all()
+        self.sink.close()
+
+
+# Singleton speech thread shared by all agents
+speech_service = SpeechService()
+speech_service.start()